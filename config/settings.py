@@ -111,6 +111,12 @@ REST_FRAMEWORK = {
 }
 
 
+# Cache
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://')
+}
+
 # Database
 # https://docs.djangoproject.com/en/4.0.2/ref/settings/#databases
 
@@ -248,3 +254,93 @@ SIMPLE_JWT = {
 DOMAIN = env.str('DOMAIN', default='localhost')
 
 DEFAULT_SCHEMA = env.str('DEFAULT_SCHEMA', default='public')
+
+# Vouchers
+
+VOUCHER_NUMBER_BLOCK_SIZE = env.int('VOUCHER_NUMBER_BLOCK_SIZE', default=1)
+
+VOUCHER_XML_STREAM_LINES = env.int('VOUCHER_XML_STREAM_LINES', default=500)
+
+VOUCHER_XML_CHUNK_SIZE = env.int('VOUCHER_XML_CHUNK_SIZE', default=200)
+
+VOUCHER_XML_SPOOL_SIZE = env.int('VOUCHER_XML_SPOOL_SIZE', default=1048576)
+
+VOUCHER_XSD_VALIDATION = env.bool('VOUCHER_XSD_VALIDATION', default=True)
+
+# Electronic signature
+
+ELECTRONIC_SIGNATURE_ENGINE = env.str('ELECTRONIC_SIGNATURE_ENGINE', default='python')
+
+# SRI web services
+
+SRI_RECEIPT_URLS = {
+    1: env.str('SRI_TEST_RECEIPT_URL', default='https://celcer.sri.gob.ec/comprobantes-electronicos-ws/RecepcionComprobantesOffline?wsdl'),
+    2: env.str('SRI_PRODUCTION_RECEIPT_URL', default='https://cel.sri.gob.ec/comprobantes-electronicos-ws/RecepcionComprobantesOffline?wsdl'),
+}
+
+SRI_AUTHORIZATION_URLS = {
+    1: env.str('SRI_TEST_AUTHORIZATION_URL', default='https://celcer.sri.gob.ec/comprobantes-electronicos-ws/AutorizacionComprobantesOffline?wsdl'),
+    2: env.str('SRI_PRODUCTION_AUTHORIZATION_URL', default='https://cel.sri.gob.ec/comprobantes-electronicos-ws/AutorizacionComprobantesOffline?wsdl'),
+}
+
+SRI_TIMEOUT = env.int('SRI_TIMEOUT', default=30)
+
+SRI_POOL_SIZE = env.int('SRI_POOL_SIZE', default=10)
+
+SRI_WSDL_CACHE_DIR = env.str('SRI_WSDL_CACHE_DIR', default=os.path.join(BASE_DIR, 'cache', 'wsdl'))
+
+SRI_WSDL_CACHE_DAYS = env.int('SRI_WSDL_CACHE_DAYS', default=30)
+
+# Authorization polling
+
+AUTHORIZATION_POLL_BATCH_SIZE = env.int('AUTHORIZATION_POLL_BATCH_SIZE', default=50)
+
+AUTHORIZATION_POLL_BASE_DELAY = env.int('AUTHORIZATION_POLL_BASE_DELAY', default=2)
+
+AUTHORIZATION_POLL_MAX_DELAY = env.int('AUTHORIZATION_POLL_MAX_DELAY', default=300)
+
+AUTHORIZATION_POLL_MAX_ATTEMPTS = env.int('AUTHORIZATION_POLL_MAX_ATTEMPTS', default=20)
+
+# Electronic billing runner
+
+ELECTRONIC_BILLING_WORKERS = env.int('ELECTRONIC_BILLING_WORKERS', default=4)
+
+ELECTRONIC_BILLING_TENANT_CONCURRENCY = env.int('ELECTRONIC_BILLING_TENANT_CONCURRENCY', default=2)
+
+ELECTRONIC_BILLING_SRI_RATE = env.int('ELECTRONIC_BILLING_SRI_RATE', default=10)
+
+# Promotions
+
+PROMOTION_PRICE_INDEX_TIMEOUT = env.int('PROMOTION_PRICE_INDEX_TIMEOUT', default=60)
+
+# Product search
+
+PRODUCT_SEARCH_BACKEND = env.str('PRODUCT_SEARCH_BACKEND', default='auto')
+
+PRODUCT_SEARCH_INDEX_TIMEOUT = env.int('PRODUCT_SEARCH_INDEX_TIMEOUT', default=300)
+
+PRODUCT_SEARCH_MAX_CANDIDATES = env.int('PRODUCT_SEARCH_MAX_CANDIDATES', default=200)
+
+PRODUCT_SEARCH_BROWSE_LIMIT = env.int('PRODUCT_SEARCH_BROWSE_LIMIT', default=100)
+
+# Product code cache
+
+PRODUCT_CODE_CACHE_SIZE = env.int('PRODUCT_CODE_CACHE_SIZE', default=5000)
+
+PRODUCT_CODE_CACHE_TIMEOUT = env.int('PRODUCT_CODE_CACHE_TIMEOUT', default=300)
+
+# Image derivatives
+
+IMAGE_DERIVATIVE_SIZES = {'thumbnail': 150, 'small': 320, 'medium': 640}
+
+IMAGE_DERIVATIVE_QUALITY = env.int('IMAGE_DERIVATIVE_QUALITY', default=80)
+
+# Catalog API
+
+API_RESPONSE_CACHE_TIMEOUT = env.int('API_RESPONSE_CACHE_TIMEOUT', default=0)
+
+# Product sync
+
+PRODUCT_SYNC_LAG_SECONDS = env.int('PRODUCT_SYNC_LAG_SECONDS', default=5)
+
+PRODUCT_SYNC_MAX_LIMIT = env.int('PRODUCT_SYNC_MAX_LIMIT', default=1000)
@@ -0,0 +1,83 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from config import settings
+from core.pos.utilities.catalog import CatalogVersion
+
+
+class CatalogCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        # Cada vista define una clave estable y única para el cursor
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+
+
+class ConditionalCatalogMixin:
+    # Las lecturas se responden con 304 sin serializar cuando el catálogo no cambió desde la última consulta del cliente
+    last_modified_field = 'modified_date'
+
+    def get_catalog_state(self):
+        queryset = self.get_queryset().model.objects.all()
+        aggregates = {'count': Count('id'), 'max_id': Max('id')}
+        if self.last_modified_field:
+            aggregates['last_modified'] = Max(self.last_modified_field)
+        state = queryset.aggregate(**aggregates)
+        # La versión del catálogo está en la base, así todos los procesos responden con la misma ETag
+        state['version'], state['version_date'] = CatalogVersion().get_state()
+        return state
+
+    def get_last_modified(self, state):
+        # Las eliminaciones y los modelos sin fecha de modificación solo avanzan la fecha de la versión del catálogo
+        dates = [date for date in [state.get('last_modified'), state['version_date']] if date is not None]
+        return max(dates) if len(dates) else None
+
+    def get_etag(self, request, state):
+        model = self.get_queryset().model
+        values = [CatalogVersion().get_schema_name(), model._meta.label, state['version'], state['count'], state['max_id'], state.get('last_modified'), request.get_full_path(), request.META.get('HTTP_ACCEPT', '')]
+        return hashlib.sha1('|'.join([str(value) for value in values]).encode('utf-8')).hexdigest()
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            return quote_etag(etag) in [value.strip() for value in if_none_match.split(',')] or if_none_match.strip() == '*'
+        # Un cambio en el mismo segundo que la respuesta anterior no se distingue, por eso solo responde 304 si la fecha es anterior
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return last_modified is not None and if_modified_since is not None and int(last_modified.timestamp()) < if_modified_since
+
+    def get_conditional_response(self, request, method, *args, **kwargs):
+        state = self.get_catalog_state()
+        etag = self.get_etag(request, state)
+        last_modified = self.get_last_modified(state)
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = f'api_response_{etag}'
+            data = cache.get(key) if settings.API_RESPONSE_CACHE_TIMEOUT else None
+            if data is None:
+                response = method(request, *args, **kwargs)
+                if response.status_code == status.HTTP_200_OK and settings.API_RESPONSE_CACHE_TIMEOUT:
+                    cache.set(key, response.data, settings.API_RESPONSE_CACHE_TIMEOUT)
+            else:
+                response = Response(data)
+        response['ETag'] = quote_etag(etag)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(request, super().retrieve, *args, **kwargs)
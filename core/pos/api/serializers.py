@@ -1,10 +1,18 @@
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import ModelSerializer, SerializerMethodField
 from core.pos.models import Category, Product, Provider
+from core.security.fieldsets import SparseFieldsetSerializerMixin
 
 
+def get_absolute_images(serializer, instance):
+    images = instance.get_images()
+    request = serializer.context.get('request')
+    if request is None:
+        return images
+    return {size: request.build_absolute_uri(url) for size, url in images.items()}
 
 
-class ProviderSerializer(ModelSerializer):
+
+class ProviderSerializer(SparseFieldsetSerializerMixin, ModelSerializer):
     class Meta:
         model = Provider
         fields = ["id", "name", "ruc", "mobile", "email", 
@@ -13,14 +21,22 @@ class ProviderSerializer(ModelSerializer):
                   "active", "created_date"]
 
 
-class CategorySerializer(ModelSerializer):
+class CategorySerializer(SparseFieldsetSerializerMixin, ModelSerializer):
+    images = SerializerMethodField()
+
     class Meta:
         model = Category
-        fields = ["id", "name", "image", "slug", "image_alterna"]
+        fields = ["id", "name", "image", "images", "slug", "image_alterna"]
+        projection_sources = {'images': ['image']}
+
+    def get_images(self, instance):
+        return get_absolute_images(self, instance)
 
 
-class ProductSerializer(ModelSerializer):
+class ProductSerializer(SparseFieldsetSerializerMixin, ModelSerializer):
     # atributData = AttributSerializer(source='atribut', read_only=True, many=True)
+    images = SerializerMethodField()
+
     class Meta:
         model = Product
         fields = [
@@ -33,6 +49,7 @@ class ProductSerializer(ModelSerializer):
             "description",          
             "category",
             "image",        
+            "images",
             "image_alterna",
             "pvp",
             "price",
@@ -42,3 +59,7 @@ class ProductSerializer(ModelSerializer):
             "offer",
             "home",       
         ]
+        projection_sources = {'images': ['image']}
+
+    def get_images(self, instance):
+        return get_absolute_images(self, instance)
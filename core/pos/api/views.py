@@ -2,32 +2,64 @@ from rest_framework.viewsets import ModelViewSet
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 
 
 from ..models import Category, Product, Provider
+from .mixins import CatalogCursorPagination, ConditionalCatalogMixin
+from core.security.fieldsets import SparseFieldsetViewMixin
+from core.pos.utilities.product_sync import ProductSync
 from .serializers import CategorySerializer, ProductSerializer, ProviderSerializer
 
 
 
-class ProviderApiViewSet(ModelViewSet):
+class ProviderApiViewSet(ConditionalCatalogMixin, SparseFieldsetViewMixin, ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     serializer_class = ProviderSerializer
-    queryset = Provider.objects.all().order_by('name')
+    queryset = Provider.objects.all().order_by('name', 'id')
+    pagination_class = CatalogCursorPagination
+    cursor_ordering = ('name', 'id')
+    last_modified_field = None
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     filter_fields = ['active']
 
 
-class CategoryApiViewSet(ModelViewSet):
+class CategoryApiViewSet(ConditionalCatalogMixin, SparseFieldsetViewMixin, ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     serializer_class = CategorySerializer
-    queryset = Category.objects.all()
+    queryset = Category.objects.all().order_by('name')
+    pagination_class = CatalogCursorPagination
+    cursor_ordering = 'name'
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['slug']
 
-class ProductApiViewSet(ModelViewSet):
+class ProductApiViewSet(ConditionalCatalogMixin, SparseFieldsetViewMixin, ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
     serializer_class = ProductSerializer
     queryset = Product.objects.all().order_by('name')
+    pagination_class = CatalogCursorPagination
+    cursor_ordering = 'name'
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     search_fields = ['flag', 'name', 'description', 'ref', 'code', 'pvp']
     filterset_fields = ['slug', 'flag', 'active', 'category']
+
+    @action(detail=False, methods=['get'], url_path='changes')
+    def changes(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 500))
+        except ValueError:
+            raise ValidationError({'limit': 'El límite debe ser un número entero'})
+        try:
+            changes = ProductSync(limit=limit).get_changes(request.query_params.get('since'), self.get_queryset())
+        except ValueError as e:
+            raise ValidationError({'since': str(e)})
+        serializer = self.get_serializer(changes['products'], many=True)
+        return Response({
+            'upserts': serializer.data,
+            'deleted': changes['deleted'],
+            'cursor': changes['cursor'],
+            'has_more': changes['has_more'],
+            'reset': changes['reset']
+        })
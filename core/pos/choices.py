@@ -56,3 +56,39 @@ INVOICE_STATUS = (
     ('authorized_and_sent_by_email', 'Autorizada y enviada por email'),
     ('canceled', 'Anulado'),
 )
+
+ELECTRONIC_BILLING_STAGE = (
+    ('xml_creation', 'Creación del XML'),
+    ('xml_signature', 'Firma del XML'),
+    ('xml_validation', 'Validación del XML'),
+    ('xml_authorized', 'Autorización del XML'),
+    ('pdf_creation', 'Creación del PDF'),
+    ('sent_by_email', 'Enviado por email'),
+    ('finished', 'Finalizado'),
+)
+
+ELECTRONIC_BILLING_STATUS = (
+    ('pending', 'Pendiente'),
+    ('processing', 'Procesando'),
+    ('completed', 'Completado'),
+    ('failed', 'Fallido'),
+)
+
+AUTHORIZATION_POLL_STATUS = (
+    ('pending', 'Pendiente'),
+    ('authorized', 'Autorizado'),
+    ('rejected', 'No autorizado'),
+    ('expired', 'Expirado'),
+)
+
+INVENTORY_MOVEMENT_SOURCE = (
+    ('sale', 'Venta'),
+    ('sale_delete', 'Eliminación de venta'),
+    ('purchase', 'Compra'),
+    ('purchase_delete', 'Eliminación de compra'),
+    ('credit_note', 'Nota de crédito'),
+    ('credit_note_delete', 'Eliminación de nota de crédito'),
+    ('adjustment', 'Ajuste de stock'),
+    ('product', 'Edición del producto'),
+    ('import', 'Importación de productos'),
+)
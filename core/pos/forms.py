@@ -1,6 +1,7 @@
 from django import forms
 
 from .models import *
+from core.pos.utilities.voucher import VoucherNumberAllocator
 
 
 class ProviderForm(forms.ModelForm):
@@ -407,6 +408,8 @@ class PromotionsForm(forms.ModelForm):
 
 
 class ReceiptForm(forms.ModelForm):
+    restart_sequence = forms.BooleanField(required=False, label='Reiniciar secuencia desde el número actual', widget=forms.CheckboxInput(attrs={'class': 'form-control-checkbox'}))
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['name'].widget.attrs['autofocus'] = True
@@ -422,11 +425,29 @@ class ReceiptForm(forms.ModelForm):
             'current_number': forms.TextInput(attrs={'placeholder': 'Ingrese un número de secuencia'}),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        start_number = cleaned_data.get('start_number')
+        end_number = cleaned_data.get('end_number')
+        current_number = cleaned_data.get('current_number')
+        if None in [start_number, end_number, current_number]:
+            return cleaned_data
+        if start_number > end_number:
+            self.add_error('end_number', 'El número final debe ser mayor o igual al inicial')
+        elif not start_number - 1 <= current_number <= end_number:
+            self.add_error('current_number', f'El número actual debe estar entre {start_number - 1} y {end_number}')
+        elif cleaned_data.get('restart_sequence') and self.instance.pk:
+            issued_number = VoucherNumberAllocator().current(self.instance)
+            if current_number < issued_number:
+                self.add_error('current_number', f'La secuencia ya emitió el número {issued_number:09d}, solo puede reiniciarse a un número mayor')
+        return cleaned_data
+
     def save(self, commit=True):
         data = {}
         try:
             if self.is_valid():
-                super().save()
+                instance = super().save(commit=False)
+                instance.save(restart_sequence=self.cleaned_data['restart_sequence'])
             else:
                 data['error'] = self.errors
         except Exception as e:
@@ -0,0 +1,58 @@
+import os
+
+import django
+from django.core.management import BaseCommand
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db.models import Q
+from django_tenants.utils import schema_context
+
+from config import settings
+from core.pos.models import Product
+from core.pos.utilities.barcodes import BarcodeGenerator
+from core.tenant.models import Company
+
+
+class Command(BaseCommand):
+    help = "Generates the content-addressed barcode images of the products"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', type=str, default=None, help='Procesa solo el esquema indicado')
+        parser.add_argument('--all', action='store_true', help='Regenera también los productos que ya tienen imagen')
+        parser.add_argument('--batch', type=int, default=500, help='Productos actualizados por lote')
+
+    def get_schemas(self, options):
+        if options['schema']:
+            return [options['schema']]
+        return list(Company.objects.exclude(scheme__schema_name=settings.DEFAULT_SCHEMA).values_list('scheme__schema_name', flat=True))
+
+    def backfill(self, schema_name, options):
+        generator = BarcodeGenerator()
+        queryset = Product.objects.exclude(Q(code__isnull=True) | Q(code='')).only('id', 'code', 'barcode').order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(Q(barcode__isnull=True) | Q(barcode=''))
+        products = []
+        generated = 0
+        errors = 0
+        for product in queryset.iterator(chunk_size=options['batch']):
+            try:
+                product.barcode.name = generator.generate(product.code, schema_name)
+                products.append(product)
+            except Exception as e:
+                errors += 1
+                print(f'{schema_name} / {product.code}: {str(e)}')
+            if len(products) >= options['batch']:
+                Product.objects.bulk_update(products, fields=['barcode'])
+                generated += len(products)
+                products = []
+        if len(products):
+            Product.objects.bulk_update(products, fields=['barcode'])
+            generated += len(products)
+        print(f'{schema_name}: {generated} productos actualizados, {errors} errores')
+
+    def handle(self, *args, **options):
+        for schema_name in self.get_schemas(options):
+            with schema_context(schema_name):
+                self.backfill(schema_name, options)
@@ -0,0 +1,52 @@
+import os
+
+import django
+from django.core.management import BaseCommand
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db.models import Q
+from django_tenants.utils import schema_context
+
+from config import settings
+from core.pos.models import Category, Product
+from core.security.images import ImageDerivatives
+from core.tenant.models import Company
+from core.user.models import User
+
+
+class Command(BaseCommand):
+    help = "Generates the thumbnail and WebP derivatives of the existing product, category and user images"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', type=str, default=None, help='Procesa solo el esquema indicado')
+        parser.add_argument('--overwrite', action='store_true', help='Vuelve a generar los derivados existentes')
+
+    def get_schemas(self, options):
+        if options['schema']:
+            return [options['schema']]
+        return [settings.DEFAULT_SCHEMA] + list(Company.objects.exclude(scheme__schema_name=settings.DEFAULT_SCHEMA).values_list('scheme__schema_name', flat=True))
+
+    def backfill(self, schema_name, model, options):
+        generated = 0
+        errors = 0
+        queryset = model.objects.exclude(Q(image__isnull=True) | Q(image='')).order_by('id').values_list('image', flat=True)
+        for name in queryset.iterator(chunk_size=500):
+            derivatives = ImageDerivatives(name)
+            if not options['overwrite'] and derivatives.exists():
+                continue
+            try:
+                derivatives.generate(overwrite=options['overwrite'])
+                generated += 1
+            except Exception as e:
+                errors += 1
+                print(f'{schema_name} / {name}: {str(e)}')
+        print(f'{schema_name}: {generated} imágenes de {model._meta.verbose_name_plural.lower()} procesadas, {errors} errores')
+
+    def handle(self, *args, **options):
+        for schema_name in self.get_schemas(options):
+            with schema_context(schema_name):
+                models = [User] if schema_name == settings.DEFAULT_SCHEMA else [Product, Category, User]
+                for model in models:
+                    self.backfill(schema_name, model, options)
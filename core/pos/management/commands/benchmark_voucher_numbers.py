@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+
+import django
+from django.core.management import BaseCommand
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db import connection, transaction
+from django_tenants.utils import schema_context
+
+from core.pos.models import Receipt
+from core.pos.utilities.voucher import VoucherNumberAllocator
+
+
+class Command(BaseCommand):
+    help = "Measures the throughput of the voucher number allocator under concurrency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_name', type=str, help='Nombre del esquema')
+        parser.add_argument('--threads', type=int, default=8, help='Cantidad de cajas concurrentes')
+        parser.add_argument('--count', type=int, default=200, help='Números solicitados por cada caja')
+        parser.add_argument('--legacy', action='store_true', help='Usa la lectura y escritura de Receipt.current_number')
+
+    def allocate_legacy(self, receipt_id):
+        with transaction.atomic():
+            receipt = Receipt.objects.get(pk=receipt_id)
+            number = receipt.current_number + 1
+            Receipt.objects.filter(pk=receipt_id).update(current_number=number)
+            return number
+
+    def allocate(self, receipt):
+        with transaction.atomic():
+            return VoucherNumberAllocator().next(receipt)
+
+    def worker(self, schema_name, receipt, count, legacy, numbers, errors):
+        try:
+            with schema_context(schema_name):
+                for index in range(count):
+                    if legacy:
+                        numbers.append(self.allocate_legacy(receipt.id))
+                    else:
+                        numbers.append(self.allocate(receipt))
+        except Exception as e:
+            errors.append(str(e))
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        schema_name = options['schema_name']
+        with schema_context(schema_name):
+            receipt = Receipt.objects.create(name='BENCHMARK', code=f'B{int(time.time()) % 100000000}', start_number=0, end_number=999999999, current_number=0)
+        numbers = []
+        errors = []
+        threads = [threading.Thread(target=self.worker, args=(schema_name, receipt, options['count'], options['legacy'], numbers, errors)) for index in range(options['threads'])]
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start_time
+        with schema_context(schema_name):
+            receipt.delete()
+        total = len(numbers)
+        duplicates = total - len(set(numbers))
+        gaps = (max(numbers) - min(numbers) + 1 - len(set(numbers))) if total else 0
+        print(f"modo: {'legacy' if options['legacy'] else 'secuencia'}")
+        print(f"cajas: {options['threads']} / números por caja: {options['count']}")
+        print(f'números asignados: {total} en {elapsed:.3f}s ({total / elapsed if elapsed else 0:.1f} por segundo)')
+        print(f'duplicados: {duplicates} / huecos: {gaps} / errores: {len(errors)}')
+        for error in errors[:5]:
+            print(error)
@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import django
+from django.core.management import BaseCommand
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django_tenants.utils import schema_context
+
+from config import settings
+from core.pos.models import Sale, CreditNote
+from core.pos.utilities.voucher_xml import VoucherXmlBuilder, InvoiceXmlBuilder, CreditNoteXmlBuilder
+
+# Se ejecuta dentro de una copia de trabajo del commit indicado, con los mismos comprobantes y la clave de acceso fija
+LEGACY_SCRIPT = '''
+import os
+import sys
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+import django
+django.setup()
+
+from django_tenants.utils import schema_context
+
+from core.pos.models import Sale, CreditNote
+from core.pos.utilities.sri import SRI
+
+SRI.create_access_key = lambda self, instance: '0' * 49
+schema_name, count = sys.argv[1], int(sys.argv[2])
+with schema_context(schema_name):
+    for model, pk in [(Sale, sys.argv[3]), (CreditNote, sys.argv[4])]:
+        instance = model.objects.filter(pk=pk).first()
+        if instance is None:
+            print(0)
+            continue
+        start_time = time.perf_counter()
+        for index in range(count):
+            instance.generate_xml()
+        print((time.perf_counter() - start_time) / count * 1000)
+'''
+
+
+class Command(BaseCommand):
+    help = "Measures the time to build the voucher XML with and without the cached company skeleton, and optionally with the code of a previous commit"
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_name', type=str, help='Nombre del esquema')
+        parser.add_argument('--count', type=int, default=500, help='Comprobantes generados por cada prueba')
+        parser.add_argument('--legacy', type=str, default=None, help='Commit de git con la implementación anterior a comparar, por ejemplo el anterior a VoucherXmlBuilder')
+
+    def measure(self, builder_class, instance, count, cold):
+        access_key = '0' * 49
+        start_time = time.perf_counter()
+        for index in range(count):
+            if cold:
+                VoucherXmlBuilder.skeletons.clear()
+            builder_class(instance).build(access_key)
+        return (time.perf_counter() - start_time) / count * 1000
+
+    def measure_legacy(self, ref, schema_name, count, instances):
+        # El commit anterior se extrae en un worktree temporal y se mide en otro proceso con su propio registro de modelos
+        directory = tempfile.mkdtemp(prefix='benchmark_voucher_xml_')
+        subprocess.run(['git', 'worktree', 'add', '--detach', directory, ref], cwd=settings.BASE_DIR, check=True, capture_output=True)
+        try:
+            ids = [str(instance.id if instance else 0) for name, builder_class, instance in instances]
+            process = subprocess.run([sys.executable, '-c', LEGACY_SCRIPT, schema_name, str(count), *ids], cwd=directory, capture_output=True)
+            if process.returncode != 0:
+                raise Exception(process.stderr.decode('utf-8'))
+            return [float(value) for value in process.stdout.decode('utf-8').split()]
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', directory], cwd=settings.BASE_DIR, capture_output=True)
+
+    def handle(self, *args, **options):
+        count = options['count']
+        schema_name = options['schema_name']
+        with schema_context(schema_name):
+            instances = [
+                ('factura', InvoiceXmlBuilder, Sale.objects.select_related('company', 'receipt').order_by('-id').first()),
+                ('nota de crédito', CreditNoteXmlBuilder, CreditNote.objects.select_related('company', 'receipt', 'sale__client__user', 'sale__receipt').order_by('-id').first())
+            ]
+            results = []
+            for name, builder_class, instance in instances:
+                if instance is None:
+                    results.append(None)
+                    continue
+                size = len(builder_class(instance).build('0' * 49))
+                results.append((size, self.measure(builder_class, instance, count, True), self.measure(builder_class, instance, count, False)))
+        legacy = self.measure_legacy(options['legacy'], schema_name, count, instances) if options['legacy'] else None
+        for index, (name, builder_class, instance) in enumerate(instances):
+            if instance is None:
+                print(f'{name}: no hay comprobantes para medir')
+                continue
+            size, cold, warm = results[index]
+            print(f'{name} #{instance.id} ({size} bytes)')
+            print(f'sin plantilla: {cold:.3f} ms por comprobante / con plantilla: {warm:.3f} ms por comprobante')
+            if legacy is not None:
+                print(f"{options['legacy']}: {legacy[index]:.3f} ms por comprobante / mejora: {legacy[index] / warm if warm else 0:.1f}x")
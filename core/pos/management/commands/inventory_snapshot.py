@@ -0,0 +1,41 @@
+import os
+from datetime import datetime
+
+import django
+from django.core.management import BaseCommand
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django_tenants.utils import schema_context
+
+from config import settings
+from core.pos.utilities.inventory import InventoryLedger
+from core.tenant.models import Company
+
+
+class Command(BaseCommand):
+    help = "Takes the daily inventory snapshot and reconciles the product stock against the movement ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', type=str, default=None, help='Procesa solo el esquema indicado')
+        parser.add_argument('--reconcile', action='store_true', help='Corrige el stock de los productos que difieren del kardex')
+        parser.add_argument('--valuation', type=str, default=None, help='Muestra la valoración del inventario a la fecha indicada (YYYY-MM-DD) sin tomar el corte')
+
+    def get_schemas(self, options):
+        if options['schema']:
+            return [options['schema']]
+        return list(Company.objects.exclude(scheme__schema_name=settings.DEFAULT_SCHEMA).values_list('scheme__schema_name', flat=True))
+
+    def handle(self, *args, **options):
+        for schema_name in self.get_schemas(options):
+            with schema_context(schema_name):
+                ledger = InventoryLedger()
+                if options['valuation']:
+                    valuation = ledger.get_valuation(datetime.strptime(options['valuation'], '%Y-%m-%d').date())
+                    print(f"{schema_name}: {len(valuation['products'])} productos, valoración {valuation['total']:.2f}")
+                    continue
+                if options['reconcile']:
+                    for item in ledger.reconcile():
+                        print(f"{schema_name} / {item['name']}: stock {item['stock']}, kardex {item['ledger_stock']}")
+                print(f'{schema_name}: {ledger.take_snapshot()} productos en el corte')
@@ -0,0 +1,53 @@
+import os
+import time
+
+import django
+from django.core.management import BaseCommand
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django_tenants.utils import schema_context
+
+from config import settings
+from core.pos.utilities.authorization import AuthorizationPoller
+from core.pos.utilities.electronic_billing import ElectronicBillingPipeline
+from core.tenant.models import Company
+
+
+class Command(BaseCommand):
+    help = "Processes the pending electronic billing jobs of every company"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', type=str, default=None, help='Procesa solo el esquema indicado')
+        parser.add_argument('--batch', type=int, default=10, help='Trabajos tomados por esquema en cada vuelta')
+        parser.add_argument('--loop', action='store_true', help='Se mantiene en ejecución procesando la cola')
+        parser.add_argument('--sleep', type=float, default=5, help='Segundos de espera cuando la cola está vacía')
+
+    def get_schemas(self, options):
+        if options['schema']:
+            return [options['schema']]
+        return list(Company.objects.exclude(scheme__schema_name=settings.DEFAULT_SCHEMA).values_list('scheme__schema_name', flat=True))
+
+    def process(self, options):
+        pipeline = ElectronicBillingPipeline()
+        poller = AuthorizationPoller()
+        processed = 0
+        for schema_name in self.get_schemas(options):
+            with schema_context(schema_name):
+                # Las consultas de autorización van primero para que los trabajos reanudados se procesen en la misma vuelta
+                for poll in poller.run_pending():
+                    processed += 1
+                    print(f'{schema_name} / autorización {poll.access_code} / intento {poll.attempts} / {poll.get_status_display()}')
+                for job in pipeline.run_pending(limit=options['batch']):
+                    processed += 1
+                    print(f'{schema_name} / trabajo {job.id} / {job.get_stage_display()} / {job.get_status_display()}')
+        return processed
+
+    def handle(self, *args, **options):
+        while True:
+            processed = self.process(options)
+            if not options['loop']:
+                break
+            if processed == 0:
+                time.sleep(options['sleep'])
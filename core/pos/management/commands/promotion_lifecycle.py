@@ -0,0 +1,31 @@
+import os
+
+import django
+from django.core.management import BaseCommand
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django_tenants.utils import schema_context
+
+from config import settings
+from core.pos.utilities.promotion import PromotionLifecycle
+from core.tenant.models import Company
+
+
+class Command(BaseCommand):
+    help = "Activates and expires the promotions whose dates start or end today"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', type=str, default=None, help='Procesa solo el esquema indicado')
+
+    def get_schemas(self, options):
+        if options['schema']:
+            return [options['schema']]
+        return list(Company.objects.exclude(scheme__schema_name=settings.DEFAULT_SCHEMA).values_list('scheme__schema_name', flat=True))
+
+    def handle(self, *args, **options):
+        for schema_name in self.get_schemas(options):
+            with schema_context(schema_name):
+                result = PromotionLifecycle().run()
+                print(f"{schema_name}: {result['activated']} promociones activadas, {result['expired']} vencidas")
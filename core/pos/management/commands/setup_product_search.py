@@ -0,0 +1,42 @@
+import os
+
+import django
+from django.core.management import BaseCommand
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db import connection
+from django_tenants.utils import schema_context
+
+from config import settings
+from core.pos.models import Product
+from core.tenant.models import Company
+
+
+class Command(BaseCommand):
+    help = "Creates the pg_trgm extension and the trigram indexes used by the product search"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', type=str, default=None, help='Procesa solo el esquema indicado')
+
+    def get_schemas(self, options):
+        if options['schema']:
+            return [options['schema']]
+        return list(Company.objects.exclude(scheme__schema_name=settings.DEFAULT_SCHEMA).values_list('scheme__schema_name', flat=True))
+
+    def create_indexes(self, schema_name):
+        table = Product._meta.db_table
+        with connection.cursor() as cursor:
+            for field in ['name', 'code']:
+                # CONCURRENTLY evita bloquear las ventas mientras se construye el índice
+                cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_{field}_trgm ON "{schema_name}"."{table}" USING gin ({field} gin_trgm_ops)')
+        print(f'{schema_name}: índices de búsqueda creados')
+
+    def handle(self, *args, **options):
+        with schema_context(settings.DEFAULT_SCHEMA):
+            with connection.cursor() as cursor:
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for schema_name in self.get_schemas(options):
+            with schema_context(schema_name):
+                self.create_indexes(schema_name)
@@ -1,21 +1,15 @@
 import base64
 import math
 import tempfile
-import time
 from datetime import datetime
 from django.utils import timezone
-from io import BytesIO
-from xml.etree import ElementTree
 from django.urls import reverse
 import uuid
 from django.utils.text import slugify
 
-import barcode
 import unicodedata
-from barcode import writer
 from crum import get_current_request
 from django.core.files import File
-from django.core.files.base import ContentFile
 from django.db import models
 from django.db.models import FloatField
 from django.db.models import Sum
@@ -25,9 +19,16 @@ from django.forms import model_to_dict
 from config import settings
 from core.pos.choices import *
 from core.pos.utilities import printer
+from core.pos.utilities.authorization import AuthorizationPoller
+from core.pos.utilities.barcodes import BarcodeGenerator
+from core.pos.utilities.invoice import InvoiceCalculator, PurchaseInvoiceCalculator
+from core.pos.utilities.promotion import PromotionPriceIndex
 from core.pos.utilities.sri import SRI
+from core.pos.utilities.stock import StockService
+from core.pos.utilities.voucher import VoucherNumberAllocator
+from core.pos.utilities.voucher_xml import InvoiceXmlBuilder, CreditNoteXmlBuilder
 from core.security.fields import CustomImageField, CustomFileField
-from core.tenant.choices import RETENTION_AGENT
+from core.security.images import ImageDerivatives
 from core.tenant.models import Company, ENVIRONMENT_TYPE
 from core.user.models import User
 
@@ -101,9 +102,15 @@ class Category(models.Model):
             return f'{settings.MEDIA_URL}/{self.image}'
         return f'{settings.STATIC_URL}img/default/empty.png'
 
+    def get_images(self):
+        if self.image:
+            return ImageDerivatives(self.image.name).get_urls()
+        return ImageDerivatives.get_default_urls()
+
     def toJSON(self):
         item = model_to_dict(self)
         item['image'] = self.get_image()
+        item['images'] = self.get_images()
         return item
 
     class Meta:
@@ -141,7 +148,7 @@ class Product(models.Model):
     )
     slug = models.SlugField(max_length=150, blank=True, verbose_name=("Url"))
     barcode = CustomImageField(
-        folder='barcode', null=True, blank=True, verbose_name='Código de barra')
+        folder='barcode', derivatives=False, null=True, blank=True, verbose_name='Código de barra')
     inventoried = models.BooleanField(
         default=True, verbose_name='¿Es inventariado?')
     stock = models.IntegerField(default=0)
@@ -175,11 +182,7 @@ class Product(models.Model):
         return 'No inventariado'
 
     def get_price_promotion(self):
-        promotions = self.promotionsdetail_set.filter(
-            promotion__state=True).first()
-        if promotions:
-            return promotions.price_final
-        return 0.00
+        return PromotionPriceIndex().get_price(self.id)
 
     def get_price_current(self):
         price_promotion = self.get_price_promotion()
@@ -192,22 +195,37 @@ class Product(models.Model):
             return f'{settings.MEDIA_URL}/{self.image}'
         return f'{settings.STATIC_URL}img/default/empty.png'
 
+    def get_images(self):
+        if self.image:
+            return ImageDerivatives(self.image.name).get_urls()
+        return ImageDerivatives.get_default_urls()
+
     def get_barcode(self):
         if self.barcode:
             return f'{settings.MEDIA_URL}/{self.barcode}'
+        if self.code:
+            try:
+                return f'{settings.MEDIA_URL}/{BarcodeGenerator().generate(self.code)}'
+            except:
+                pass
         return f'{settings.STATIC_URL}img/default/empty.png'
 
     def get_benefit(self):
         benefit = float(self.pvp) - float(self.price)
         return round(benefit, 2)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_code = instance.__dict__.get('code')
+        instance._loaded_stock = instance.__dict__.get('stock')
+        return instance
+
+    def has_code_changed(self):
+        return getattr(self, '_loaded_code', None) != self.code
+
     def generate_barcode(self):
-        image_io = BytesIO()
-        barcode.Gs1_128(
-            self.code, writer=barcode.writer.ImageWriter()).write(image_io)
-        filename = f'{self.code}.png'
-        self.barcode.save(filename, content=ContentFile(
-            image_io.getvalue()), save=False)
+        self.barcode.name = BarcodeGenerator().generate(self.code)
 
     def toJSON(self):
         item = model_to_dict(self)
@@ -224,6 +242,7 @@ class Product(models.Model):
         item['max_cant'] = float(self.max_cant)
         item['max_pvp'] = float(self.max_pvp)
         item['image'] = self.get_image()
+        item['images'] = self.get_images()
         item['barcode'] = self.get_barcode()
         return item
 
@@ -234,9 +253,20 @@ class Product(models.Model):
         if not self.slug:
             self.slug = slugify(self.name)
 
-        self.generate_barcode()
+        if self.code and (not self.barcode or self.has_code_changed()):
+            self.generate_barcode()
 
+        stock_delta = 0
+        if self._state.adding:
+            stock_delta = self.stock
+        elif getattr(self, '_loaded_stock', None) is not None:
+            stock_delta = self.stock - self._loaded_stock
         super(Product, self).save()
+        self._loaded_code = self.code
+        self._loaded_stock = self.stock
+        # Los cambios de stock hechos desde el formulario también quedan en el kardex
+        if self.inventoried and stock_delta != 0:
+            InventoryMovement.objects.create(product_id=self.id, quantity=stock_delta, cost=self.price, source='product', source_id=self.id)
 
     class Meta:
         verbose_name = 'Producto'
@@ -249,6 +279,9 @@ class Product(models.Model):
             ('delete_product', 'Can delete Producto'),
             ('adjust_product_stock', 'Can adjust_product_stock Producto'),
         )
+        indexes = [
+            models.Index(fields=['modified_date', 'id']),
+        ]
 
 
 class Purchase(models.Model):
@@ -268,19 +301,18 @@ class Purchase(models.Model):
     def __str__(self):
         return self.provider.name
 
-    def calculate_invoice(self):
-        subtotal = 0.00
-        for i in self.purchasedetail_set.all():
-            subtotal += float(i.price) * int(i.cant)
-        self.subtotal = subtotal
-        self.save()
+    def calculate_invoice(self, details=None):
+        if details is None:
+            details = self.purchasedetail_set.all()
+        PurchaseInvoiceCalculator(self, details).save()
 
     def delete(self, using=None, keep_parents=False):
         try:
-            for i in self.purchasedetail_set.all():
-                i.product.stock -= i.cant
-                i.product.save()
-                i.delete()
+            stock = StockService(source='purchase_delete', source_id=self.id, inventoried_only=False)
+            for product_id, cant in self.purchasedetail_set.values_list('product_id', 'cant'):
+                stock.subtract(product_id, cant)
+            stock.apply()
+            self.purchasedetail_set.all().delete()
         except:
             pass
         super(Purchase, self).delete()
@@ -395,7 +427,13 @@ class Receipt(models.Model):
         return ''.join((c for c in unicodedata.normalize('NFD', text) if unicodedata.category(c) != 'Mn'))
 
     def get_current_number(self):
-        return f'{self.current_number:09d}'
+        return f'{VoucherNumberAllocator().current(self):09d}'
+
+    def get_next_number(self):
+        return f'{VoucherNumberAllocator().current(self) + 1:09d}'
+
+    def allocate_number(self):
+        return f'{VoucherNumberAllocator().next(self):09d}'
 
     def toJSON(self):
         item = model_to_dict(self)
@@ -403,6 +441,21 @@ class Receipt(models.Model):
         item['end_number'] = f'{self.end_number:09d}'
         return item
 
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None, restart_sequence=False):
+        super(Receipt, self).save()
+        allocator = VoucherNumberAllocator()
+        allocator.reset(self, restart=restart_sequence)
+        # El número actual lo define la secuencia, el valor enviado por el formulario solo se usa al reiniciarla
+        current_number = allocator.current(self)
+        if int(self.current_number) != current_number:
+            self.current_number = current_number
+            Receipt.objects.filter(pk=self.pk).update(current_number=current_number)
+
+    def delete(self, using=None, keep_parents=False):
+        allocator = VoucherNumberAllocator()
+        allocator.drop(self)
+        super(Receipt, self).delete()
+
     class Meta:
         verbose_name = 'Comprobante'
         verbose_name_plural = 'Comprobantes'
@@ -504,8 +557,14 @@ class Sale(models.Model):
         return f'{self.company.establishment_code}-{self.company.issuing_point_code}-{self.voucher_number}'
 
     def generate_voucher_number(self):
-        number = int(self.receipt.get_current_number()) + 1
-        return f'{number:09d}'
+        return self.receipt.allocate_number()
+
+    def assign_voucher_number(self):
+        # Se llama al final de la transacción, después de validar el stock y calcular los totales,
+        # así un comprobante rechazado no consume un número de la secuencia
+        self.voucher_number = self.generate_voucher_number()
+        self.voucher_number_full = self.get_voucher_number_full()
+        type(self).objects.filter(pk=self.pk).update(voucher_number=self.voucher_number, voucher_number_full=self.voucher_number_full)
 
     def generate_voucher_number_full(self):
         request = get_current_request()
@@ -513,14 +572,11 @@ class Sale(models.Model):
             self.company = request.tenant.company
         if self.receipt_id is None:
             self.receipt = Receipt.objects.get(code=VOUCHER_TYPE[0][0])
-        self.voucher_number = self.generate_voucher_number()
+        self.voucher_number = self.receipt.get_next_number()
         return self.get_voucher_number_full()
 
     def generate_pdf_authorized(self):
-        rv = BytesIO()
-        barcode.Code128(self.access_code,
-                        writer=barcode.writer.ImageWriter()).write(rv)
-        file = base64.b64encode(rv.getvalue()).decode("ascii")
+        file = base64.b64encode(BarcodeGenerator('code128').render(self.access_code)).decode("ascii")
         context = {'sale': self,
                    'access_code_barcode': f"data:image/png;base64,{file}"}
         pdf_file = printer.create_pdf(
@@ -533,749 +589,7 @@ class Sale(models.Model):
 
     def generate_xml(self):
         access_key = SRI().create_access_key(self)
-        # root = ElementTree.Element('factura', id="comprobante", version="1.0.0")
-        root = ElementTree.Element('Invoice',
-                                   xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2",
-                                   xmlns_cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2",
-                                   xmlns_cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
-                                   xmlns_ds="http://www.w3.org/2000/09/xmldsig#",
-                                   xmlns_ext="urn:oasis:names:specification:ubl:schema:xsd:CommonExtensionComponents-2",
-                                   xmlns_sts="dian:gov:co:facturaelectronica:Structures-2-1",
-                                   xmlns_xades="http://uri.etsi.org/01903/v1.3.2#",
-                                   xmlns_xades141="http://uri.etsi.org/01903/v1.4.1#",
-                                   xmlns_xsi="http://www.w3.org/2001/XMLSchema-instance",
-                                   xsi_schemaLocation="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2 http://docs.oasis-open.org/ubl/os-UBL-2.1/xsd/maindoc/UBL-Invoice-2.1.xsd")
-        # infoTributaria
-
-        xml_UBLExtensions = ElementTree.SubElement(root, 'ext:UBLExtensions')
-        xml_UBLExtension = ElementTree.SubElement(
-            xml_UBLExtensions, 'ext:UBLExtension')
-        xml_ExtensionContent = ElementTree.SubElement(
-            xml_UBLExtension, 'ext:ExtensionContent')
-        xml_DianExtensions = ElementTree.SubElement(
-            xml_ExtensionContent, 'sts:DianExtensions')
-        xml_InvoiceControl = ElementTree.SubElement(
-            xml_DianExtensions, 'sts:InvoiceControl')
-
-        xml_InvoiceAuthorization = ElementTree.SubElement(
-            xml_InvoiceControl, 'sts:InvoiceAuthorization')
-        xml_InvoiceAuthorization.text = '18760000001'
-
-        # Crea el subelemento AuthorizationPeriod y sus subelementos
-        xml_AuthorizationPeriod = ElementTree.SubElement(
-            xml_InvoiceControl, 'sts:AuthorizationPeriod')
-        xml_StartDate = ElementTree.SubElement(
-            xml_AuthorizationPeriod, 'cbc:StartDate')
-        xml_StartDate.text = '2019-01-19'
-        xml_EndDate = ElementTree.SubElement(
-            xml_AuthorizationPeriod, 'cbc:EndDate')
-        xml_EndDate.text = '2030-01-19'
-
-        # Crea el subelemento AuthorizedInvoices y sus subelementos
-        xml_AuthorizedInvoices = ElementTree.SubElement(
-            xml_InvoiceControl, 'sts:AuthorizedInvoices')
-        xml_Prefix = ElementTree.SubElement(
-            xml_AuthorizedInvoices, 'sts:Prefix')
-        xml_Prefix.text = 'SETP'
-        xml_From = ElementTree.SubElement(xml_AuthorizedInvoices, 'sts:From')
-        xml_From.text = '990000000'
-        xml_To = ElementTree.SubElement(xml_AuthorizedInvoices, 'sts:To')
-        xml_To.text = '995000000'
-
-        # Crea el elemento InvoiceSource y sus subelementos
-        xml_InvoiceSource = ElementTree.SubElement(
-            xml_DianExtensions, 'sts:InvoiceSource')
-        xml_IdentificationCode = ElementTree.SubElement(
-            xml_InvoiceSource, 'cbc:IdentificationCode')
-        xml_IdentificationCode.set('listAgencyID', '6')
-        xml_IdentificationCode.set(
-            'listAgencyName', 'United Nations Economic Commission for Europe')
-        xml_IdentificationCode.set(
-            'listSchemeURI', 'urn:oasis:names:specification:ubl:codelist:gc:CountryIdentificationCode-2.1')
-        xml_IdentificationCode.text = 'CO'
-
-        # Agregar el elemento sts:SoftwareProvider
-        xml_SoftwareProvider = ElementTree.SubElement(
-            xml_DianExtensions, 'sts:SoftwareProvider')
-
-        xml_ProviderID = ElementTree.SubElement(
-            xml_SoftwareProvider, 'sts:ProviderID')
-        xml_ProviderID.text = '800197268'
-        xml_ProviderID.set('schemeAgencyID', '195')
-        xml_ProviderID.set(
-            'schemeAgencyName', 'CO, DIAN (Dirección de Impuestos y Aduanas Nacionales)')
-        xml_ProviderID.set('schemeID', '4')
-        xml_ProviderID.set('schemeName', '31')
-        xml_SoftwareID = ElementTree.SubElement(
-            xml_SoftwareProvider, 'sts:SoftwareID')
-        xml_SoftwareID.text = '56f2ae4e-9812-4fad-9255-08fcfcd5ccb0'
-        xml_SoftwareID.set('schemeAgencyID', '195')
-        xml_SoftwareID.set(
-            'schemeAgencyName', 'CO, DIAN (Dirección de Impuestos y Aduanas Nacionales)')
-        xml_SoftwareSecurityCode = ElementTree.SubElement(
-            xml_SoftwareProvider, 'sts:SoftwareSecurityCode')
-        xml_SoftwareSecurityCode.text = 'a8d18e4e5aa00b44a0b1f9ef413ad8215116bd3ce91730d580eaed795c83b5a32fe6f0823abc71400b3d59eb542b7de8'
-        xml_SoftwareSecurityCode.set('schemeAgencyID', '195')
-        xml_SoftwareSecurityCode.set(
-            'schemeAgencyName', 'CO, DIAN (Dirección de Impuestos y Aduanas Nacionales)')
-
-       # Agregar la subextensión sts:SoftwareSecurityCode
-        xml_SoftwareSecurityCode = ElementTree.SubElement(
-            xml_DianExtensions, 'sts:SoftwareSecurityCode')
-        xml_SoftwareSecurityCode.set('schemeAgencyID', '195')
-        xml_SoftwareSecurityCode.set(
-            'schemeAgencyName', 'CO, DIAN (Dirección de Impuestos y Aduanas Nacionales)')
-        xml_SoftwareSecurityCode.text = 'a8d18e4e5aa00b44a0b1f9ef413ad8215116bd3ce91730d580eaed795c83b5a32fe6f0823abc71400b3d59eb542b7de8'
-
-        # Agregar el elemento sts:AuthorizationProvider
-        xml_AuthorizationProvider = ElementTree.SubElement(
-            xml_DianExtensions, 'sts:AuthorizationProvider')
-
-        # Agregar el subelemento de sts:AuthorizationProvider
-        xml_AuthorizationProviderID = ElementTree.SubElement(
-            xml_AuthorizationProvider, 'sts:AuthorizationProviderID')
-        xml_AuthorizationProviderID.set('schemeAgencyID', '195')
-        xml_AuthorizationProviderID.set(
-            'schemeAgencyName', 'CO, DIAN (Dirección de Impuestos y Aduanas Nacionales)')
-        xml_AuthorizationProviderID.set('schemeID', '4')
-        xml_AuthorizationProviderID.set('schemeName', '31')
-        xml_AuthorizationProviderID.text = '800197268'
-
-        # Agregar el elemento sts:QRCode
-        xml_QRCode = ElementTree.SubElement(xml_DianExtensions, 'sts:QRCode')
-        xml_QRCode.text = '''NroFactura=SETP990000002
-        NitFacturador=800197268
-        NitAdquiriente=900108281
-        FechaFactura=2019-06-20
-        ValorTotalFactura=14024.07
-        CUFE=941cf36af62dbbc06f105d2a80e9bfe683a90e84960eae4d351cc3afbe8f848c26c39bac4fbc80fa254824c6369ea694
-        URL=https://catalogo-vpfe-hab.dian.gov.co/Document/FindDocument?documentKey=941cf36af62dbbc06f105d2a80e9bfe683a90e84960eae4d351cc3afbe8f848c26c39bac4fbc80fa254824c6369ea694&amp;partitionKey=co|06|94&amp;emissionDate=20190620'''
-
-        # Crear el elemento ds:Signature con su atributo Id
-
-        xml_UBLExtension = ElementTree.SubElement(
-            xml_UBLExtensions, 'ext:UBLExtension')
-        xml_ExtensionContent = ElementTree.SubElement(
-            xml_UBLExtension, 'ext:ExtensionContent')
-        xml_Signature = ElementTree.SubElement(
-            xml_ExtensionContent, 'ds:Signature')
-        xml_Signature.set('Id', 'xmldsig-d0322c4f-be87-495a-95d5-9244980495f4')
-
-        xml_SignedInfo = ElementTree.SubElement(xml_Signature, 'ds:SignedInfo')
-
-        ds_CanonicalizationMethod = ElementTree.SubElement(
-            xml_SignedInfo, 'ds:CanonicalizationMethod')
-        ds_CanonicalizationMethod.set(
-            'Algorithm', 'http://www.w3.org/TR/2001/REC-xml-c14n-20010315')
-        ds_SignatureMethod = ElementTree.SubElement(
-            xml_SignedInfo, 'ds:SignatureMethod')
-        ds_SignatureMethod.set(
-            'Algorithm', 'http://www.w3.org/2001/04/xmldsig-more#rsa-sha256')
-
-        ds_Reference1 = ElementTree.SubElement(xml_SignedInfo, 'ds:Reference')
-        ds_Reference1.set(
-            'Id', 'xmldsig-d0322c4f-be87-495a-95d5-9244980495f4-ref0')
-        ds_Transforms1 = ElementTree.SubElement(ds_Reference1, 'ds:Transforms')
-        ds_Transform1 = ElementTree.SubElement(ds_Transforms1, 'ds:Transform')
-        ds_Transform1.set(
-            'Algorithm', 'http://www.w3.org/2000/09/xmldsig#enveloped-signature')
-        ds_DigestMethod1 = ElementTree.SubElement(
-            ds_Reference1, 'ds:DigestMethod')
-        ds_DigestMethod1.set(
-            'Algorithm', 'http://www.w3.org/2001/04/xmlenc#sha256')
-        ds_DigestValue1 = ElementTree.SubElement(
-            ds_Reference1, 'ds:DigestValue')
-        ds_DigestValue1.text = 'akcOQ5qEh4dkMwt0d5BoXRR8Bo4vdy9DBZtfF5O0SsA='
-
-        ds_Reference2 = ElementTree.SubElement(xml_SignedInfo, 'ds:Reference')
-        ds_Reference2.set(
-            'URI', '#xmldsig-87d128b5-aa31-4f0b-8e45-3d9cfa0eec26-keyinfo')
-        ds_DigestMethod2 = ElementTree.SubElement(
-            ds_Reference2, 'ds:DigestMethod')
-        ds_DigestMethod2.set(
-            'Algorithm', 'http://www.w3.org/2001/04/xmlenc#sha256')
-        ds_DigestValue2 = ElementTree.SubElement(
-            ds_Reference2, 'ds:DigestValue')
-        ds_DigestValue2.text = 'troRYR2fcmJLV6gYibVM6XlArbddSCkjYkACZJP47/4='
-
-        ds_Reference3 = ElementTree.SubElement(xml_SignedInfo, 'ds:Reference')
-        ds_Reference3.set('Type', 'http://uri.etsi.org/01903#SignedProperties')
-        ds_Reference3.set(
-            'URI', '#xmldsig-d0322c4f-be87-495a-95d5-9244980495f4-signedprops')
-        ds_DigestMethod3 = ElementTree.SubElement(
-            ds_Reference3, 'ds:DigestMethod')
-        ds_DigestMethod3.set(
-            'Algorithm', 'http://www.w3.org/2001/04/xmlenc#sha256')
-        ds_DigestValue3 = ElementTree.SubElement(
-            ds_Reference3, 'ds:DigestValue')
-        ds_DigestValue3.text = 'hpIsyD/08hVUc1exnfEyhGyKX5s3pUPbpMKmPhkPPqU='
-
-        # Agregar el elemento ds:SignatureValue con su atributo Id
-        ds_SignatureValue = ElementTree.SubElement(
-            xml_Signature, 'ds:SignatureValue')
-        ds_SignatureValue.set(
-            'Id', 'xmldsig-d0322c4f-be87-495a-95d5-9244980495f4-sigvalue')
-        ds_SignatureValue.text = """
-                        q4HWeb47oLdDM4D3YiYDOSXE4YfSHkQKxUfSYiEiPuP2XWvD7ELZTC4ENFv6krgDAXczmi0W7OMi
-                        LIVvuFz0ohPUc4KNlUEzqSBHVi6sC34sCqoxuRzOmMEoCB9Tr4VICxU1Ue9XhgP7o6X4f8KFAQWW
-                        NaeTtA6WaO/yUtq91MKP59aAnFMfYl8lXpaS0kpUwuui3wdCZsGycsl1prEWiwzpaukEUOXyTo7o
-                        RBOuNsDIUhP24Fv1alRFnX6/9zEOpRTs4rEQKN3IQnibF757LE/nnkutElZHTXaSV637gpHjXoUN
-                        5JrUwTNOXvmFS98N6DczCQfeNuDIozYwtFVlMw==
-                    """
-
-        # Agregar el elemento ds:KeyInfo
-        ds_KeyInfo = ElementTree.SubElement(xml_Signature, 'ds:KeyInfo')
-        ds_KeyInfo.set(
-            'Id', 'xmldsig-87d128b5-aa31-4f0b-8e45-3d9cfa0eec26-keyinfo')
-
-        # Agregar el subelemento ds:X509Data
-        ds_X509Data = ElementTree.SubElement(ds_KeyInfo, 'ds:X509Data')
-
-        # Agregar el subelemento ds:X509Certificate dentro de ds:X509Data
-        ds_X509Certificate = ElementTree.SubElement(
-            ds_X509Data, 'ds:X509Certificate')
-        ds_X509Certificate.text = """
-                                MIIIODCCBiCgAwIBAgIIbAsHYmJtoOIwDQYJKoZIhvcNAQELBQAwgbQxIzAhBgkqhkiG9w0BCQEW
-                                FGluZm9AYW5kZXNzY2QuY29tLmNvMSMwIQYDVQQDExpDQSBBTkRFUyBTQ0QgUy5BLiBDbGFzZSBJ
-                                STEwMC4GA1UECxMnRGl2aXNpb24gZGUgY2VydGlmaWNhY2lvbiBlbnRpZGFkIGZpbmFsMRMwEQYD
-                                VQQKEwpBbmRlcyBTQ0QuMRQwEgYDVQQHEwtCb2dvdGEgRC5DLjELMAkGA1UEBhMCQ08wHhcNMTcw
-                                OTE2MTM0ODE5WhcNMjAwOTE1MTM0ODE5WjCCARQxHTAbBgNVBAkTFENhbGxlIEZhbHNhIE5vIDEy
-                                IDM0MTgwNgYJKoZIhvcNAQkBFilwZXJzb25hX2p1cmlkaWNhX3BydWViYXMxQGFuZGVzc2NkLmNv
-                                bS5jbzEsMCoGA1UEAxMjVXN1YXJpbyBkZSBQcnVlYmFzIFBlcnNvbmEgSnVyaWRpY2ExETAPBgNV
-                                BAUTCDExMTExMTExMRkwFwYDVQQMExBQZXJzb25hIEp1cmlkaWNhMSgwJgYDVQQLEx9DZXJ0aWZp
-                                Y2FkbyBkZSBQZXJzb25hIEp1cmlkaWNhMQ8wDQYDVQQHEwZCb2dvdGExFTATBgNVBAgTDEN1bmRp
-                                bmFtYXJjYTELMAkGA1UEBhMCQ08wggEiMA0GCSqGSIb3DQEBAQUAA4IBDwAwggEKAoIBAQC0Dn8t
-                                oZ2CXun+63zwYecJ7vNmEmS+YouH985xDek7ImeE9lMBHXE1M5KDo7iT/tUrcFwKj717PeVL52Nt
-                                B6WU4+KBt+nrK+R+OSTpTno5EvpzfIoS9pLI74hHc017rY0wqjl0lw+8m7fyLfi/JO7AtX/dthS+
-                                MKHIcZ1STPlkcHqmbQO6nhhr/CGl+tKkCMrgfEFIm1kv3bdWqk3qHrnFJ6s2GoVNZVCTZW/mOzPC
-                                NnnUW12LDd/Kd+MjN6aWbP0D/IJbB42Npqv8+/oIwgCrbt0sS1bysUgdT4im9bBhb00MWVmNRBBe
-                                3pH5knzkBid0T7TZsPCyiMBstiLT3yfpAgMBAAGjggLpMIIC5TAMBgNVHRMBAf8EAjAAMB8GA1Ud
-                                IwQYMBaAFKhLtPQLp7Zb1KAohRCdBBMzxKf3MDcGCCsGAQUFBwEBBCswKTAnBggrBgEFBQcwAYYb
-                                aHR0cDovL29jc3AuYW5kZXNzY2QuY29tLmNvMIIB4wYDVR0gBIIB2jCCAdYwggHSBg0rBgEEAYH0
-                                SAECCQIFMIIBvzBBBggrBgEFBQcCARY1aHR0cDovL3d3dy5hbmRlc3NjZC5jb20uY28vZG9jcy9E
-                                UENfQW5kZXNTQ0RfVjIuNS5wZGYwggF4BggrBgEFBQcCAjCCAWoeggFmAEwAYQAgAHUAdABpAGwA
-                                aQB6AGEAYwBpAPMAbgAgAGQAZQAgAGUAcwB0AGUAIABjAGUAcgB0AGkAZgBpAGMAYQBkAG8AIABl
-                                AHMAdADhACAAcwB1AGoAZQB0AGEAIABhACAAbABhAHMAIABQAG8AbADtAHQAaQBjAGEAcwAgAGQA
-                                ZQAgAEMAZQByAHQAaQBmAGkAYwBhAGQAbwAgAGQAZQAgAFAAZQByAHMAbwBuAGEAIABKAHUAcgDt
-                                AGQAaQBjAGEAIAAoAFAAQwApACAAeQAgAEQAZQBjAGwAYQByAGEAYwBpAPMAbgAgAGQAZQAgAFAA
-                                cgDhAGMAdABpAGMAYQBzACAAZABlACAAQwBlAHIAdABpAGYAaQBjAGEAYwBpAPMAbgAgACgARABQ
-                                AEMAKQAgAGUAcwB0AGEAYgBsAGUAYwBpAGQAYQBzACAAcABvAHIAIABBAG4AZABlAHMAIABTAEMA
-                                RDAdBgNVHSUEFjAUBggrBgEFBQcDAgYIKwYBBQUHAwQwRgYDVR0fBD8wPTA7oDmgN4Y1aHR0cDov
-                                L3d3dy5hbmRlc3NjZC5jb20uY28vaW5jbHVkZXMvZ2V0Q2VydC5waHA/Y3JsPTEwHQYDVR0OBBYE
-                                FL9BXJHmFVE5c5Ai8B1bVBWqXsj7MA4GA1UdDwEB/wQEAwIE8DANBgkqhkiG9w0BAQsFAAOCAgEA
-                                b/pa7yerHOu1futRt8QTUVcxCAtK9Q00u7p4a5hp2fVzVrhVQIT7Ey0kcpMbZVPgU9X2mTHGfPdb
-                                R0hYJGEKAxiRKsmAwmtSQgWh5smEwFxG0TD1chmeq6y0GcY0lkNA1DpHRhSK368vZlO1p2a6S13Y
-                                1j3tLFLqf5TLHzRgl15cfauVinEHGKU/cMkjLwxNyG1KG/FhCeCCmawATXWLgQn4PGgvKcNrz+y0
-                                cwldDXLGKqriw9dce2Zerc7OCG4/XGjJ2PyZOJK9j1VYIG4pnmoirVmZbKwWaP4/TzLs6LKaJ4b6
-                                6xLxH3hUtoXCzYQ5ehYyrLVwCwTmKcm4alrEht3FVWiWXA/2tj4HZiFoG+I1OHKmgkNv7SwHS7z9
-                                tFEFRaD3W3aD7vwHEVsq2jTeYInE0+7r2/xYFZ9biLBrryl+q22zM5W/EJq6EJPQ6SM/eLqkpzqM
-                                EF5OdcJ5kIOxLbrIdOh0+grU2IrmHXr7cWNP6MScSL7KSxhjPJ20F6eqkO1Z/LAxqNslBIKkYS24
-                                VxPbXu0pBXQvu+zAwD4SvQntIG45y/67h884I/tzYOEJi7f6/NFAEuV+lokw/1MoVsEgFESASI9s
-                                N0DfUniabyrZ3nX+LG3UFL1VDtDPWrLTNKtb4wkKwGVwqtAdGFcE+/r/1WG0eQ64xCq0NLutCxg=
-                            """
-        ds_Object = ElementTree.SubElement(xml_Signature, 'ds:Object')
-
-        xades_QualifyingProperties = ElementTree.SubElement(
-            ds_Object, 'xades:QualifyingProperties')
-        xades_QualifyingProperties.set(
-            'Target', '#xmldsig-d0322c4f-be87-495a-95d5-9244980495f4')
-        xades_SignedProperties = ElementTree.SubElement(
-            xades_QualifyingProperties, 'xades:SignedProperties')
-        xades_SignedProperties.set(
-            'Id', 'xmldsig-d0322c4f-be87-495a-95d5-9244980495f4-signedprops')
-        xades_SignedSignatureProperties = ElementTree.SubElement(
-            xades_SignedProperties, 'xades:SignedSignatureProperties')
-        xades_SigningTime = ElementTree.SubElement(
-            xades_SignedSignatureProperties, 'xades:SigningTime')
-        xades_SigningTime.text = '2019-06-21T19:09:35.993-05:00'
-        xades_SigningCertificate = ElementTree.SubElement(
-            xades_SignedSignatureProperties, 'xades:SigningCertificate')
-        xades_Cert = ElementTree.SubElement(
-            xades_SigningCertificate, 'xades:Cert')
-        xades_CertDigest = ElementTree.SubElement(
-            xades_Cert, 'xades:CertDigest')
-        ds_DigestMethod = ElementTree.SubElement(
-            xades_CertDigest, 'ds:DigestMethod')
-        ds_DigestMethod.set(
-            'Algorithm', 'http://www.w3.org/2001/04/xmlenc#sha256')
-        ds_DigestValue = ElementTree.SubElement(
-            xades_CertDigest, 'ds:DigestValue')
-        ds_DigestValue.text = 'nem6KXhqlV0A0FK5o+MwJZ3Y1aHgmL1hDs/RMJu7HYw='
-        xades_SignaturePolicyIdentifier = ElementTree.SubElement(
-            xades_SignedSignatureProperties, 'xades:SignaturePolicyIdentifier')
-        xades_SigPolicyId = ElementTree.SubElement(
-            xades_SignaturePolicyIdentifier, 'xades:SignaturePolicyId')
-        xades_Identifier = ElementTree.SubElement(
-            xades_SigPolicyId, 'xades:Identifier')
-        xades_Identifier.text = 'https://facturaelectronica.dian.gov.co/politicadefirma/v1/politicadefirmav2.pdf'
-        xades_SigPolicyHash = ElementTree.SubElement(
-            xades_SigPolicyId, 'xades:SigPolicyHash')
-        ds_DigestMethod2 = ElementTree.SubElement(
-            xades_SigPolicyHash, 'ds:DigestMethod')
-        ds_DigestMethod2.set(
-            'Algorithm', 'http://www.w3.org/2001/04/xmlenc#sha256')
-        ds_DigestValue2 = ElementTree.SubElement(
-            xades_SigPolicyHash, 'ds:DigestValue')
-        ds_DigestValue2.text = 'dMoMvtcG5aIzgYo0tIsSQeVJBDnUnfSOfBpxXrmor0Y='
-        xades_SignerRole = ElementTree.SubElement(
-            xades_SignedSignatureProperties, 'xades:SignerRole')
-        xades_ClaimedRoles = ElementTree.SubElement(
-            xades_SignerRole, 'xades:ClaimedRoles')
-        xades_ClaimedRole = ElementTree.SubElement(
-            xades_ClaimedRoles, 'xades:ClaimedRole')
-        xades_ClaimedRole.text = 'supplier'
-
-        xml_UBLVersionID = ElementTree.SubElement(root, 'cbc:UBLVersionID')
-        xml_UBLVersionID.text = 'UBL 2.1'
-
-        xml_CustomizationID = ElementTree.SubElement(
-            root, 'cbc:CustomizationID')
-        xml_CustomizationID.text = '10'
-
-        xml_ProfileID = ElementTree.SubElement(root, 'cbc:ProfileID')
-        xml_ProfileID.text = 'DIAN 2.1'
-
-        xml_ProfileExecutionID = ElementTree.SubElement(
-            root, 'cbc:ProfileExecutionID')
-        xml_ProfileExecutionID.text = '2'
-
-        xml_ID = ElementTree.SubElement(root, 'cbc:ID')
-        xml_ID.text = 'SETP990000002'
-
-        xml_UUID = ElementTree.SubElement(root, 'cbc:UUID')
-        xml_UUID.text = '941cf36af62dbbc06f105d2a80e9bfe683a90e84960eae4d351cc3afbe8f848c26c39bac4fbc80fa254824c6369ea694'
-        xml_UUID.set('schemeID', '2')
-        xml_UUID.set('schemeName', 'CUFE-SHA384')
-
-        xml_IssueDate = ElementTree.SubElement(root, 'cbc:IssueDate')
-        xml_IssueDate.text = '2019-06-20'
-
-        xml_IssueTime = ElementTree.SubElement(root, 'cbc:IssueTime')
-        xml_IssueTime.text = '09:15:23-05:00'
-
-        xml_InvoiceTypeCode = ElementTree.SubElement(
-            root, 'cbc:InvoiceTypeCode')
-        xml_InvoiceTypeCode.text = '01'
-
-        xml_DocumentCurrencyCode = ElementTree.SubElement(
-            root, 'cbc:DocumentCurrencyCode')
-        xml_DocumentCurrencyCode.text = 'COP'
-        xml_DocumentCurrencyCode.set('listAgencyID', '6')
-        xml_DocumentCurrencyCode.set(
-            'listAgencyName', 'United Nations Economic Commission for Europe')
-        xml_DocumentCurrencyCode.set('listID', 'ISO 4217 Alpha')
-
-        # Numero de productos en la fctura
-        xml_LineCountNumeric = ElementTree.SubElement(
-            root, 'cbc:LineCountNumeric')
-        xml_LineCountNumeric.text = '2'
-
-        xml_InvoicePeriod = ElementTree.SubElement(root, 'cac:InvoicePeriod')
-        xml_StartDate = ElementTree.SubElement(
-            xml_InvoicePeriod, 'cbc:StartDate')
-        xml_StartDate.text = '2019-05-01'
-        xml_EndDate = ElementTree.SubElement(xml_InvoicePeriod, 'cbc:EndDate')
-        xml_EndDate.text = '2019-05-30'
-
-        # Agregar elemento cac:AccountingSupplierParty
-        cac_AccountingSupplierParty = ElementTree.SubElement(
-            root, 'cac:AccountingSupplierParty')
-
-        cbc_AdditionalAccountID = ElementTree.SubElement(
-            cac_AccountingSupplierParty, 'cbc:AdditionalAccountID')
-        cbc_AdditionalAccountID.text = '1'
-        cac_Party = ElementTree.SubElement(
-            cac_AccountingSupplierParty, 'cac:Party')
-        cbc_IndustryClasificationCode = ElementTree.SubElement(
-            cac_Party, 'cbc:IndustryClasificationCode')
-        cbc_IndustryClasificationCode.text = '45624'
-
-        for party_name in ['Nombre Tienda', 'Establecimiento Principal', 'DIAN']:
-            cac_PartyName = ElementTree.SubElement(cac_Party, 'cac:PartyName')
-            cbc_Name = ElementTree.SubElement(cac_PartyName, 'cbc:Name')
-            cbc_Name.text = party_name
-
-        # Agregar subelemento cac:PhysicalLocation
-        cac_PhysicalLocation = ElementTree.SubElement(
-            cac_Party, 'cac:PhysicalLocation')
-        cac_Address = ElementTree.SubElement(
-            cac_PhysicalLocation, 'cac:Address')
-        cbc_ID = ElementTree.SubElement(cac_Address, 'cbc:ID')
-        cbc_ID.text = '11001'
-        cbc_CityName = ElementTree.SubElement(cac_Address, 'cbc:CityName')
-        cbc_CityName.text = 'Bogotá, D.C.'
-        cbc_CountrySubentity = ElementTree.SubElement(
-            cac_Address, 'cbc:CountrySubentity')
-        cbc_CountrySubentity.text = 'Bogotá'
-        cbc_CountrySubentityCode = ElementTree.SubElement(
-            cac_Address, 'cbc:CountrySubentityCode')
-        cbc_CountrySubentityCode.text = '11'
-        cac_AddressLine = ElementTree.SubElement(
-            cac_Address, 'cac:AddressLine')
-        cbc_Line = ElementTree.SubElement(cac_AddressLine, 'cbc:Line')
-        cbc_Line.text = 'Av. #97 - 13'
-        cac_Country = ElementTree.SubElement(cac_Address, 'cac:Country')
-        cbc_IdentificationCode = ElementTree.SubElement(
-            cac_Country, 'cbc:IdentificationCode')
-        cbc_IdentificationCode.text = 'CO'
-        cbc_Name = ElementTree.SubElement(
-            cac_Country, 'cbc:Name', languageID="es")
-        cbc_Name.text = 'Colombia'
-
-        # Agregar subelemento cac:PartyTaxScheme
-        cac_PartyTaxScheme = ElementTree.SubElement(
-            cac_Party, 'cac:PartyTaxScheme')
-        cbc_RegistrationName = ElementTree.SubElement(
-            cac_PartyTaxScheme, 'cbc:RegistrationName')
-        cbc_RegistrationName.text = 'DIAN'
-        cbc_CompanyID = ElementTree.SubElement(cac_PartyTaxScheme, 'cbc:CompanyID', schemeAgencyID="195",
-                                               schemeAgencyName="CO, DIAN (Dirección de Impuestos y Aduanas Nacionales)", schemeID="4", schemeName="31")
-        cbc_CompanyID.text = '800197268'
-        cbc_TaxLevelCode = ElementTree.SubElement(
-            cac_PartyTaxScheme, 'cbc:TaxLevelCode', listName="05")
-        cbc_TaxLevelCode.text = 'O-99'
-        cac_RegistrationAddress = ElementTree.SubElement(
-            cac_PartyTaxScheme, 'cac:RegistrationAddress')
-        cbc_ID = ElementTree.SubElement(cac_RegistrationAddress, 'cbc:ID')
-        cbc_ID.text = '11001'
-        cbc_CityName = ElementTree.SubElement(
-            cac_RegistrationAddress, 'cbc:CityName')
-        cbc_CityName.text = 'Bogotá, D.C.'
-        cbc_CountrySubentity = ElementTree.SubElement(
-            cac_RegistrationAddress, 'cbc:CountrySubentity')
-        cbc_CountrySubentity.text = 'Bogotá'
-        cbc_CountrySubentityCode = ElementTree.SubElement(
-            cac_RegistrationAddress, 'cbc:CountrySubentityCode')
-        cbc_CountrySubentityCode.text = '11'
-        cac_AddressLine = ElementTree.SubElement(
-            cac_RegistrationAddress, 'cac:AddressLine')
-        cbc_Line = ElementTree.SubElement(cac_AddressLine, 'cbc:Line')
-        cbc_Line.text = 'Av. Jiménez #7 - 13'
-        cac_Country = ElementTree.SubElement(
-            cac_RegistrationAddress, 'cac:Country')
-        cbc_IdentificationCode = ElementTree.SubElement(
-            cac_Country, 'cbc:IdentificationCode')
-        cbc_IdentificationCode.text = 'CO'
-        cbc_Name = ElementTree.SubElement(
-            cac_Country, 'cbc:Name', languageID="es")
-        cbc_Name.text = 'Colombia'
-        cac_TaxScheme = ElementTree.SubElement(
-            cac_PartyTaxScheme, 'cac:TaxScheme')
-        cbc_ID = ElementTree.SubElement(cac_TaxScheme, 'cbc:ID')
-        cbc_ID.text = '01'
-        cbc_Name = ElementTree.SubElement(cac_TaxScheme, 'cbc:Name')
-        cbc_Name.text = 'IVA'
-
-        # Agregar subelemento cac:PartyLegalEntity
-        cac_PartyLegalEntity = ElementTree.SubElement(
-            cac_Party, 'cac:PartyLegalEntity')
-        cbc_RegistrationName = ElementTree.SubElement(
-            cac_PartyLegalEntity, 'cbc:RegistrationName')
-        cbc_RegistrationName.text = 'DIAN'
-        cbc_CompanyID = ElementTree.SubElement(cac_PartyLegalEntity, 'cbc:CompanyID', schemeAgencyID="195",
-                                               schemeAgencyName="CO, DIAN (Dirección de Impuestos y Aduanas Nacionales)", schemeID="9", schemeName="31")
-        cbc_CompanyID.text = '800197268'
-
-        cac_AccountingCustomerParty = ElementTree.SubElement(
-            root, 'cac:AccountingCustomerParty')
-        cbc_AdditionalAccountID = ElementTree.SubElement(
-            cac_AccountingCustomerParty, 'cbc:AdditionalAccountID')
-        cbc_AdditionalAccountID.text = '1'
-        cac_Party = ElementTree.SubElement(
-            cac_AccountingCustomerParty, 'cac:Party')
-        cac_PartyName = ElementTree.SubElement(cac_Party, 'cac:PartyName')
-        cbc_Name = ElementTree.SubElement(cac_PartyName, 'cbc:Name')
-        cbc_Name.text = 'OPTICAS GMO COLOMBIA S A S'
-        cac_PhysicalLocation = ElementTree.SubElement(
-            cac_Party, 'cac:PhysicalLocation')
-        cac_Address = ElementTree.SubElement(
-            cac_PhysicalLocation, 'cac:Address')
-        cbc_ID = ElementTree.SubElement(cac_Address, 'cbc:ID')
-        cbc_ID.text = '11001'
-        cbc_CityName = ElementTree.SubElement(cac_Address, 'cbc:CityName')
-        cbc_CityName.text = 'Bogotá, D.C.'
-        cbc_CountrySubentity = ElementTree.SubElement(
-            cac_Address, 'cbc:CountrySubentity')
-        cbc_CountrySubentity.text = 'Bogotá'
-        cbc_CountrySubentityCode = ElementTree.SubElement(
-            cac_Address, 'cbc:CountrySubentityCode')
-        cbc_CountrySubentityCode.text = '11'
-        cac_AddressLine = ElementTree.SubElement(
-            cac_Address, 'cac:AddressLine')
-        cbc_Line = ElementTree.SubElement(cac_AddressLine, 'cbc:Line')
-        cbc_Line.text = 'CARRERA 8 No 20-14/40'
-        cac_Country = ElementTree.SubElement(cac_Address, 'cac:Country')
-        cbc_IdentificationCode = ElementTree.SubElement(
-            cac_Country, 'cbc:IdentificationCode')
-        cbc_IdentificationCode.text = 'CO'
-        cbc_Name = ElementTree.SubElement(
-            cac_Country, 'cbc:Name', languageID="es")
-        cbc_Name.text = 'Colombia'
-
-        # Agregar subelemento cac:PartyTaxScheme
-        cac_PartyTaxScheme = ElementTree.SubElement(
-            cac_Party, 'cac:PartyTaxScheme')
-        cbc_RegistrationName = ElementTree.SubElement(
-            cac_PartyTaxScheme, 'cbc:RegistrationName')
-        cbc_RegistrationName.text = 'OPTICAS GMO COLOMBIA S A S'
-        cbc_CompanyID = ElementTree.SubElement(cac_PartyTaxScheme, 'cbc:CompanyID', schemeAgencyID="195",
-                                               schemeAgencyName="CO, DIAN (Dirección de Impuestos y Aduanas Nacionales)", schemeID="3", schemeName="31")
-        cbc_CompanyID.text = '900108281'
-        cbc_TaxLevelCode = ElementTree.SubElement(
-            cac_PartyTaxScheme, 'cbc:TaxLevelCode', listName="04")
-        cbc_TaxLevelCode.text = 'O-99'
-        cac_RegistrationAddress = ElementTree.SubElement(
-            cac_PartyTaxScheme, 'cac:RegistrationAddress')
-        cbc_ID = ElementTree.SubElement(cac_RegistrationAddress, 'cbc:ID')
-        cbc_ID.text = '11001'
-        cbc_CityName = ElementTree.SubElement(
-            cac_RegistrationAddress, 'cbc:CityName')
-        cbc_CityName.text = 'Bogotá, D.C.'
-        cbc_CountrySubentity = ElementTree.SubElement(
-            cac_RegistrationAddress, 'cbc:CountrySubentity')
-        cbc_CountrySubentity.text = 'Bogotá'
-        cbc_CountrySubentityCode = ElementTree.SubElement(
-            cac_RegistrationAddress, 'cbc:CountrySubentityCode')
-        cbc_CountrySubentityCode.text = '11'
-        cac_AddressLine = ElementTree.SubElement(
-            cac_RegistrationAddress, 'cac:AddressLine')
-        cbc_Line = ElementTree.SubElement(cac_AddressLine, 'cbc:Line')
-        cbc_Line.text = 'CR 9 A N0 99 - 07 OF 802'
-        cac_Country = ElementTree.SubElement(
-            cac_RegistrationAddress, 'cac:Country')
-        cbc_IdentificationCode = ElementTree.SubElement(
-            cac_Country, 'cbc:IdentificationCode')
-        cbc_IdentificationCode.text = 'CO'
-        cbc_Name = ElementTree.SubElement(
-            cac_Country, 'cbc:Name', languageID="es")
-        cbc_Name.text = 'Colombia'
-        cac_TaxScheme = ElementTree.SubElement(
-            cac_PartyTaxScheme, 'cac:TaxScheme')
-        cbc_ID = ElementTree.SubElement(cac_TaxScheme, 'cbc:ID')
-        cbc_ID.text = 'ZZ'
-        cbc_Name = ElementTree.SubElement(cac_TaxScheme, 'cbc:Name')
-        cbc_Name.text = 'NO CAUSA'
-
-        # Agregar subelemento cac:PartyLegalEntity
-        cac_PartyLegalEntity = ElementTree.SubElement(
-            cac_Party, 'cac:PartyLegalEntity')
-        cbc_RegistrationName = ElementTree.SubElement(
-            cac_PartyLegalEntity, 'cbc:RegistrationName')
-        cbc_RegistrationName.text = 'OPTICAS GMO COLOMBIA S A S'
-        cbc_CompanyID = ElementTree.SubElement(cac_PartyLegalEntity, 'cbc:CompanyID', schemeAgencyID="195",
-                                               schemeAgencyName="CO, DIAN (Dirección de Impuestos y Aduanas Nacionales)", schemeID="3", schemeName="31")
-        cbc_CompanyID.text = '900108281'
-
-        taxes = [
-            ('IVA', '01', '19.00'),
-            ('IVA', '01', '16.00'),
-            ('ICA', '03', '0.00'),
-            ('INC', '04', '0.00'),
-        ]
-
-        # Agregar más impuestos según sea necesario
-        for tax_percent in taxes:
-            if 10 != 0.0:
-                cac_TaxTotal = ElementTree.SubElement(root, 'cac:TaxTotal')
-                cbc_TaxAmount = ElementTree.SubElement(
-                    cac_TaxTotal, 'cbc:TaxAmount', currencyID="COP")
-                cbc_TaxAmount.text = str(1)
-
-                cac_TaxCategory = ElementTree.SubElement(
-                    cac_TaxTotal, 'cac:TaxCategory')
-                cbc_Percent = ElementTree.SubElement(
-                    cac_TaxCategory, 'cbc:Percent')
-                cbc_Percent.text = '10'
-                cac_TaxScheme = ElementTree.SubElement(
-                    cac_TaxCategory, 'cac:TaxScheme')
-                cbc_ID = ElementTree.SubElement(cac_TaxScheme, 'cbc:ID')
-                cbc_ID.text = '1'
-                cbc_Name = ElementTree.SubElement(cac_TaxScheme, 'cbc:Name')
-                cbc_Name.text = '1'
-
-        cac_LegalMonetaryTotal = ElementTree.SubElement(
-            root, 'cac:LegalMonetaryTotal')
-        cbc_LineExtensionAmount = ElementTree.SubElement(
-            cac_LegalMonetaryTotal, 'cbc:LineExtensionAmount', currencyID="COP")
-        cbc_LineExtensionAmount.text = "12600.06"
-        cbc_TaxExclusiveAmount = ElementTree.SubElement(
-            cac_LegalMonetaryTotal, 'cbc:TaxExclusiveAmount', currencyID="COP")
-        cbc_TaxExclusiveAmount.text = "12787.56"
-        cbc_TaxInclusiveAmount = ElementTree.SubElement(
-            cac_LegalMonetaryTotal, 'cbc:TaxInclusiveAmount', currencyID="COP")
-        cbc_TaxInclusiveAmount.text = "15024.07"
-        cbc_AllowanceTotalAmount = ElementTree.SubElement(
-            cac_LegalMonetaryTotal, 'cbc:AllowanceTotalAmount', currencyID="COP")
-        cbc_AllowanceTotalAmount.text = "0.00"
-        cbc_PrepaidAmount = ElementTree.SubElement(
-            cac_LegalMonetaryTotal, 'cbc:PrepaidAmount', currencyID="COP")
-        cbc_PrepaidAmount.text = "0.00"
-        cbc_PayableAmount = ElementTree.SubElement(
-            cac_LegalMonetaryTotal, 'cbc:PayableAmount', currencyID="COP")
-        cbc_PayableAmount.text = "15024.07"
-
-        for producto in taxes:
-            cac_InvoiceLine = ElementTree.SubElement(root, 'cac:InvoiceLine')
-            cbc_ID = ElementTree.SubElement(cac_InvoiceLine, 'cbc:ID')
-            cbc_ID.text = "1"
-            cbc_InvoicedQuantity = ElementTree.SubElement(
-                cac_InvoiceLine, 'cbc:InvoicedQuantity', unitCode="EA")
-            cbc_InvoicedQuantity.text = "1.000000"
-            cbc_LineExtensionAmount = ElementTree.SubElement(
-                cac_InvoiceLine, 'cbc:LineExtensionAmount', currencyID="COP")
-            cbc_LineExtensionAmount.text = "12600.06"
-            cbc_FreeOfChargeIndicator = ElementTree.SubElement(
-                cac_InvoiceLine, 'cbc:FreeOfChargeIndicator')
-            cbc_FreeOfChargeIndicator.text = "false"
-
-            cac_AllowanceCharge = ElementTree.SubElement(
-                cac_InvoiceLine, 'cac:AllowanceCharge')
-            cbc_ID = ElementTree.SubElement(cac_AllowanceCharge, 'cbc:ID')
-            cbc_ID.text = "1"
-            cbc_ChargeIndicator = ElementTree.SubElement(
-                cac_AllowanceCharge, 'cbc:ChargeIndicator')
-            cbc_ChargeIndicator.text = "false"
-            cbc_AllowanceChargeReason = ElementTree.SubElement(
-                cac_AllowanceCharge, 'cbc:AllowanceChargeReason')
-            cbc_AllowanceChargeReason.text = "Descuento por cliente frecuente"
-            cbc_MultiplierFactorNumeric = ElementTree.SubElement(
-                cac_AllowanceCharge, 'cbc:MultiplierFactorNumeric')
-            cbc_MultiplierFactorNumeric.text = "33.33"
-            cbc_Amount = ElementTree.SubElement(
-                cac_AllowanceCharge, 'cbc:Amount', currencyID="COP")
-            cbc_Amount.text = "6299.94"
-            cbc_BaseAmount = ElementTree.SubElement(
-                cac_AllowanceCharge, 'cbc:BaseAmount', currencyID="COP")
-            cbc_BaseAmount.text = "18900.00"
-
-            cac_TaxTotal = ElementTree.SubElement(
-                cac_InvoiceLine, 'cac:TaxTotal')
-            cbc_TaxAmount = ElementTree.SubElement(
-                cac_TaxTotal, 'cbc:TaxAmount', currencyID="COP")
-            cbc_TaxAmount.text = "2394.01"
-            cac_TaxSubtotal = ElementTree.SubElement(
-                cac_TaxTotal, 'cac:TaxSubtotal')
-            cbc_TaxableAmount = ElementTree.SubElement(
-                cac_TaxSubtotal, 'cbc:TaxableAmount', currencyID="COP")
-            cbc_TaxableAmount.text = "12600.06"
-            cbc_TaxAmount = ElementTree.SubElement(
-                cac_TaxSubtotal, 'cbc:TaxAmount', currencyID="COP")
-            cbc_TaxAmount.text = "2394.01"
-            cac_TaxCategory = ElementTree.SubElement(
-                cac_TaxSubtotal, 'cac:TaxCategory')
-            cbc_Percent = ElementTree.SubElement(
-                cac_TaxCategory, 'cbc:Percent')
-            cbc_Percent.text = "19.00"
-            cac_TaxScheme = ElementTree.SubElement(
-                cac_TaxCategory, 'cac:TaxScheme')
-            cbc_ID = ElementTree.SubElement(cac_TaxScheme, 'cbc:ID')
-            cbc_ID.text = "01"
-            cbc_Name = ElementTree.SubElement(cac_TaxScheme, 'cbc:Name')
-            cbc_Name.text = "IVA"
-
-            cac_Item = ElementTree.SubElement(cac_InvoiceLine, 'cac:Item')
-            cbc_Description = ElementTree.SubElement(
-                cac_Item, 'cbc:Description')
-            cbc_Description.text = "AV OASYS -2.25 (8.4) LENTE DE CONTATO"
-            cac_SellersItemIdentification = ElementTree.SubElement(
-                cac_Item, 'cac:SellersItemIdentification')
-            cbc_ID = ElementTree.SubElement(
-                cac_SellersItemIdentification, 'cbc:ID')
-            cbc_ID.text = "AOHV84-225"
-            cac_AdditionalItemIdentification = ElementTree.SubElement(
-                cac_Item, 'cac:AdditionalItemIdentification')
-            cbc_ID = ElementTree.SubElement(
-                cac_AdditionalItemIdentification, 'cbc:ID', schemeID="999", schemeName="EAN13")
-            cbc_ID.text = "6543542313534"
-
-            cac_Price = ElementTree.SubElement(cac_InvoiceLine, 'cac:Price')
-            cbc_PriceAmount = ElementTree.SubElement(
-                cac_Price, 'cbc:PriceAmount', currencyID="COP")
-            cbc_PriceAmount.text = "18900.00"
-            cbc_BaseQuantity = ElementTree.SubElement(
-                cac_Price, 'cbc:BaseQuantity', unitCode="EA")
-            cbc_BaseQuantity.text = "1.000000"
-
-        # ElementTree.SubElement(xml_tax_info, 'ambiente').text = str(self.company.environment_type)
-        # ElementTree.SubElement(xml_tax_info, 'tipoEmision').text = str(self.company.emission_type)
-        # ElementTree.SubElement(xml_tax_info, 'razonSocial').text = self.company.business_name
-        # ElementTree.SubElement(xml_tax_info, 'nombreComercial').text = self.company.tradename
-        # ElementTree.SubElement(xml_tax_info, 'ruc').text = self.company.ruc
-        # ElementTree.SubElement(xml_tax_info, 'claveAcceso').text = access_key
-        # ElementTree.SubElement(xml_tax_info, 'codDoc').text = self.receipt.code
-        # ElementTree.SubElement(xml_tax_info, 'estab').text = self.company.establishment_code
-        # ElementTree.SubElement(xml_tax_info, 'ptoEmi').text = self.company.issuing_point_code
-        # ElementTree.SubElement(xml_tax_info, 'secuencial').text = self.voucher_number
-        # ElementTree.SubElement(xml_tax_info, 'dirMatriz').text = self.company.main_address
-        # infoFactura
-
-        # xml_info_invoice = ElementTree.SubElement(root, 'infoFactura')
-        # ElementTree.SubElement(xml_info_invoice, 'fechaEmision').text = datetime.now().strftime('%d/%m/%Y')
-        # ElementTree.SubElement(xml_info_invoice, 'dirEstablecimiento').text = self.company.establishment_address
-        # ElementTree.SubElement(xml_info_invoice, 'obligadoContabilidad').text = self.company.obligated_accounting
-        # ElementTree.SubElement(xml_info_invoice, 'tipoIdentificacionComprador').text = self.client.identification_type
-        # ElementTree.SubElement(xml_info_invoice, 'razonSocialComprador').text = self.client.user.names
-        # ElementTree.SubElement(xml_info_invoice, 'identificacionComprador').text = self.client.dni
-        # ElementTree.SubElement(xml_info_invoice, 'direccionComprador').text = self.client.address
-        # ElementTree.SubElement(xml_info_invoice, 'totalSinImpuestos').text = f'{self.get_full_subtotal():.2f}'
-        # ElementTree.SubElement(xml_info_invoice, 'totalDescuento').text = f'{self.total_dscto:.2f}'
-        # # totalConImpuestos
-        # xml_total_with_taxes = ElementTree.SubElement(xml_info_invoice, 'totalConImpuestos')
-        # # totalImpuesto
-        # if self.subtotal_0 != 0.0000:
-        #     xml_total_tax_0 = ElementTree.SubElement(xml_total_with_taxes, 'totalImpuesto')
-        #     ElementTree.SubElement(xml_total_tax_0, 'codigo').text = str(TAX_CODES[0][0])
-        #     ElementTree.SubElement(xml_total_tax_0, 'codigoPorcentaje').text = '0'
-        #     ElementTree.SubElement(xml_total_tax_0, 'baseImponible').text = f'{self.subtotal_0:.2f}'
-        #     ElementTree.SubElement(xml_total_tax_0, 'valor').text = '0.00'
-        # if self.subtotal_12 != 0.0000:
-        #     xml_total_tax12 = ElementTree.SubElement(xml_total_with_taxes, 'totalImpuesto')
-        #     ElementTree.SubElement(xml_total_tax12, 'codigo').text = str(TAX_CODES[0][0])
-        #     ElementTree.SubElement(xml_total_tax12, 'codigoPorcentaje').text = str(TAX_CODES[0][0])
-        #     ElementTree.SubElement(xml_total_tax12, 'baseImponible').text = f'{self.subtotal_12:.2f}'
-        #     ElementTree.SubElement(xml_total_tax12, 'valor').text = f'{self.total_iva:.2f}'
-        # ElementTree.SubElement(xml_info_invoice, 'propina').text = '0.00'
-        # ElementTree.SubElement(xml_info_invoice, 'importeTotal').text = f'{self.total:.2f}'
-        # ElementTree.SubElement(xml_info_invoice, 'moneda').text = 'DOLAR'
-        # # pagos
-        # xml_payments = ElementTree.SubElement(xml_info_invoice, 'pagos')
-        # xml_payment = ElementTree.SubElement(xml_payments, 'pago')
-        # ElementTree.SubElement(xml_payment, 'formaPago').text = self.payment_method
-        # ElementTree.SubElement(xml_payment, 'total').text = f'{self.total:.2f}'
-        # ElementTree.SubElement(xml_payment, 'plazo').text = str(self.time_limit)
-        # ElementTree.SubElement(xml_payment, 'unidadTiempo').text = 'dias'
-
-        # # detalles
-
-        # xml_details = ElementTree.SubElement(root, 'detalles')
-        # for detail in self.saledetail_set.all():
-        #     xml_detail = ElementTree.SubElement(xml_details, 'detalle')
-        #     ElementTree.SubElement(xml_detail, 'codigoPrincipal').text = detail.product.code
-        #     ElementTree.SubElement(xml_detail, 'descripcion').text = detail.product.name
-        #     ElementTree.SubElement(xml_detail, 'cantidad').text = f'{detail.cant:.2f}'
-        #     ElementTree.SubElement(xml_detail, 'precioUnitario').text = f'{detail.price:.2f}'
-        #     ElementTree.SubElement(xml_detail, 'descuento').text = f'{detail.total_dscto:.2f}'
-        #     ElementTree.SubElement(xml_detail, 'precioTotalSinImpuesto').text = f'{detail.total:.2f}'
-        #     xml_taxes = ElementTree.SubElement(xml_detail, 'impuestos')
-        #     xml_tax = ElementTree.SubElement(xml_taxes, 'impuesto')
-        #     ElementTree.SubElement(xml_tax, 'codigo').text = str(TAX_CODES[0][0])
-        #     if detail.product.with_tax:
-        #         ElementTree.SubElement(xml_tax, 'codigoPorcentaje').text = str(TAX_CODES[0][0])
-        #         ElementTree.SubElement(xml_tax, 'tarifa').text = f'{detail.iva * 100:.2f}'
-        #         ElementTree.SubElement(xml_tax, 'baseImponible').text = f'{detail.total:.2f}'
-        #         ElementTree.SubElement(xml_tax, 'valor').text = f'{detail.total_iva:.2f}'
-        #     else:
-        #         ElementTree.SubElement(xml_tax, 'codigoPorcentaje').text = "0"
-        #         ElementTree.SubElement(xml_tax, 'tarifa').text = "0"
-        #         ElementTree.SubElement(xml_tax, 'baseImponible').text = f'{detail.total:.2f}'
-        #         ElementTree.SubElement(xml_tax, 'valor').text = "0"
-        # # infoAdicional
-        # if len(self.additional_info):
-        #     xml_additional_info = ElementTree.SubElement(root, 'infoAdicional')
-        #     for additional_info in self.additional_info['rows']:
-        #         ElementTree.SubElement(xml_additional_info, 'campoAdicional', nombre=additional_info['name']).text = additional_info['value']
-        # print(ElementTree.tostring(root, xml_declaration=True, encoding='utf-8').decode('utf-8').replace("'", '"'), access_key)
-        return ElementTree.tostring(root, xml_declaration=True, encoding='utf-8').decode('utf-8').replace("'", '"'), access_key
+        return InvoiceXmlBuilder(self).render(access_key), access_key
 
     def is_invoice(self):
         return self.receipt.code == VOUCHER_TYPE[0][0]
@@ -1312,43 +626,22 @@ class Sale(models.Model):
         item['status'] = {'id': self.status, 'name': self.get_status_display()}
         return item
 
-    def calculate_detail(self):
-        for detail in self.saledetail_set.filter():
-            detail.price = float(detail.price)
-            detail.iva = float(self.iva)
-            detail.price_with_vat = detail.price + (detail.price * detail.iva)
-            detail.subtotal = detail.price * detail.cant
-            detail.total_dscto = detail.subtotal * float(detail.dscto)
-            detail.total_iva = (
-                detail.subtotal - detail.total_dscto) * detail.iva
-            detail.total = detail.subtotal - detail.total_dscto
-            detail.save()
-
-    def calculate_invoice(self):
-        self.subtotal_0 = float(self.saledetail_set.filter(product__with_tax=False).aggregate(
-            result=Coalesce(Sum('total'), 0.00, output_field=FloatField()))['result'])
-        self.subtotal_12 = float(self.saledetail_set.filter(product__with_tax=True).aggregate(
-            result=Coalesce(Sum('total'), 0.00, output_field=FloatField()))['result'])
-        self.total_iva = float(self.saledetail_set.filter(product__with_tax=True).aggregate(
-            result=Coalesce(Sum('total_iva'), 0.00, output_field=FloatField()))['result'])
-        self.total_dscto = float(self.saledetail_set.filter().aggregate(
-            result=Coalesce(Sum('total_dscto'), 0.00, output_field=FloatField()))['result'])
-        self.total = float(self.get_full_subtotal()) + float(self.total_iva)
-        self.save()
+    def calculate_invoice(self, details=None):
+        if details is None:
+            details = self.saledetail_set.select_related('product')
+        InvoiceCalculator(self, details).save()
 
     def save(self, force_insert=False, force_update=False, using=None,
              update_fields=None):
-        if self.pk is None:
-            self.receipt.current_number = int(self.voucher_number)
-            self.receipt.save()
         super(Sale, self).save()
 
     def delete(self, using=None, keep_parents=False):
         try:
-            for i in self.saledetail_set.filter(product__inventoried=True):
-                i.product.stock += i.cant
-                i.product.save()
-                i.delete()
+            stock = StockService(source='sale_delete', source_id=self.id)
+            for product_id, cant in self.saledetail_set.filter(product__inventoried=True).values_list('product_id', 'cant'):
+                stock.add(product_id, cant)
+            stock.apply()
+            self.saledetail_set.filter(product__inventoried=True).delete()
         except:
             pass
         super(Sale, self).delete()
@@ -1356,21 +649,17 @@ class Sale(models.Model):
     def generate_electronic_invoice(self):
         sri = SRI()
         result = sri.create_xml(self)
-        print(result)
         if result['resp']:
             result = sri.firm_xml(instance=self, xml=result['xml'])
-            print(result)
             if result['resp']:
                 result = sri.validate_xml(instance=self, xml=result['xml'])
                 if result['resp']:
                     result = sri.authorize_xml(instance=self)
-                    index = 1
-                    while not result['resp'] and index < 3:
-                        time.sleep(1)
-                        result = sri.authorize_xml(instance=self)
-                        index += 1
                     if result['resp']:
                         result['print_url'] = self.get_pdf_authorized()
+                    elif result.get('pending'):
+                        # El SRI aún procesa el comprobante, la consulta continúa en segundo plano sin retener la solicitud
+                        AuthorizationPoller().enqueue(self)
                     return result
         return result
 
@@ -1801,21 +1090,24 @@ class CreditNote(models.Model):
         return f'{self.company.establishment_code}-{self.company.issuing_point_code}-{self.voucher_number}'
 
     def generate_voucher_number(self):
-        number = int(self.receipt.get_current_number()) + 1
-        return f'{number:09d}'
+        return self.receipt.allocate_number()
+
+    def assign_voucher_number(self):
+        # Se llama al final de la transacción, después de validar el stock y calcular los totales,
+        # así un comprobante rechazado no consume un número de la secuencia
+        self.voucher_number = self.generate_voucher_number()
+        self.voucher_number_full = self.get_voucher_number_full()
+        type(self).objects.filter(pk=self.pk).update(voucher_number=self.voucher_number, voucher_number_full=self.voucher_number_full)
 
     def generate_voucher_number_full(self):
         request = get_current_request()
         self.company = request.tenant.company
         self.receipt = Receipt.objects.get(code=VOUCHER_TYPE[2][0])
-        self.voucher_number = self.generate_voucher_number()
+        self.voucher_number = self.receipt.get_next_number()
         return self.get_voucher_number_full()
 
     def generate_pdf_authorized(self):
-        rv = BytesIO()
-        barcode.Code128(self.access_code,
-                        writer=barcode.writer.ImageWriter()).write(rv)
-        file = base64.b64encode(rv.getvalue()).decode("ascii")
+        file = base64.b64encode(BarcodeGenerator('code128').render(self.access_code)).decode("ascii")
         context = {'credit_note': self,
                    'access_code_barcode': f"data:image/png;base64,{file}"}
         pdf_file = printer.create_pdf(
@@ -1828,131 +1120,7 @@ class CreditNote(models.Model):
 
     def generate_xml(self):
         access_key = SRI().create_access_key(self)
-        root = ElementTree.Element(
-            'notaCredito', id="comprobante", version="1.1.0")
-        # infoTributaria
-        xml_tax_info = ElementTree.SubElement(root, 'infoTributaria')
-        ElementTree.SubElement(xml_tax_info, 'ambiente').text = str(
-            self.company.environment_type)
-        ElementTree.SubElement(xml_tax_info, 'tipoEmision').text = str(
-            self.company.emission_type)
-        ElementTree.SubElement(
-            xml_tax_info, 'razonSocial').text = self.company.business_name
-        ElementTree.SubElement(
-            xml_tax_info, 'nombreComercial').text = self.company.tradename
-        ElementTree.SubElement(xml_tax_info, 'ruc').text = self.company.ruc
-        ElementTree.SubElement(xml_tax_info, 'claveAcceso').text = access_key
-        ElementTree.SubElement(xml_tax_info, 'codDoc').text = self.receipt.code
-        ElementTree.SubElement(
-            xml_tax_info, 'estab').text = self.company.establishment_code
-        ElementTree.SubElement(
-            xml_tax_info, 'ptoEmi').text = self.company.issuing_point_code
-        ElementTree.SubElement(
-            xml_tax_info, 'secuencial').text = self.voucher_number
-        ElementTree.SubElement(
-            xml_tax_info, 'dirMatriz').text = self.company.main_address
-        if self.company.retention_agent == RETENTION_AGENT[0][0]:
-            ElementTree.SubElement(xml_tax_info, 'agenteRetencion').text = '1'
-        # infoNotaCredito
-        xml_info_invoice = ElementTree.SubElement(root, 'infoNotaCredito')
-        ElementTree.SubElement(
-            xml_info_invoice, 'fechaEmision').text = datetime.now().strftime('%d/%m/%Y')
-        ElementTree.SubElement(
-            xml_info_invoice, 'dirEstablecimiento').text = self.company.establishment_address
-        ElementTree.SubElement(
-            xml_info_invoice, 'tipoIdentificacionComprador').text = self.sale.client.identification_type
-        ElementTree.SubElement(
-            xml_info_invoice, 'razonSocialComprador').text = self.sale.client.user.names
-        ElementTree.SubElement(
-            xml_info_invoice, 'identificacionComprador').text = self.sale.client.dni
-        if not self.company.special_taxpayer == '000':
-            ElementTree.SubElement(
-                xml_info_invoice, 'contribuyenteEspecial').text = self.company.special_taxpayer
-        ElementTree.SubElement(
-            xml_info_invoice, 'obligadoContabilidad').text = self.company.obligated_accounting
-        ElementTree.SubElement(
-            xml_info_invoice, 'rise').text = 'Contribuyente Régimen Simplificado RISE'
-        ElementTree.SubElement(
-            xml_info_invoice, 'codDocModificado').text = self.sale.receipt.code
-        ElementTree.SubElement(
-            xml_info_invoice, 'numDocModificado').text = self.sale.voucher_number_full
-        ElementTree.SubElement(
-            xml_info_invoice, 'fechaEmisionDocSustento').text = self.sale.date_joined.strftime('%d/%m/%Y')
-        ElementTree.SubElement(
-            xml_info_invoice, 'totalSinImpuestos').text = f'{self.get_full_subtotal():.2f}'
-        ElementTree.SubElement(
-            xml_info_invoice, 'valorModificacion').text = f'{self.total:.2f}'
-        ElementTree.SubElement(xml_info_invoice, 'moneda').text = 'DOLAR'
-        # totalConImpuestos
-        xml_total_with_taxes = ElementTree.SubElement(
-            xml_info_invoice, 'totalConImpuestos')
-        # totalImpuesto
-        if self.subtotal_0 != 0.0000:
-            xml_total_tax = ElementTree.SubElement(
-                xml_total_with_taxes, 'totalImpuesto')
-            ElementTree.SubElement(
-                xml_total_tax, 'codigo').text = str(TAX_CODES[0][0])
-            ElementTree.SubElement(
-                xml_total_tax, 'codigoPorcentaje').text = '0'
-            ElementTree.SubElement(
-                xml_total_tax, 'baseImponible').text = f'{self.subtotal_0:.2f}'
-            ElementTree.SubElement(xml_total_tax, 'valor').text = f'{0:.2f}'
-        if self.subtotal_12 != 0.0000:
-            xml_total_tax2 = ElementTree.SubElement(
-                xml_total_with_taxes, 'totalImpuesto')
-            ElementTree.SubElement(
-                xml_total_tax2, 'codigo').text = str(TAX_CODES[0][0])
-            ElementTree.SubElement(
-                xml_total_tax2, 'codigoPorcentaje').text = str(TAX_CODES[0][0])
-            ElementTree.SubElement(
-                xml_total_tax2, 'baseImponible').text = f'{self.subtotal_12:.2f}'
-            ElementTree.SubElement(
-                xml_total_tax2, 'valor').text = f'{self.total_iva:.2f}'
-        ElementTree.SubElement(xml_info_invoice, 'motivo').text = self.motive
-        # detalles
-        xml_details = ElementTree.SubElement(root, 'detalles')
-        for detail in self.creditnotedetail_set.all():
-            xml_detail = ElementTree.SubElement(xml_details, 'detalle')
-            ElementTree.SubElement(
-                xml_detail, 'codigoInterno').text = detail.product.code
-            ElementTree.SubElement(
-                xml_detail, 'descripcion').text = detail.product.name
-            ElementTree.SubElement(
-                xml_detail, 'cantidad').text = f'{detail.cant:.2f}'
-            ElementTree.SubElement(
-                xml_detail, 'precioUnitario').text = f'{detail.price:.2f}'
-            ElementTree.SubElement(
-                xml_detail, 'descuento').text = f'{detail.total_dscto:.2f}'
-            ElementTree.SubElement(
-                xml_detail, 'precioTotalSinImpuesto').text = f'{detail.total:.2f}'
-            xml_taxes = ElementTree.SubElement(xml_detail, 'impuestos')
-            xml_tax = ElementTree.SubElement(xml_taxes, 'impuesto')
-            ElementTree.SubElement(
-                xml_tax, 'codigo').text = str(TAX_CODES[0][0])
-            if detail.product.with_tax:
-                ElementTree.SubElement(
-                    xml_tax, 'codigoPorcentaje').text = str(TAX_CODES[0][0])
-                ElementTree.SubElement(
-                    xml_tax, 'tarifa').text = f'{detail.iva * 100:.2f}'
-                ElementTree.SubElement(
-                    xml_tax, 'baseImponible').text = f'{detail.total:.2f}'
-                ElementTree.SubElement(
-                    xml_tax, 'valor').text = f'{detail.total_iva:.2f}'
-            else:
-                ElementTree.SubElement(xml_tax, 'codigoPorcentaje').text = "0"
-                ElementTree.SubElement(xml_tax, 'tarifa').text = "0"
-                ElementTree.SubElement(
-                    xml_tax, 'baseImponible').text = f'{detail.total:.2f}'
-                ElementTree.SubElement(xml_tax, 'valor').text = "0"
-        # infoAdicional
-        xml_additional_info = ElementTree.SubElement(root, 'infoAdicional')
-        ElementTree.SubElement(xml_additional_info, 'campoAdicional',
-                               nombre='dirCliente').text = self.sale.client.address
-        ElementTree.SubElement(xml_additional_info, 'campoAdicional',
-                               nombre='telfCliente').text = self.sale.client.mobile
-        ElementTree.SubElement(xml_additional_info, 'campoAdicional',
-                               nombre='Observacion').text = f'NOTA_CREDITO # {self.voucher_number}'
-        return ElementTree.tostring(root, xml_declaration=True, encoding='UTF-8').decode('UTF-8').replace("'", '"'), access_key
+        return CreditNoteXmlBuilder(self).render(access_key), access_key
 
     def toJSON(self):
         item = model_to_dict(self)
@@ -1986,48 +1154,29 @@ class CreditNote(models.Model):
             if result['resp']:
                 result = sri.validate_xml(instance=self, xml=result['xml'])
                 if result['resp']:
-                    return sri.authorize_xml(instance=self)
+                    result = sri.authorize_xml(instance=self)
+                    if result.get('pending'):
+                        AuthorizationPoller().enqueue(self)
         return result
 
-    def calculate_detail(self):
-        for detail in self.creditnotedetail_set.filter():
-            detail.price = float(detail.price)
-            detail.iva = float(self.iva)
-            detail.price_with_vat = detail.price + (detail.price * detail.iva)
-            detail.subtotal = detail.price * detail.cant
-            detail.total_dscto = detail.subtotal * float(detail.dscto)
-            detail.total_iva = (
-                detail.subtotal - detail.total_dscto) * detail.iva
-            detail.total = detail.subtotal - detail.total_dscto
-            detail.save()
-
-    def calculate_invoice(self):
-        self.subtotal_0 = float(self.creditnotedetail_set.filter(product__with_tax=False).aggregate(
-            result=Coalesce(Sum('total'), 0.00, output_field=FloatField()))['result'])
-        self.subtotal_12 = float(self.creditnotedetail_set.filter(product__with_tax=True).aggregate(
-            result=Coalesce(Sum('total'), 0.00, output_field=FloatField()))['result'])
-        self.total_iva = float(self.creditnotedetail_set.filter(product__with_tax=True).aggregate(
-            result=Coalesce(Sum('total_iva'), 0.00, output_field=FloatField()))['result'])
-        self.total_dscto = float(self.creditnotedetail_set.filter().aggregate(
-            result=Coalesce(Sum('total_dscto'), 0.00, output_field=FloatField()))['result'])
-        self.total = float(self.get_full_subtotal()) + float(self.total_iva)
-        self.save()
+    def calculate_invoice(self, details=None):
+        if details is None:
+            details = self.creditnotedetail_set.select_related('product')
+        InvoiceCalculator(self, details).save()
 
     def save(self, force_insert=False, force_update=False, using=None,
              update_fields=None):
         if self.motive is None:
             self.motive = 'Sin detalles'
-        if self.pk is None:
-            self.receipt.current_number = int(self.voucher_number)
-            self.receipt.save()
         super(CreditNote, self).save()
 
     def delete(self, using=None, keep_parents=False):
         try:
-            for i in self.creditnotedetail_set.filter(product__inventoried=True):
-                i.product.stock += i.cant
-                i.product.save()
-                i.delete()
+            stock = StockService(source='credit_note_delete', source_id=self.id)
+            for product_id, cant in self.creditnotedetail_set.filter(product__inventoried=True).values_list('product_id', 'cant'):
+                stock.subtract(product_id, cant)
+            stock.apply()
+            self.creditnotedetail_set.filter(product__inventoried=True).delete()
         except:
             pass
         super(CreditNote, self).delete()
@@ -2111,3 +1260,175 @@ class SaleProduct(models.Model):
         verbose_name_plural = 'Detalle de Ventas'
         default_permissions = ()
         ordering = ['id']
+
+
+class ElectronicBillingJob(models.Model):
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, null=True, blank=True, verbose_name='Venta')
+    credit_note = models.ForeignKey(CreditNote, on_delete=models.CASCADE, null=True, blank=True, verbose_name='Nota de Credito')
+    stage = models.CharField(max_length=20, choices=ELECTRONIC_BILLING_STAGE, default=ELECTRONIC_BILLING_STAGE[0][0], verbose_name='Etapa')
+    status = models.CharField(max_length=20, choices=ELECTRONIC_BILLING_STATUS, default=ELECTRONIC_BILLING_STATUS[0][0], verbose_name='Estado')
+    xml = CustomFileField(folder='electronic_billing', null=True, blank=True, verbose_name='XML')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Intentos')
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name='Máximo de intentos')
+    next_attempt = models.DateTimeField(default=timezone.now, verbose_name='Próximo intento')
+    errors = models.JSONField(default=dict, verbose_name='Errores')
+    created_date = models.DateTimeField(auto_now_add=True, verbose_name='Creado')
+    modified_date = models.DateTimeField(auto_now=True, verbose_name='Modificado')
+
+    def __str__(self):
+        return f'{self.get_stage_display()} / {self.get_status_display()}'
+
+    def get_instance(self):
+        if self.sale_id:
+            return self.sale
+        return self.credit_note
+
+    def is_active(self):
+        return self.status in [ELECTRONIC_BILLING_STATUS[0][0], ELECTRONIC_BILLING_STATUS[1][0]]
+
+    def toJSON(self):
+        item = model_to_dict(self, exclude=['xml'])
+        item['stage'] = {'id': self.stage, 'name': self.get_stage_display()}
+        item['status'] = {'id': self.status, 'name': self.get_status_display()}
+        item['next_attempt'] = self.next_attempt.strftime('%Y-%m-%d %H:%M:%S')
+        item['created_date'] = self.created_date.strftime('%Y-%m-%d %H:%M:%S')
+        item['modified_date'] = self.modified_date.strftime('%Y-%m-%d %H:%M:%S')
+        return item
+
+    class Meta:
+        verbose_name = 'Trabajo de Facturación Electrónica'
+        verbose_name_plural = 'Trabajos de Facturación Electrónica'
+        default_permissions = ()
+        indexes = [
+            models.Index(fields=['status', 'next_attempt']),
+        ]
+
+
+class InventoryMovement(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, verbose_name='Producto')
+    quantity = models.IntegerField(verbose_name='Cantidad')
+    cost = models.DecimalField(max_digits=9, decimal_places=2, default=0.00, verbose_name='Costo')
+    source = models.CharField(max_length=20, choices=INVENTORY_MOVEMENT_SOURCE, verbose_name='Origen')
+    source_id = models.IntegerField(null=True, blank=True, verbose_name='Documento')
+    date_joined = models.DateTimeField(default=timezone.now, verbose_name='Fecha de registro')
+
+    def __str__(self):
+        return f'{self.product.name} / {self.quantity}'
+
+    def toJSON(self):
+        item = model_to_dict(self)
+        item['cost'] = float(self.cost)
+        item['source'] = {'id': self.source, 'name': self.get_source_display()}
+        item['date_joined'] = self.date_joined.strftime('%Y-%m-%d %H:%M:%S')
+        return item
+
+    class Meta:
+        verbose_name = 'Movimiento de Inventario'
+        verbose_name_plural = 'Movimientos de Inventario'
+        default_permissions = ()
+        indexes = [
+            models.Index(fields=['product', 'date_joined']),
+            models.Index(fields=['source', 'source_id']),
+        ]
+
+
+class InventorySnapshot(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name='Producto')
+    date = models.DateField(verbose_name='Fecha')
+    stock = models.IntegerField(default=0, verbose_name='Stock')
+    cost = models.DecimalField(max_digits=9, decimal_places=2, default=0.00, verbose_name='Costo')
+    last_movement_id = models.BigIntegerField(default=0, verbose_name='Último movimiento')
+
+    def __str__(self):
+        return f'{self.product.name} / {self.date}'
+
+    def toJSON(self):
+        item = model_to_dict(self)
+        item['date'] = self.date.strftime('%Y-%m-%d')
+        item['cost'] = float(self.cost)
+        return item
+
+    class Meta:
+        verbose_name = 'Corte de Inventario'
+        verbose_name_plural = 'Cortes de Inventario'
+        default_permissions = ()
+        unique_together = ('product', 'date')
+
+
+class ProductTombstone(models.Model):
+    product_id = models.IntegerField(verbose_name='Producto')
+    code = models.CharField(max_length=20, blank=True, null=True, verbose_name='Código')
+    date_joined = models.DateTimeField(default=timezone.now, verbose_name='Fecha de eliminación')
+
+    def __str__(self):
+        return f'{self.product_id} / {self.date_joined}'
+
+    def toJSON(self):
+        item = model_to_dict(self)
+        item['date_joined'] = self.date_joined.strftime('%Y-%m-%d %H:%M:%S')
+        return item
+
+    class Meta:
+        verbose_name = 'Producto Eliminado'
+        verbose_name_plural = 'Productos Eliminados'
+        default_permissions = ()
+        indexes = [
+            models.Index(fields=['date_joined']),
+        ]
+
+
+class CacheVersion(models.Model):
+    name = models.CharField(max_length=50, unique=True, verbose_name='Nombre')
+    version = models.BigIntegerField(default=0, verbose_name='Versión')
+    modified_date = models.DateTimeField(default=timezone.now, verbose_name='Modificado')
+
+    def __str__(self):
+        return f'{self.name} / {self.version}'
+
+    def toJSON(self):
+        item = model_to_dict(self)
+        item['modified_date'] = self.modified_date.strftime('%Y-%m-%d %H:%M:%S')
+        return item
+
+    class Meta:
+        verbose_name = 'Versión de Caché'
+        verbose_name_plural = 'Versiones de Caché'
+        default_permissions = ()
+
+
+class AuthorizationPoll(models.Model):
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, null=True, blank=True, verbose_name='Venta')
+    credit_note = models.ForeignKey(CreditNote, on_delete=models.CASCADE, null=True, blank=True, verbose_name='Nota de Credito')
+    job = models.ForeignKey(ElectronicBillingJob, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Trabajo')
+    access_code = models.CharField(max_length=49, unique=True, verbose_name='Clave de acceso')
+    environment_type = models.PositiveIntegerField(choices=ENVIRONMENT_TYPE, default=ENVIRONMENT_TYPE[0][0], verbose_name='Tipo de ambiente')
+    status = models.CharField(max_length=20, choices=AUTHORIZATION_POLL_STATUS, default=AUTHORIZATION_POLL_STATUS[0][0], verbose_name='Estado')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Consultas')
+    next_poll = models.DateTimeField(default=timezone.now, verbose_name='Próxima consulta')
+    created_date = models.DateTimeField(auto_now_add=True, verbose_name='Creado')
+    modified_date = models.DateTimeField(auto_now=True, verbose_name='Modificado')
+
+    def __str__(self):
+        return f'{self.access_code} / {self.get_status_display()}'
+
+    def get_instance(self):
+        if self.sale_id:
+            return self.sale
+        return self.credit_note
+
+    def toJSON(self):
+        item = model_to_dict(self)
+        item['status'] = {'id': self.status, 'name': self.get_status_display()}
+        item['environment_type'] = {'id': self.environment_type, 'name': self.get_environment_type_display()}
+        item['next_poll'] = self.next_poll.strftime('%Y-%m-%d %H:%M:%S')
+        item['created_date'] = self.created_date.strftime('%Y-%m-%d %H:%M:%S')
+        item['modified_date'] = self.modified_date.strftime('%Y-%m-%d %H:%M:%S')
+        return item
+
+    class Meta:
+        verbose_name = 'Consulta de Autorización'
+        verbose_name_plural = 'Consultas de Autorización'
+        default_permissions = ()
+        indexes = [
+            models.Index(fields=['status', 'next_poll']),
+        ]
@@ -0,0 +1,30 @@
+from core.pos.models import Sale, CreditNote, Client, Product
+from core.security.projection import Projection
+
+
+class ClientProjection(Projection):
+    model = Client
+    select_related = ['user']
+    prefetch_related = ['user__groups']
+    query_budget = 2
+
+
+class ProductProjection(Projection):
+    model = Product
+    select_related = ['category']
+    # La consulta principal y, como máximo, la carga del índice de precios promocionales
+    query_budget = 2
+
+
+class SaleProjection(Projection):
+    model = Sale
+    select_related = ['company__scheme', 'company__plan', 'client__user', 'receipt', 'employee']
+    prefetch_related = ['client__user__groups', 'employee__groups']
+    query_budget = 3
+
+
+class CreditNoteProjection(Projection):
+    model = CreditNote
+    select_related = ['company__scheme', 'company__plan', 'receipt', 'sale__company__scheme', 'sale__company__plan', 'sale__client__user', 'sale__receipt', 'sale__employee']
+    prefetch_related = ['sale__client__user__groups', 'sale__employee__groups']
+    query_budget = 3
@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core.pos.models import Category, Product, ProductTombstone, Promotions, PromotionsDetail, Provider
+from core.pos.utilities.catalog import CatalogVersion
+from core.pos.utilities.product_cache import ProductCodeCache
+from core.pos.utilities.promotion import PromotionPriceIndex
+from core.pos.utilities.search import ProductSearchIndex
+
+
+@receiver(post_save, sender=Promotions)
+@receiver(post_delete, sender=Promotions)
+@receiver(post_save, sender=PromotionsDetail)
+@receiver(post_delete, sender=PromotionsDetail)
+def invalidate_promotion_price_index(sender, **kwargs):
+    transaction.on_commit(PromotionPriceIndex().invalidate)
+    transaction.on_commit(ProductCodeCache().invalidate)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_product_code_cache(sender, **kwargs):
+    transaction.on_commit(ProductCodeCache().invalidate)
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: ProductSearchIndex().update(instance))
+
+
+@receiver(post_delete, sender=Product)
+def create_product_tombstone(sender, instance, **kwargs):
+    # Los terminales que sincronizan el catálogo eliminan el producto a partir de este registro
+    ProductTombstone.objects.create(product_id=instance.id, code=instance.code)
+
+
+@receiver(post_delete, sender=Product)
+def delete_product_search_index(sender, instance, **kwargs):
+    product_id = instance.id
+    transaction.on_commit(lambda: ProductSearchIndex().delete(product_id))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Provider)
+@receiver(post_delete, sender=Provider)
+@receiver(post_save, sender=Promotions)
+@receiver(post_delete, sender=Promotions)
+@receiver(post_save, sender=PromotionsDetail)
+@receiver(post_delete, sender=PromotionsDetail)
+def invalidate_catalog_version(sender, **kwargs):
+    transaction.on_commit(CatalogVersion().invalidate)
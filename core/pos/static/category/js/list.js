@@ -35,7 +35,7 @@ var category = {
                 {
                     targets: [2], // La tercera columna (índice 2) contiene la URL de la imagen
                     render: function (data, type, row) {
-                        return '<img src="' + data + '" alt="' + row.name + '" style="width:30px; height:30px; border-radius: 50%; object-fit: contain; margin: 0px; border: solid 1px grey">';
+                        return '<img src="' + row.images.thumbnail + '" alt="' + row.name + '" style="width:30px; height:30px; border-radius: 50%; object-fit: contain; margin: 0px; border: solid 1px grey">';
                     }
                 },
             ],
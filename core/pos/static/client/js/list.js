@@ -4,17 +4,12 @@ var client = {
             autoWidth: false,
             destroy: true,
             deferRender: true,
-            ajax: {
-                url: pathname,
-                type: 'POST',
-                headers: {
-                    'X-CSRFToken': csrftoken
-                },
-                data: {
-                    'action': 'search'
-                },
-                dataSrc: ""
-            },
+            serverSide: true,
+            processing: true,
+            ajax: datatable_server_side({
+                'action': 'search'
+            }),
+            order: [[0, "asc"]],
             columns: [
                 {"data": "id"},
                 {"data": "user.names"},
@@ -5,17 +5,12 @@ var product = {
       autoWidth: false,
       destroy: true,
       deferRender: true,
-      ajax: {
-        url: pathname,
-        type: "POST",
-        headers: {
-          "X-CSRFToken": csrftoken,
-        },
-        data: {
-          action: "search",
-        },
-        dataSrc: "",
-      },
+      serverSide: true,
+      processing: true,
+      ajax: datatable_server_side({
+        action: "search",
+      }),
+      order: [[0, "asc"]],
       columns: [
         { data: "id" },
         { data: "name" },
@@ -125,7 +120,7 @@ $(function () {
     .on("click", 'a[rel="image"]', function () {
       var tr = tblProducts.cell($(this).closest("td, li")).index();
       var data = tblProducts.row(tr.row).data();
-      load_image({ url: data.image });
+      load_image({ url: data.images.medium });
     })
     .on("click", 'a[rel="barcode"]', function () {
       var tr = tblProducts.cell($(this).closest("td, li")).index();
@@ -55,13 +55,47 @@ document.addEventListener('DOMContentLoaded', function (e) {
         })
         .on('core.form.valid', function () {
             var params = new FormData(fv.form);
+            var token = Date.now().toString();
             params.append('action', 'upload_excel');
+            params.append('token', token);
+            var started = false;
+            var progress = setInterval(function () {
+                if ($('.loadingoverlay').length === 0) {
+                    if (started) {
+                        clearInterval(progress);
+                    }
+                    return false;
+                }
+                started = true;
+                $.ajax({
+                    url: pathname,
+                    data: {
+                        'action': 'upload_excel_progress',
+                        'token': token
+                    },
+                    type: 'POST',
+                    headers: {
+                        'X-CSRFToken': csrftoken
+                    },
+                    dataType: 'json',
+                    success: function (request) {
+                        if (request.hasOwnProperty('stage')) {
+                            $('.loadingoverlay').find('div:not(:has(*))').last().text(request.stage + ' (' + request.processed + ' filas)');
+                        }
+                    }
+                });
+            }, 1500);
             var args = {
                 'params': params,
                 'success': function (request) {
+                    clearInterval(progress);
+                    var html = '<p>Filas leídas: ' + request.rows + '<br>Productos creados: ' + request.inserted + '<br>Productos actualizados: ' + request.updated + '<br>Filas con errores: ' + request.invalid + '</p>';
+                    $.each(request.errors, function (index, item) {
+                        html += '<small class="d-block text-left text-danger">Fila ' + item.row + ': ' + item.error + '</small>';
+                    });
                     alert_sweetalert({
-                        'text': 'Productos actualizados correctamente',
-                        'timer': 2000,
+                        'type': request.invalid > 0 ? 'warning' : 'success',
+                        'html': html,
                         'callback': function () {
                             location.reload();
                         }
@@ -336,6 +336,85 @@ var sale = {
   },
 };
 
+// Catálogo local sincronizado por cambios para buscar productos sin consultar al servidor
+var catalog = {
+  products: {},
+  cursor: "",
+  loaded: false,
+  syncing: false,
+  sync: function () {
+    if (catalog.syncing) {
+      return false;
+    }
+    catalog.syncing = true;
+    $.ajax({
+      url: pathname,
+      data: {
+        action: "search_product_changes",
+        cursor: catalog.cursor,
+      },
+      type: "POST",
+      headers: {
+        "X-CSRFToken": csrftoken,
+      },
+      dataType: "json",
+      success: function (request) {
+        if (request.hasOwnProperty("error")) {
+          catalog.syncing = false;
+          return false;
+        }
+        if (request.reset) {
+          catalog.products = {};
+        }
+        $.each(request.products, function (index, item) {
+          item.search_name = item.full_name.toLowerCase();
+          item.search_code = (item.code || "").toLowerCase();
+          catalog.products[item.id] = item;
+        });
+        $.each(request.deleted, function (index, id) {
+          delete catalog.products[id];
+        });
+        catalog.cursor = request.cursor;
+        catalog.syncing = false;
+        if (request.has_more) {
+          catalog.sync();
+        } else {
+          catalog.loaded = true;
+        }
+      },
+      error: function () {
+        catalog.syncing = false;
+      },
+    });
+  },
+  search: function (term, ids) {
+    term = term.toLowerCase().split(/\s+/).join(" ").trim();
+    var results = [];
+    $.each(catalog.products, function (id, item) {
+      if (ids.indexOf(item.id) !== -1 || (item.inventoried && item.stock <= 0)) {
+        return true;
+      }
+      var rank;
+      if (item.search_code === term) {
+        rank = 0;
+      } else if (item.search_code.startsWith(term) || item.search_name.startsWith(term)) {
+        rank = 1;
+      } else if (item.search_name.indexOf(term) !== -1 || item.search_code.indexOf(term) !== -1) {
+        rank = 2;
+      } else {
+        return true;
+      }
+      results.push({ rank: rank, item: item });
+    });
+    results.sort(function (a, b) {
+      return a.rank - b.rank || a.item.search_name.localeCompare(b.item.search_name);
+    });
+    return results.slice(0, 10).map(function (result) {
+      return $.extend({}, result.item);
+    });
+  },
+};
+
 document.addEventListener("DOMContentLoaded", function (e) {
   fvClient = FormValidation.formValidation(
     document.getElementById("frmClient"),
@@ -755,8 +834,15 @@ $(function () {
 
   // Product
 
+  catalog.sync();
+  setInterval(catalog.sync, 60000);
+
   input_search_product.autocomplete({
     source: function (request, response) {
+      if (catalog.loaded && request.term.trim().length) {
+        response(catalog.search(request.term, sale.getProductsIds()));
+        return false;
+      }
       $.ajax({
         url: pathname,
         data: {
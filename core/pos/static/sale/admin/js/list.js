@@ -15,16 +15,10 @@ var sale = {
             autoWidth: false,
             destroy: true,
             deferRender: true,
-            ajax: {
-                url: pathname,
-                type: 'POST',
-                headers: {
-                    'X-CSRFToken': csrftoken
-                },
-                data: parameters,
-                dataSrc: ""
-            },
-            order: [[0, "desc"], [5, "desc"]],
+            serverSide: true,
+            processing: true,
+            ajax: datatable_server_side(parameters),
+            order: [[0, "desc"]],
             columns: [
                 {data: "id"},
                 {data: "voucher_number_full"},
@@ -175,7 +169,7 @@ $(function () {
                 'content': '¿Estas seguro de generar la factura electrónica?',
                 'success': function (request) {
                     alert_sweetalert({
-                        'message': 'Factura generada correctamente',
+                        'message': 'La factura electrónica se está procesando, su estado se actualizará en unos momentos',
                         'timer': 2000,
                         'callback': function () {
                             tblSale.ajax.reload();
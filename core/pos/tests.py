@@ -1,3 +1,363 @@
-from django.test import TestCase
+import base64
+import hashlib
+import os
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.serialization import BestAvailableEncryption, pkcs12
+from cryptography.x509.oid import NameOID
+from lxml import etree
+
+from django.test import SimpleTestCase, override_settings
+from django.utils.http import http_date
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from core.pos.api.mixins import ConditionalCatalogMixin
+from core.pos.utilities.electronic_billing import ElectronicBillingPipeline
+from core.pos.utilities.product_cache import ProductCodeCache
+from core.pos.utilities.promotion import PromotionPriceIndex
+from core.pos.utilities.search import ProductSearchIndex
+from core.pos.utilities.signer import XadesSigner, DS_NAMESPACE
+from core.pos.utilities.voucher import VoucherNumberAllocator
+from core.pos.utilities.voucher_xml import InvoiceXmlBuilder
+from core.pos.utilities.voucher_schema import VoucherSchemaValidator
+
+
+class VoucherNumberAllocatorTest(SimpleTestCase):
+    def get_receipt(self, start_number=1, end_number=999999999, current_number=999999999):
+        return SimpleNamespace(pk=1, start_number=start_number, end_number=end_number, current_number=current_number)
+
+    def get_statements(self, cursor):
+        return [call.args for call in cursor.execute.call_args_list]
+
+    def test_default_range_starts_within_maxvalue(self):
+        allocator = VoucherNumberAllocator(block_size=1)
+        receipt = self.get_receipt()
+        self.assertEqual(allocator.get_start_number(receipt), 999999999)
+        self.assertTrue(allocator.is_exhausted(receipt))
+
+    def test_open_range_starts_after_current_number(self):
+        allocator = VoucherNumberAllocator(block_size=1)
+        receipt = self.get_receipt(end_number=100, current_number=10)
+        self.assertEqual(allocator.get_start_number(receipt), 11)
+        self.assertFalse(allocator.is_exhausted(receipt))
+        self.assertEqual(allocator.get_start_number(self.get_receipt(start_number=50, end_number=100, current_number=0)), 50)
+
+    def test_exhausted_range_leaves_sequence_at_maxvalue(self):
+        allocator = VoucherNumberAllocator(block_size=1)
+        with mock.patch('core.pos.utilities.voucher.connection') as connection, mock.patch('core.pos.utilities.voucher.transaction'):
+            connection.schema_name = 'test'
+            cursor = connection.cursor.return_value.__enter__.return_value
+            allocator.create_sequence(self.get_receipt())
+        statements = self.get_statements(cursor)
+        self.assertIn('MAXVALUE 999999999 START WITH 999999999', statements[0][0])
+        self.assertEqual(statements[1], ('SELECT setval(%s, %s, true)', ['pos_receipt_1_number_seq', 999999999]))
+
+    def test_restart_below_issued_number_is_rejected(self):
+        allocator = VoucherNumberAllocator(block_size=1)
+        with mock.patch.object(allocator, 'create_sequence'), mock.patch.object(allocator, 'current', return_value=50), mock.patch('core.pos.utilities.voucher.connection') as connection:
+            with self.assertRaises(ValueError):
+                allocator.reset(self.get_receipt(end_number=100, current_number=20), restart=True)
+            connection.cursor.assert_not_called()
+
+    def test_reset_without_restart_keeps_sequence_position(self):
+        allocator = VoucherNumberAllocator(block_size=1)
+        with mock.patch.object(allocator, 'create_sequence'), mock.patch.object(allocator, 'current', return_value=50), mock.patch('core.pos.utilities.voucher.connection') as connection:
+            cursor = connection.cursor.return_value.__enter__.return_value
+            allocator.reset(self.get_receipt(end_number=100, current_number=20))
+        statements = self.get_statements(cursor)
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn('RESTART', statements[0][0])
+
+
+class ProductSearchIndexTest(SimpleTestCase):
+    def get_index(self, rows):
+        search_index = ProductSearchIndex()
+        index = {'rows': {}, 'grams': {}, 'sorted': False}
+        for product_id, name, code in rows:
+            search_index.add_row(index, product_id, name, code)
+        search_index.sort_prefixes(index)
+        return search_index, index
+
+    def test_short_term_matches_prefix_and_substring(self):
+        search_index, index = self.get_index([(1, 'Abrazadera', '1001'), (2, 'Cable', '2045'), (3, 'Tabla', '3000'), (4, 'Martillo', '4000')])
+        with mock.patch.object(search_index, 'get_index', return_value=index):
+            self.assertEqual(search_index.search('ab', 10), [1, 2, 3])
+            self.assertEqual(search_index.search('45', 10), [2])
+            self.assertEqual(search_index.search('ab', 2), [1, 2])
+
+    def test_other_processes_rebuild_when_the_shared_version_changes(self):
+        versions = {'product_search_index': 1}
+        clock = [0]
+        with mock.patch('core.pos.utilities.search.settings', SimpleNamespace(DEFAULT_SCHEMA='public')), mock.patch.object(ProductSearchIndex, 'indexes', {}), \
+                mock.patch('core.pos.utilities.search.SharedVersion.get', side_effect=lambda name: versions[name]), \
+                mock.patch('core.pos.utilities.search.time.monotonic', side_effect=lambda: clock[0]), \
+                mock.patch.object(ProductSearchIndex, 'build', side_effect=lambda version: {'version': version, 'expires': 300}) as build:
+            search_index = ProductSearchIndex()
+            search_index.get_index()
+            # Otro proceso editó un producto, este lo ve al vencer el intervalo de comprobación
+            versions['product_search_index'] += 1
+            self.assertEqual(search_index.get_index()['version'], 1)
+            clock[0] += search_index.check_interval
+            self.assertEqual(search_index.get_index()['version'], 2)
+            self.assertEqual(build.call_count, 2)
+
+
+class ConditionalCatalogMixinTest(SimpleTestCase):
+    def get_view(self, state):
+        view = ConditionalCatalogMixin()
+        view.get_queryset = mock.Mock(return_value=SimpleNamespace(model=SimpleNamespace(_meta=SimpleNamespace(label='pos.Provider'))))
+        view.get_catalog_state = mock.Mock(return_value=state)
+        return view
+
+    def get_response(self, view, **headers):
+        request = APIRequestFactory().get('/api/provider/', **headers)
+        with mock.patch('core.pos.api.mixins.settings', SimpleNamespace(API_RESPONSE_CACHE_TIMEOUT=0)), mock.patch('core.pos.api.mixins.CatalogVersion.get_schema_name', return_value='tenant'):
+            return view.get_conditional_response(request, lambda request: Response([]))
+
+    def test_etag_and_last_modified_follow_shared_version(self):
+        version_date = datetime(2024, 1, 2, 10, 0, 0, tzinfo=timezone.utc)
+        state = {'count': 1, 'max_id': 1, 'version': 3, 'version_date': version_date}
+        response = self.get_response(self.get_view(state))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], http_date(version_date.timestamp()))
+        self.assertEqual(self.get_response(self.get_view(state), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        changed = dict(state, version=4)
+        self.assertEqual(self.get_response(self.get_view(changed), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_if_modified_since_ignores_changes_within_the_same_second(self):
+        version_date = datetime(2024, 1, 2, 10, 0, 0, 500000, tzinfo=timezone.utc)
+        view = self.get_view({'count': 1, 'max_id': 1, 'version': 3, 'version_date': version_date})
+        self.assertEqual(self.get_response(view, HTTP_IF_MODIFIED_SINCE=http_date(version_date.timestamp())).status_code, 200)
+        self.assertEqual(self.get_response(view, HTTP_IF_MODIFIED_SINCE=http_date(version_date.timestamp() + 1)).status_code, 304)
+
+
+@override_settings(USE_TZ=True)
+class ProductCodeCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.versions = {'product_code_cache': 1}
+        patches = [
+            mock.patch('core.pos.utilities.product_cache.settings', SimpleNamespace(DEFAULT_SCHEMA='public', PRODUCT_CODE_CACHE_SIZE=10, PRODUCT_CODE_CACHE_TIMEOUT=300)),
+            mock.patch('core.pos.utilities.product_cache.SharedVersion.get_many', side_effect=lambda names: {name: self.versions.get(name, 0) for name in names}),
+            mock.patch('core.pos.utilities.product_cache.SharedVersion.bump', side_effect=self.bump),
+            mock.patch.object(ProductCodeCache, 'overlay', side_effect=lambda payload, product_id, version: dict(payload)),
+            mock.patch.object(ProductCodeCache, 'caches', {}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def bump(self, name):
+        self.versions[name] += 1
+        return self.versions[name]
+
+    def test_hits_skip_the_database_until_the_shared_version_changes(self):
+        product_cache = ProductCodeCache()
+        with mock.patch.object(ProductCodeCache, 'load', return_value=({'id': 1, 'stock': 5}, 1)) as load:
+            product_cache.get('001')
+            product_cache.get('001')
+            self.assertEqual(load.call_count, 1)
+            # Otro proceso cambió el catálogo, por ejemplo el nombre de una categoría
+            self.versions['product_code_cache'] += 1
+            product_cache.get('001')
+            self.assertEqual(load.call_count, 2)
+
+    def test_evict_keeps_other_products_when_no_one_else_changed_the_version(self):
+        product_cache = ProductCodeCache()
+        with mock.patch.object(ProductCodeCache, 'load', side_effect=lambda code: ({'code': code}, int(code))) as load:
+            product_cache.get('1')
+            product_cache.get('2')
+            product_cache.evict([1])
+            product_cache.get('1')
+            product_cache.get('2')
+            self.assertEqual([call.args[0] for call in load.call_args_list], ['1', '2', '1'])
+            self.versions['product_code_cache'] += 1
+            product_cache.evict([1])
+            product_cache.get('2')
+            self.assertEqual(load.call_count, 4)
+
+
+@override_settings(USE_TZ=True)
+class PromotionPriceIndexTest(SimpleTestCase):
+    def setUp(self):
+        patches = [
+            mock.patch('core.pos.utilities.promotion.settings', SimpleNamespace(DEFAULT_SCHEMA='public', PROMOTION_PRICE_INDEX_TIMEOUT=60)),
+            mock.patch.object(PromotionPriceIndex, 'indexes', {}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_reloads_when_another_process_bumps_the_shared_version(self):
+        price_index = PromotionPriceIndex()
+        with mock.patch('core.pos.utilities.promotion.SharedVersion.get', side_effect=[1, 2]) as get, mock.patch('core.pos.utilities.promotion.time.monotonic', side_effect=[0, 0.5, 2]), mock.patch.object(PromotionPriceIndex, 'load', side_effect=[{1: 5.0}, {}]):
+            self.assertEqual(price_index.get_price(1), 5.0)
+            # Dentro del intervalo de verificación no se consulta la versión
+            self.assertEqual(price_index.get_price(1), 5.0)
+            self.assertEqual(get.call_count, 1)
+            # El job de promociones de otro proceso venció la promoción
+            self.assertEqual(price_index.get_price(1), 0.00)
+            self.assertEqual(get.call_count, 2)
+
+
+INVOICE_XML = '<?xml version="1.0" encoding="UTF-8"?>\n<factura id="comprobante" version="2.1.0"><infoTributaria><ambiente>1</ambiente><tipoEmision>1</tipoEmision><razonSocial>Comercial</razonSocial><ruc>0999999999001</ruc><claveAcceso>1111111111111111111111111111111111111111111111111</claveAcceso><codDoc>01</codDoc><estab>001</estab><ptoEmi>001</ptoEmi><secuencial>000000001</secuencial><dirMatriz>Quito</dirMatriz></infoTributaria><infoFactura><fechaEmision>02/01/2024</fechaEmision><obligadoContabilidad>SI</obligadoContabilidad><tipoIdentificacionComprador>05</tipoIdentificacionComprador><razonSocialComprador>Juan Perez</razonSocialComprador><identificacionComprador>0912345678</identificacionComprador><totalSinImpuestos>3.00</totalSinImpuestos><totalDescuento>0.00</totalDescuento><totalConImpuestos><totalImpuesto><codigo>2</codigo><codigoPorcentaje>2</codigoPorcentaje><baseImponible>3.00</baseImponible><valor>0.36</valor></totalImpuesto></totalConImpuestos><importeTotal>3.36</importeTotal><moneda>DOLAR</moneda><pagos><pago><formaPago>01</formaPago><total>3.36</total></pago></pagos></infoFactura><detalles><detalle><codigoPrincipal>P1</codigoPrincipal><descripcion>Producto</descripcion><cantidad>2.00</cantidad><precioUnitario>1.50</precioUnitario><descuento>0.00</descuento><precioTotalSinImpuesto>3.00</precioTotalSinImpuesto><impuestos><impuesto><codigo>2</codigo><codigoPorcentaje>2</codigoPorcentaje><tarifa>12.00</tarifa><baseImponible>3.00</baseImponible><valor>0.36</valor></impuesto></impuestos></detalle></detalles></factura>'
+
+CREDIT_NOTE_XML = '<?xml version="1.0" encoding="UTF-8"?>\n<notaCredito id="comprobante" version="1.1.0"><infoTributaria><ambiente>1</ambiente><tipoEmision>1</tipoEmision><razonSocial>Comercial</razonSocial><ruc>0999999999001</ruc><claveAcceso>1111111111111111111111111111111111111111111111111</claveAcceso><codDoc>04</codDoc><estab>001</estab><ptoEmi>001</ptoEmi><secuencial>000000123</secuencial><dirMatriz>Quito</dirMatriz></infoTributaria><infoNotaCredito><fechaEmision>02/01/2024</fechaEmision><tipoIdentificacionComprador>05</tipoIdentificacionComprador><razonSocialComprador>Juan Perez</razonSocialComprador><identificacionComprador>0912345678</identificacionComprador><codDocModificado>01</codDocModificado><numDocModificado>001-001-000000001</numDocModificado><fechaEmisionDocSustento>02/01/2024</fechaEmisionDocSustento><totalSinImpuestos>3.00</totalSinImpuestos><valorModificacion>3.36</valorModificacion><moneda>DOLAR</moneda><totalConImpuestos><totalImpuesto><codigo>2</codigo><codigoPorcentaje>2</codigoPorcentaje><baseImponible>3.00</baseImponible><valor>0.36</valor></totalImpuesto></totalConImpuestos><motivo>Devolucion</motivo></infoNotaCredito><detalles><detalle><codigoInterno>P1</codigoInterno><descripcion>Producto</descripcion><cantidad>2.00</cantidad><precioUnitario>1.50</precioUnitario><descuento>0.00</descuento><precioTotalSinImpuesto>3.00</precioTotalSinImpuesto><impuestos><impuesto><codigo>2</codigo><codigoPorcentaje>2</codigoPorcentaje><tarifa>12.00</tarifa><baseImponible>3.00</baseImponible><valor>0.36</valor></impuesto></impuestos></detalle></detalles></notaCredito>'
+
+
+class VoucherSchemaValidatorTest(SimpleTestCase):
+    def setUp(self):
+        patch = mock.patch('core.pos.utilities.voucher_schema.settings', SimpleNamespace(VOUCHER_XSD_VALIDATION=True))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_valid_vouchers_pass(self):
+        self.assertEqual(VoucherSchemaValidator().validate(INVOICE_XML), [])
+        self.assertEqual(VoucherSchemaValidator().validate(CREDIT_NOTE_XML.encode('utf-8')), [])
+
+    def test_broken_voucher_returns_structured_errors(self):
+        errors = VoucherSchemaValidator().validate(CREDIT_NOTE_XML.replace('<ruc>0999999999001</ruc>', '<ruc>099</ruc>'))
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0]['identificador'], 'XSD')
+        self.assertEqual(errors[0]['tipo'], 'ERROR')
+        self.assertEqual(errors[0]['linea'], 2)
+        self.assertIn('ruc', errors[0]['mensaje'])
+        self.assertEqual(errors[0]['informacionAdicional'], '/notaCredito/infoTributaria/ruc')
+
+    def test_malformed_and_unknown_documents_return_errors(self):
+        errors = VoucherSchemaValidator().validate(CREDIT_NOTE_XML.replace('</notaCredito>', ''))
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0]['identificador'], 'XSD')
+        errors = VoucherSchemaValidator().validate('<Invoice xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2"/>')
+        self.assertEqual(len(errors), 1)
+        self.assertIn('elemento raíz', errors[0]['mensaje'])
+
+
+class StoredXml:
+    def __init__(self):
+        self.name = None
+        self.content = None
+
+    def __bool__(self):
+        return self.name is not None
+
+    def save(self, name, content, save=True):
+        self.name = name
+        self.content = b''.join(content.chunks())
+
+    def delete(self, save=True):
+        self.name = None
+
+    def open(self, mode='rb'):
+        return BytesIO(self.content)
+
+
+class ElectronicBillingPipelineTest(SimpleTestCase):
+    def setUp(self):
+        patches = [mock.patch('core.pos.utilities.electronic_billing.SRI'), mock.patch('core.pos.utilities.electronic_billing.AuthorizationPoller')]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_stages_pass_the_buffer_and_store_the_document_as_a_file(self):
+        pipeline = ElectronicBillingPipeline()
+        job = SimpleNamespace(id=7, xml=StoredXml())
+        document = SpooledTemporaryFile(max_size=16)
+        document.write(b'<notaCredito id="comprobante"/>')
+        pipeline.sri.create_xml.return_value = {'resp': True, 'xml': document}
+        pipeline.sri.firm_xml.return_value = {'resp': True, 'xml': b'<notaCredito id="comprobante"><ds:Signature/></notaCredito>'}
+        pipeline.sri.validate_xml.return_value = {'resp': True}
+        pipeline.create_xml(job, None)
+        self.assertEqual(job.xml.name, '7_generated.xml')
+        self.assertEqual(job.xml.content, b'<notaCredito id="comprobante"/>')
+        pipeline.firm_xml(job, None)
+        self.assertIs(pipeline.sri.firm_xml.call_args.kwargs['xml'], document)
+        self.assertEqual(job.xml.name, '7_signed.xml')
+        pipeline.validate_xml(job, None)
+        self.assertEqual(pipeline.sri.validate_xml.call_args.kwargs['xml'], pipeline.sri.firm_xml.return_value['xml'])
+
+    def test_resumed_job_reads_the_stored_file(self):
+        pipeline = ElectronicBillingPipeline()
+        job = SimpleNamespace(id=7, xml=StoredXml())
+        job.xml.save('7_signed.xml', SimpleNamespace(chunks=lambda: [b'<notaCredito/>']))
+        pipeline.sri.validate_xml.side_effect = lambda instance, xml: {'resp': xml.read() == b'<notaCredito/>'}
+        self.assertTrue(pipeline.validate_xml(job, None)['resp'])
+
+
+class InvoiceXmlBuilderTest(SimpleTestCase):
+    def test_line_count_does_not_build_the_lines(self):
+        builder = InvoiceXmlBuilder.__new__(InvoiceXmlBuilder)
+        with mock.patch.object(InvoiceXmlBuilder, 'get_lines') as get_lines:
+            self.assertEqual(builder.get_line_count(), 4)
+            get_lines.assert_not_called()
+
+
+class XadesSignerTest(SimpleTestCase):
+    def setUp(self):
+        # Certificado desechable autofirmado, guardado como PKCS#12 igual que la firma electrónica de la empresa
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'Comercial')])
+        now = datetime.now(timezone.utc)
+        self.certificate = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(self.private_key.public_key()).serial_number(x509.random_serial_number()).not_valid_before(now).not_valid_after(now + timedelta(days=1)).sign(self.private_key, hashes.SHA256())
+        file = NamedTemporaryFile(suffix='.p12', delete=False)
+        file.close()
+        self.path = file.name
+        self.export('clave')
+        self.addCleanup(os.remove, self.path)
+        patch = mock.patch.object(XadesSigner, 'signers', {})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def export(self, password):
+        with open(self.path, 'wb') as file:
+            file.write(pkcs12.serialize_key_and_certificates(b'firma', self.private_key, self.certificate, None, BestAvailableEncryption(password.encode('utf-8'))))
+
+    def find(self, element, name):
+        return element.find(f'.//{{{DS_NAMESPACE}}}{name}')
+
+    def test_signature_verifies_with_the_public_key(self):
+        signer = XadesSigner.get_signer(self.path, 'clave')
+        root = etree.fromstring(signer.sign(CREDIT_NOTE_XML))
+        signature = self.find(root, 'Signature')
+        signed_info = self.find(signature, 'SignedInfo')
+        signature_value = base64.b64decode(self.find(signature, 'SignatureValue').text)
+        self.private_key.public_key().verify(signature_value, etree.tostring(signed_info, method='c14n'), padding.PKCS1v15(), hashes.SHA1())
+        # La referencia enveloped corresponde al comprobante sin la firma
+        references = signed_info.findall(f'{{{DS_NAMESPACE}}}Reference')
+        self.assertEqual(references[-1].get('URI'), '#comprobante')
+        root.remove(signature)
+        self.assertEqual(self.find(references[-1], 'DigestValue').text, base64.b64encode(hashlib.sha1(etree.tostring(root, method='c14n')).digest()).decode('utf-8'))
+
+    def test_tampered_voucher_no_longer_matches_its_digest(self):
+        signed = XadesSigner.get_signer(self.path, 'clave').sign(CREDIT_NOTE_XML)
+        root = etree.fromstring(signed.replace(b'<valorModificacion>3.36<', b'<valorModificacion>0.36<'))
+        signature = self.find(root, 'Signature')
+        digest_value = self.find(signature.find(f'.//{{{DS_NAMESPACE}}}Reference[@URI="#comprobante"]'), 'DigestValue').text
+        root.remove(signature)
+        self.assertNotEqual(digest_value, base64.b64encode(hashlib.sha1(etree.tostring(root, method='c14n')).digest()).decode('utf-8'))
+
+    def test_cached_signer_is_replaced_when_the_file_or_password_changes(self):
+        signer = XadesSigner.get_signer(self.path, 'clave')
+        self.assertIs(XadesSigner.get_signer(self.path, 'clave'), signer)
+        # Un certificado renovado en la misma ruta cambia la fecha de modificación del archivo
+        modified = os.path.getmtime(self.path) + 10
+        os.utime(self.path, (modified, modified))
+        renewed = XadesSigner.get_signer(self.path, 'clave')
+        self.assertIsNot(renewed, signer)
+        self.assertEqual(len(XadesSigner.signers), 1)
+        with self.assertRaises(ValueError):
+            XadesSigner.get_signer(self.path, 'otra clave')
+        self.assertIs(XadesSigner.get_signer(self.path, 'clave'), renewed)
+        # La clave forma parte de la llave aunque el archivo conserve la misma fecha
+        self.export('otra clave')
+        os.utime(self.path, (modified, modified))
+        self.assertIsNot(XadesSigner.get_signer(self.path, 'otra clave'), renewed)
+        self.assertEqual(len(XadesSigner.signers), 1)
@@ -41,6 +41,7 @@ urlpatterns = [
     path('product/delete/<int:pk>/', ProductDeleteView.as_view(), name='product_delete'),
     path('product/stock/adjustment/', ProductStockAdjustmentView.as_view(), name='product_stock_adjustment'),
     path('product/export/excel/', ProductExportExcelView.as_view(), name='product_export_excel'),
+    path('product/export/csv/', ProductExportCsvView.as_view(), name='product_export_csv'),
     # purchase
     path('purchase/', PurchaseListView.as_view(), name='purchase_list'),
     path('purchase/add/', PurchaseCreateView.as_view(), name='purchase_create'),
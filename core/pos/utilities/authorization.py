@@ -0,0 +1,114 @@
+import random
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from config import settings
+from core.pos.choices import AUTHORIZATION_POLL_STATUS, ELECTRONIC_BILLING_STAGE, ELECTRONIC_BILLING_STATUS, INVOICE_STATUS
+from core.pos.utilities.sri import SRI
+
+
+class AuthorizationPoller:
+    # Tiempo que una consulta tomada queda reservada para que otro proceso no la repita
+    lease = timedelta(minutes=2)
+
+    def __init__(self):
+        self.sri = SRI()
+
+    def get_model(self):
+        from core.pos.models import AuthorizationPoll
+        return AuthorizationPoll
+
+    def get_lookup(self, instance):
+        from core.pos.models import CreditNote
+        if isinstance(instance, CreditNote):
+            return {'credit_note': instance}
+        return {'sale': instance}
+
+    def get_delay(self, attempts):
+        # Espera exponencial con variación aleatoria para que los comprobantes emitidos juntos no se consulten juntos
+        delay = min(settings.AUTHORIZATION_POLL_BASE_DELAY * (2 ** attempts), settings.AUTHORIZATION_POLL_MAX_DELAY)
+        return timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
+
+    def get_deadline(self):
+        # Límite tras el cual el trabajo de facturación vuelve a consultar por su cuenta si el planificador no avanzó
+        seconds = sum([min(settings.AUTHORIZATION_POLL_BASE_DELAY * (2 ** attempts), settings.AUTHORIZATION_POLL_MAX_DELAY) for attempts in range(settings.AUTHORIZATION_POLL_MAX_ATTEMPTS)])
+        return timezone.now() + timedelta(seconds=seconds) + self.lease
+
+    def enqueue(self, instance, job=None):
+        model = self.get_model()
+        poll, created = model.objects.get_or_create(access_code=instance.access_code, defaults={
+            'environment_type': instance.company.environment_type,
+            'job': job,
+            'next_poll': timezone.now() + self.get_delay(0),
+            **self.get_lookup(instance)
+        })
+        if not created and job is not None and poll.job_id != job.id:
+            poll.job = job
+            poll.save()
+        return poll
+
+    def claim(self, limit):
+        model = self.get_model()
+        now = timezone.now()
+        with transaction.atomic():
+            queryset = model.objects.filter(status=AUTHORIZATION_POLL_STATUS[0][0], next_poll__lte=now).select_for_update(skip_locked=True).order_by('next_poll')[0:limit]
+            polls = list(queryset)
+            if len(polls):
+                model.objects.filter(id__in=[poll.id for poll in polls]).update(next_poll=now + self.lease, modified_date=now)
+        return polls
+
+    def fetch(self, polls):
+        # Las consultas de un mismo ambiente se envían en paralelo por el pool de hilos del cliente SOAP
+        responses = {}
+        for environment_type in set([poll.environment_type for poll in polls]):
+            group = [poll for poll in polls if poll.environment_type == environment_type]
+            results = self.sri.client.authorize_many(environment_type, [poll.access_code for poll in group])
+            for poll, result in zip(group, results):
+                responses[poll.id] = result
+        return responses
+
+    def resume_job(self, poll, status):
+        job = poll.job
+        if job is None or not job.is_active():
+            return
+        if status == AUTHORIZATION_POLL_STATUS[1][0]:
+            if job.credit_note_id:
+                sale = poll.credit_note.sale
+                sale.status = INVOICE_STATUS[-1][0]
+                sale.save()
+            job.stage = ELECTRONIC_BILLING_STAGE[4][0]
+            job.status = ELECTRONIC_BILLING_STATUS[0][0]
+            job.next_attempt = timezone.now()
+        else:
+            job.status = ELECTRONIC_BILLING_STATUS[3][0]
+            job.errors = {'stage': ELECTRONIC_BILLING_STAGE[3][0], 'attempt': job.attempts, 'error': f'Consulta de autorización {poll.get_status_display().lower()}'}
+        job.save()
+
+    def apply(self, poll, result):
+        instance = poll.get_instance()
+        if isinstance(result, Exception):
+            response = {'resp': False, 'pending': True}
+        else:
+            response = self.sri.authorize_xml(instance=instance, generate_pdf=poll.job is None, result=result)
+        poll.attempts += 1
+        if response['resp']:
+            poll.status = AUTHORIZATION_POLL_STATUS[1][0]
+        elif isinstance(response.get('error'), dict):
+            poll.status = AUTHORIZATION_POLL_STATUS[2][0]
+        elif poll.attempts >= settings.AUTHORIZATION_POLL_MAX_ATTEMPTS:
+            poll.status = AUTHORIZATION_POLL_STATUS[3][0]
+        else:
+            poll.next_poll = timezone.now() + self.get_delay(poll.attempts)
+        poll.save()
+        if poll.status != AUTHORIZATION_POLL_STATUS[0][0]:
+            self.resume_job(poll, poll.status)
+        return poll
+
+    def run_pending(self, limit=None):
+        polls = self.claim(limit=limit or settings.AUTHORIZATION_POLL_BATCH_SIZE)
+        if not len(polls):
+            return []
+        responses = self.fetch(polls)
+        return [self.apply(poll, responses[poll.id]) for poll in polls]
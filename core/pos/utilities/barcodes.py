@@ -0,0 +1,41 @@
+import hashlib
+from io import BytesIO
+
+import barcode
+from barcode import writer
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+
+from config import settings
+
+
+class BarcodeGenerator:
+    # Rutas ya verificadas en el almacenamiento por este proceso
+    known_paths = set()
+
+    def __init__(self, symbology='gs1_128'):
+        self.symbology = symbology
+
+    def get_path(self, code, schema_name=None):
+        # La ruta depende solo del código y la simbología, así los duplicados comparten la misma imagen
+        schema_name = schema_name or getattr(connection, 'schema_name', settings.DEFAULT_SCHEMA)
+        digest = hashlib.sha1(f'{self.symbology}:{code}'.encode('utf-8')).hexdigest()
+        return f'{schema_name}/barcode/{self.symbology}/{digest[0:2]}/{digest}.png'
+
+    def render(self, code):
+        image_io = BytesIO()
+        barcode.get_barcode_class(self.symbology)(code, writer=writer.ImageWriter()).write(image_io)
+        return image_io.getvalue()
+
+    def generate(self, code, schema_name=None):
+        path = self.get_path(code, schema_name)
+        if path in self.known_paths:
+            return path
+        if not default_storage.exists(path):
+            saved_path = default_storage.save(path, ContentFile(self.render(code)))
+            # Otro proceso pudo crear el archivo al mismo tiempo, se descarta la copia renombrada
+            if saved_path != path:
+                default_storage.delete(saved_path)
+        self.known_paths.add(path)
+        return path
@@ -0,0 +1,113 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from itertools import repeat
+
+from django.db import connection, connections
+from django_tenants.utils import schema_context
+
+from config import settings
+from core.pos.choices import AUTHORIZATION_POLL_STATUS, ELECTRONIC_BILLING_STATUS, INVOICE_STATUS, VOUCHER_TYPE
+from core.pos.utilities.electronic_billing import ElectronicBillingPipeline
+from core.pos.utilities.sri_client import SRIClient, RateLimiter
+
+
+def initialize_worker(slot, rate):
+    # Cada proceso crea su propio cliente SOAP y sus conexiones, solo el turno de envío al SRI es compartido
+    SRIClient.instance = None
+    SRIClient.limiter = RateLimiter(rate, slot) if slot is not None else None
+
+
+def process_tenant(schema_name, concurrency):
+    return TenantBillingRunner(concurrency=concurrency).process_tenant(schema_name)
+
+
+class TenantBillingRunner:
+    def __init__(self, workers=None, concurrency=None, rate=None):
+        self.workers = workers or settings.ELECTRONIC_BILLING_WORKERS
+        self.concurrency = concurrency or settings.ELECTRONIC_BILLING_TENANT_CONCURRENCY
+        self.rate = settings.ELECTRONIC_BILLING_SRI_RATE if rate is None else rate
+
+    def get_schemas(self):
+        from core.tenant.models import Company
+        return list(Company.objects.exclude(scheme__schema_name=settings.DEFAULT_SCHEMA).values_list('scheme__schema_name', flat=True))
+
+    def get_vouchers(self):
+        from core.pos.models import Sale, CreditNote
+        date_joined = datetime.now().date()
+        excluded = [INVOICE_STATUS[-2][0], INVOICE_STATUS[-1][0]]
+        return list(Sale.objects.filter(date_joined=date_joined, receipt__code=VOUCHER_TYPE[0][0], create_electronic_invoice=True).exclude(status__in=excluded)) + list(CreditNote.objects.filter(date_joined=date_joined, create_electronic_invoice=True).exclude(status__in=excluded))
+
+    def enqueue(self, pipeline, report):
+        for instance in self.get_vouchers():
+            if instance.status == INVOICE_STATUS[0][0]:
+                pipeline.enqueue(instance)
+                report['enqueued'] += 1
+            elif instance.status == INVOICE_STATUS[1][0]:
+                pipeline.sri.notify_by_email(instance=instance, company=instance.company, client=pipeline.get_client(instance))
+                report['notified'] += 1
+
+    def process_job(self, schema_name, pipeline, job):
+        # Cada hilo usa su propia conexión, se cierra al terminar para no dejarla abierta en el pool
+        try:
+            with schema_context(schema_name):
+                return pipeline.process(job)
+        finally:
+            connection.close()
+
+    def process_tenant(self, schema_name):
+        report = {'schema_name': schema_name, 'enqueued': 0, 'notified': 0, 'processed': 0, 'completed': 0, 'failed': 0, 'retrying': 0, 'authorized': 0, 'error': None, 'elapsed': 0}
+        start_time = time.perf_counter()
+        try:
+            pipeline = ElectronicBillingPipeline()
+            with schema_context(schema_name):
+                self.enqueue(pipeline, report)
+                # Como máximo se procesan a la vez tantos trabajos del inquilino como indique el límite de concurrencia
+                with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='billing') as executor:
+                    while True:
+                        polls = pipeline.poller.run_pending()
+                        report['authorized'] += len([poll for poll in polls if poll.status == AUTHORIZATION_POLL_STATUS[1][0]])
+                        jobs = pipeline.claim(limit=self.concurrency)
+                        if not len(jobs) and not len(polls):
+                            break
+                        for job in executor.map(self.process_job, repeat(schema_name), repeat(pipeline), jobs):
+                            report['processed'] += 1
+                            if job.status == ELECTRONIC_BILLING_STATUS[2][0]:
+                                report['completed'] += 1
+                            elif job.status == ELECTRONIC_BILLING_STATUS[3][0]:
+                                report['failed'] += 1
+                            else:
+                                report['retrying'] += 1
+        except Exception as e:
+            report['error'] = str(e)
+        finally:
+            connection.close()
+        report['elapsed'] = time.perf_counter() - start_time
+        return report
+
+    def run(self, schemas=None):
+        schemas = schemas or self.get_schemas()
+        start_time = time.perf_counter()
+        context = multiprocessing.get_context('fork')
+        slot = context.Value('d', 0) if self.rate else None
+        # Las conexiones abiertas no deben heredarse, cada proceso hijo abre las suyas
+        connections.close_all()
+        # Cada inquilino es una tarea independiente, un inquilino lento solo retiene al proceso que lo atiende
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=initialize_worker, initargs=(slot, self.rate)) as executor:
+            reports = list(executor.map(process_tenant, schemas, repeat(self.concurrency)))
+        self.print_report(reports, time.perf_counter() - start_time)
+        return reports
+
+    def print_report(self, reports, elapsed):
+        print(f"{'Esquema':<30}{'Encolados':>10}{'Procesados':>11}{'Completados':>12}{'Fallidos':>9}{'Reintentos':>11}{'Autorizados':>12}{'Segundos':>10}{'Trab/s':>8}")
+        for report in sorted(reports, key=lambda item: item['elapsed'], reverse=True):
+            throughput = report['processed'] / report['elapsed'] if report['elapsed'] else 0
+            print(f"{report['schema_name']:<30}{report['enqueued']:>10}{report['processed']:>11}{report['completed']:>12}{report['failed']:>9}{report['retrying']:>11}{report['authorized']:>12}{report['elapsed']:>10.1f}{throughput:>8.2f}")
+            if report['error']:
+                print(f"{'':<30}error: {report['error']}")
+        processed = sum([report['processed'] for report in reports])
+        failed = sum([report['failed'] for report in reports])
+        errors = len([report for report in reports if report['error']])
+        throughput = processed / elapsed if elapsed else 0
+        print(f'{len(reports)} esquemas / {processed} trabajos en {elapsed:.1f} s ({throughput:.2f} trabajos/s) / {failed} trabajos fallidos / {errors} esquemas con error')
@@ -0,0 +1,22 @@
+from django.db import connection
+
+from config import settings
+from core.pos.utilities.versions import SharedVersion
+
+
+class CatalogVersion:
+    # Versión por esquema del catálogo publicado en la API, cambia con cada alta, edición o eliminación
+    name = 'catalog'
+
+    def get_schema_name(self):
+        return getattr(connection, 'schema_name', settings.DEFAULT_SCHEMA)
+
+    def get(self):
+        return SharedVersion().get(self.name)
+
+    def get_state(self):
+        # Versión y fecha del último cambio, la fecha también avanza con eliminaciones y cambios de promociones
+        return SharedVersion().get_state(self.name)
+
+    def invalidate(self):
+        return SharedVersion().bump(self.name)
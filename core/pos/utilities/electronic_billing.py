@@ -0,0 +1,179 @@
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.pos.choices import ELECTRONIC_BILLING_STAGE, ELECTRONIC_BILLING_STATUS, INVOICE_STATUS, AUTHORIZATION_POLL_STATUS
+from core.pos.utilities.authorization import AuthorizationPoller
+from core.pos.utilities.sri import SRI
+
+
+class ElectronicBillingPipeline:
+    # Tiempo tras el cual un trabajo en proceso se considera abandonado por un worker caído
+    stale_timeout = timedelta(minutes=10)
+    # Espera base del reintento, se duplica en cada intento
+    retry_delay = timedelta(seconds=30)
+    max_retry_delay = timedelta(hours=1)
+
+    def __init__(self):
+        self.sri = SRI()
+        self.poller = AuthorizationPoller()
+
+    def get_model(self):
+        from core.pos.models import ElectronicBillingJob
+        return ElectronicBillingJob
+
+    def get_lookup(self, instance):
+        from core.pos.models import CreditNote
+        if isinstance(instance, CreditNote):
+            return {'credit_note': instance}
+        return {'sale': instance}
+
+    def enqueue(self, instance):
+        model = self.get_model()
+        lookup = self.get_lookup(instance)
+        job = model.objects.filter(status__in=[ELECTRONIC_BILLING_STATUS[0][0], ELECTRONIC_BILLING_STATUS[1][0]], **lookup).first()
+        if job is None:
+            job = model.objects.create(**lookup)
+        return job
+
+    def claim(self, limit=10):
+        model = self.get_model()
+        now = timezone.now()
+        with transaction.atomic():
+            queryset = model.objects.filter(
+                Q(status=ELECTRONIC_BILLING_STATUS[0][0], next_attempt__lte=now) |
+                Q(status=ELECTRONIC_BILLING_STATUS[1][0], modified_date__lte=now - self.stale_timeout)
+            ).select_for_update(skip_locked=True).order_by('next_attempt')[0:limit]
+            jobs = list(queryset)
+            if len(jobs):
+                model.objects.filter(id__in=[job.id for job in jobs]).update(status=ELECTRONIC_BILLING_STATUS[1][0], modified_date=now)
+            for job in jobs:
+                job.status = ELECTRONIC_BILLING_STATUS[1][0]
+        return jobs
+
+    def run_pending(self, limit=10):
+        results = []
+        for job in self.claim(limit=limit):
+            results.append(self.process(job))
+        return results
+
+    def get_client(self, instance):
+        from core.pos.models import CreditNote
+        if isinstance(instance, CreditNote):
+            return instance.sale.client
+        return instance.client
+
+    def save_xml(self, job, xml, name):
+        # El documento se guarda como archivo para reanudar el trabajo, sin convertirlo a texto ni copiarlo en la base
+        if job.xml:
+            job.xml.delete(save=False)
+        if hasattr(xml, 'read'):
+            xml.seek(0)
+            job.xml.save(f'{job.id}_{name}.xml', File(xml), save=False)
+            xml.seek(0)
+        else:
+            job.xml.save(f'{job.id}_{name}.xml', ContentFile(xml), save=False)
+        # La siguiente etapa de la misma ejecución usa el buffer o los bytes sin volver a leer el archivo
+        job.document = xml
+
+    def open_xml(self, job):
+        document = getattr(job, 'document', None)
+        if document is not None:
+            return nullcontext(document)
+        return job.xml.open('rb')
+
+    def create_xml(self, job, instance):
+        result = self.sri.create_xml(instance)
+        if result['resp']:
+            self.save_xml(job, result['xml'], 'generated')
+        return result
+
+    def firm_xml(self, job, instance):
+        with self.open_xml(job) as xml:
+            result = self.sri.firm_xml(instance=instance, xml=xml)
+        if result['resp']:
+            self.save_xml(job, result['xml'], 'signed')
+        return result
+
+    def validate_xml(self, job, instance):
+        with self.open_xml(job) as xml:
+            return self.sri.validate_xml(instance=instance, xml=xml)
+
+    def authorize_xml(self, job, instance):
+        result = self.sri.authorize_xml(instance=instance, generate_pdf=False)
+        if result['resp'] and job.credit_note_id:
+            sale = instance.sale
+            sale.status = INVOICE_STATUS[-1][0]
+            sale.save()
+        elif result.get('pending') and self.poller.enqueue(instance, job=job).status == AUTHORIZATION_POLL_STATUS[0][0]:
+            result['waiting'] = True
+        elif not result['resp'] and 'error' not in result:
+            result['error'] = 'El comprobante aún no ha sido autorizado por el SRI'
+        return result
+
+    def create_pdf(self, job, instance):
+        response = {'resp': False, 'stage': ELECTRONIC_BILLING_STAGE[4][0]}
+        try:
+            instance.generate_pdf_authorized()
+            instance.save()
+            response['resp'] = True
+        except Exception as e:
+            response['error'] = str(e)
+        return response
+
+    def notify_by_email(self, job, instance):
+        return self.sri.notify_by_email(instance=instance, company=instance.company, client=self.get_client(instance))
+
+    def get_stages(self):
+        return [
+            (ELECTRONIC_BILLING_STAGE[0][0], self.create_xml),
+            (ELECTRONIC_BILLING_STAGE[1][0], self.firm_xml),
+            (ELECTRONIC_BILLING_STAGE[2][0], self.validate_xml),
+            (ELECTRONIC_BILLING_STAGE[3][0], self.authorize_xml),
+            (ELECTRONIC_BILLING_STAGE[4][0], self.create_pdf),
+            (ELECTRONIC_BILLING_STAGE[5][0], self.notify_by_email),
+        ]
+
+    def get_next_attempt(self, job):
+        delay = min(self.retry_delay * (2 ** max(job.attempts - 1, 0)), self.max_retry_delay)
+        return timezone.now() + delay
+
+    def process(self, job):
+        instance = job.get_instance()
+        stages = self.get_stages()
+        names = [name for name, method in stages]
+        index = names.index(job.stage) if job.stage in names else len(names)
+        for name, method in stages[index:]:
+            try:
+                result = method(job, instance)
+            except Exception as e:
+                result = {'resp': False, 'error': str(e)}
+            if result.get('waiting'):
+                # La autorización queda a cargo del planificador de consultas, que reanuda el trabajo al obtener respuesta
+                job.status = ELECTRONIC_BILLING_STATUS[0][0]
+                job.next_attempt = self.poller.get_deadline()
+                job.save()
+                return job
+            if not result['resp']:
+                job.attempts += 1
+                job.errors = {'stage': name, 'attempt': job.attempts, 'error': result.get('error')}
+                if job.attempts >= job.max_attempts:
+                    job.status = ELECTRONIC_BILLING_STATUS[3][0]
+                else:
+                    job.status = ELECTRONIC_BILLING_STATUS[0][0]
+                    job.next_attempt = self.get_next_attempt(job)
+                job.save()
+                return job
+            # Cada etapa se persiste para que un reintento continúe desde la siguiente
+            job.stage = names[names.index(name) + 1] if name != names[-1] else ELECTRONIC_BILLING_STAGE[-1][0]
+            job.save()
+        job.stage = ELECTRONIC_BILLING_STAGE[-1][0]
+        job.status = ELECTRONIC_BILLING_STATUS[2][0]
+        job.errors = {}
+        job.save()
+        return job
@@ -0,0 +1,104 @@
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+class InventoryLedger:
+    # El stock de un producto es el último corte más los movimientos registrados después de él
+    def __init__(self):
+        from core.pos.models import Product, InventoryMovement, InventorySnapshot
+        self.product_table = Product._meta.db_table
+        self.movement_table = InventoryMovement._meta.db_table
+        self.snapshot_table = InventorySnapshot._meta.db_table
+
+    def get_last_snapshot_join(self, condition):
+        return f"""
+            LEFT JOIN LATERAL (
+                SELECT s.stock, s.cost, s.last_movement_id FROM {self.snapshot_table} s
+                WHERE s.product_id = p.id AND {condition} ORDER BY s.date DESC LIMIT 1
+            ) s ON true
+        """
+
+    def take_snapshot(self):
+        date = timezone.localdate()
+        # Sin un corte previo el punto de partida es el stock actual del producto
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                WITH last_movement AS (SELECT COALESCE(MAX(id), 0) AS id FROM {self.movement_table})
+                INSERT INTO {self.snapshot_table} (product_id, date, stock, cost, last_movement_id)
+                SELECT p.id, %s,
+                    CASE WHEN s.last_movement_id IS NULL THEN p.stock
+                    ELSE s.stock + COALESCE((
+                        SELECT SUM(m.quantity) FROM {self.movement_table} m
+                        WHERE m.product_id = p.id AND m.id > s.last_movement_id AND m.id <= last_movement.id
+                    ), 0) END,
+                    p.price, last_movement.id
+                FROM {self.product_table} p
+                CROSS JOIN last_movement
+                {self.get_last_snapshot_join('s.date < %s')}
+                WHERE p.inventoried = true
+                ON CONFLICT (product_id, date) DO UPDATE SET stock = EXCLUDED.stock, cost = EXCLUDED.cost, last_movement_id = EXCLUDED.last_movement_id
+            """, [date, date])
+            return cursor.rowcount
+
+    def get_stock_at(self, date):
+        # Fecha inclusiva: se consideran los movimientos hasta el final del día indicado
+        limit = timezone.make_aware(datetime.combine(date + timedelta(days=1), time.min))
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT p.id, p.name, p.code,
+                    CASE WHEN s.last_movement_id IS NULL THEN p.stock - COALESCE((
+                        SELECT SUM(m.quantity) FROM {self.movement_table} m
+                        WHERE m.product_id = p.id AND m.date_joined >= %s
+                    ), 0)
+                    ELSE s.stock + COALESCE((
+                        SELECT SUM(m.quantity) FROM {self.movement_table} m
+                        WHERE m.product_id = p.id AND m.id > s.last_movement_id AND m.date_joined < %s
+                    ), 0) END AS stock,
+                    COALESCE(s.cost, p.price) AS cost
+                FROM {self.product_table} p
+                {self.get_last_snapshot_join('s.date <= %s')}
+                WHERE p.inventoried = true
+                ORDER BY p.name
+            """, [limit, limit, date])
+            return [{'id': id, 'name': name, 'code': code, 'stock': stock, 'cost': float(cost)} for id, name, code, stock, cost in cursor.fetchall()]
+
+    def get_valuation(self, date):
+        products = self.get_stock_at(date)
+        for product in products:
+            product['total'] = round(product['stock'] * product['cost'], 2)
+        return {'products': products, 'total': round(sum([product['total'] for product in products]), 2)}
+
+    def reconcile(self):
+        from core.pos.utilities.product_cache import ProductCodeCache
+        ledger = f"""
+            WITH ledger AS (
+                SELECT p.id, s.stock + COALESCE((
+                    SELECT SUM(m.quantity) FROM {self.movement_table} m
+                    WHERE m.product_id = p.id AND m.id > s.last_movement_id
+                ), 0) AS stock
+                FROM {self.product_table} p
+                {self.get_last_snapshot_join('true')}
+                WHERE p.inventoried = true AND s.last_movement_id IS NOT NULL
+            )
+        """
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # Se bloquean las escrituras de stock mientras se compara contra el kardex
+                cursor.execute(f'LOCK TABLE {self.product_table} IN SHARE ROW EXCLUSIVE MODE')
+                cursor.execute(f"""
+                    {ledger}
+                    SELECT p.id, p.name, p.stock, ledger.stock FROM {self.product_table} p
+                    INNER JOIN ledger ON ledger.id = p.id WHERE p.stock <> ledger.stock ORDER BY p.id
+                """)
+                differences = [{'id': id, 'name': name, 'stock': stock, 'ledger_stock': ledger_stock} for id, name, stock, ledger_stock in cursor.fetchall()]
+                if len(differences):
+                    cursor.execute(f"""
+                        {ledger}
+                        UPDATE {self.product_table} p SET stock = ledger.stock, modified_date = %s
+                        FROM ledger WHERE ledger.id = p.id AND p.stock <> ledger.stock
+                    """, [timezone.now()])
+                    product_ids = [item['id'] for item in differences]
+                    transaction.on_commit(lambda: ProductCodeCache().evict(product_ids))
+        return differences
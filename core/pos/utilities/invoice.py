@@ -0,0 +1,85 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+TWO_PLACES = Decimal('0.01')
+
+ZERO = Decimal('0.00')
+
+
+def to_decimal(value):
+    if value is None:
+        return ZERO
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+def quantize(value):
+    return to_decimal(value).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+class InvoiceCalculator:
+    detail_fields = ['price', 'iva', 'price_with_vat', 'subtotal', 'total_dscto', 'total', 'total_iva']
+
+    def __init__(self, instance, details):
+        self.instance = instance
+        self.details = list(details)
+        self.iva = to_decimal(getattr(instance, 'iva', ZERO))
+
+    def calculate_detail(self, detail):
+        price = to_decimal(detail.price)
+        detail.price = quantize(price)
+        detail.iva = quantize(self.iva)
+        detail.price_with_vat = quantize(price + price * self.iva)
+        detail.subtotal = quantize(price * int(detail.cant))
+        detail.total_dscto = quantize(detail.subtotal * to_decimal(detail.dscto))
+        detail.total = detail.subtotal - detail.total_dscto
+        detail.total_iva = quantize(detail.total * self.iva)
+        return detail
+
+    def calculate_totals(self):
+        totals = {'subtotal_0': ZERO, 'subtotal_12': ZERO, 'total_iva': ZERO, 'total_dscto': ZERO}
+        for detail in self.details:
+            if detail.product.with_tax:
+                totals['subtotal_12'] += detail.total
+                totals['total_iva'] += detail.total_iva
+            else:
+                totals['subtotal_0'] += detail.total
+            totals['total_dscto'] += detail.total_dscto
+        totals['total'] = totals['subtotal_0'] + totals['subtotal_12'] + totals['total_iva']
+        return totals
+
+    def calculate(self):
+        for detail in self.details:
+            self.calculate_detail(detail)
+        totals = self.calculate_totals()
+        for name, value in totals.items():
+            setattr(self.instance, name, value)
+        return totals
+
+    def save(self):
+        totals = self.calculate()
+        if len(self.details):
+            model = type(self.details[0])
+            new_details = [detail for detail in self.details if detail.pk is None]
+            old_details = [detail for detail in self.details if detail.pk is not None]
+            if len(new_details):
+                model.objects.bulk_create(new_details)
+            if len(old_details):
+                model.objects.bulk_update(old_details, fields=self.detail_fields)
+        type(self.instance).objects.filter(pk=self.instance.pk).update(**totals)
+        return totals
+
+
+class PurchaseInvoiceCalculator(InvoiceCalculator):
+    detail_fields = ['price', 'subtotal']
+
+    def calculate_detail(self, detail):
+        detail.price = quantize(detail.price)
+        detail.subtotal = quantize(detail.price * int(detail.cant))
+        return detail
+
+    def calculate_totals(self):
+        subtotal = ZERO
+        for detail in self.details:
+            subtotal += detail.subtotal
+        return {'subtotal': subtotal}
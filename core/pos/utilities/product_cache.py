@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import connection
+from django.utils import timezone
+
+from config import settings
+from core.pos.utilities.promotion import PromotionPriceIndex
+from core.pos.utilities.versions import SharedVersion
+
+
+class ProductCodeCache:
+    # Caché LRU por proceso y por esquema del producto serializado que devuelve el lector de código de barras
+    caches = {}
+    stats = {}
+    lock = threading.Lock()
+    name = 'product_code_cache'
+
+    def get_schema_name(self):
+        return getattr(connection, 'schema_name', settings.DEFAULT_SCHEMA)
+
+    def get_versions(self):
+        # Las versiones se guardan en la base para que los cambios de cualquier proceso vacíen la caché de los demás,
+        # la del índice de promociones se lee en la misma consulta
+        return SharedVersion().get_many([self.name, PromotionPriceIndex.name])
+
+    def invalidate(self):
+        schema_name = self.get_schema_name()
+        SharedVersion().bump(self.name)
+        with self.lock:
+            self.caches.pop(schema_name, None)
+
+    def evict(self, product_ids):
+        # Los cambios de stock también cambian la versión; este proceso solo descarta los productos afectados
+        # si nadie más cambió la versión entretanto, los demás procesos vacían su caché
+        schema_name = self.get_schema_name()
+        product_ids = set(product_ids)
+        version = SharedVersion().bump(self.name)
+        with self.lock:
+            schema_cache = self.caches.get(schema_name)
+            if schema_cache is None:
+                return
+            if schema_cache['version'] != version - 1:
+                self.caches.pop(schema_name, None)
+                return
+            items = schema_cache['items']
+            for code in [code for code, entry in items.items() if entry[1] in product_ids]:
+                del items[code]
+            schema_cache['version'] = version
+
+    def get_cache(self, schema_name, version):
+        schema_cache = self.caches.get(schema_name)
+        # El cambio de día puede activar o vencer promociones, por eso se vacía la caché
+        if schema_cache is None or schema_cache['version'] != version or schema_cache['date'] != timezone.localdate():
+            schema_cache = {'version': version, 'date': timezone.localdate(), 'items': OrderedDict()}
+            with self.lock:
+                self.caches[schema_name] = schema_cache
+        return schema_cache['items']
+
+    def count(self, schema_name, name):
+        with self.lock:
+            stats = self.stats.setdefault(schema_name, {'hits': 0, 'misses': 0})
+            stats[name] += 1
+
+    def load(self, code):
+        from core.pos.models import Product
+        product = Product.objects.select_related('category').filter(code=code).first()
+        if product is None:
+            return None, None
+        return product.toJSON(), product.id
+
+    def overlay(self, payload, product_id, version):
+        # Los precios promocionales dependen del índice de promociones y no modifican el producto
+        payload = dict(payload)
+        price_promotion = PromotionPriceIndex().get_price(product_id, version)
+        payload['price_promotion'] = float(price_promotion)
+        payload['price_current'] = float(price_promotion) if price_promotion > 0 else payload['pvp']
+        return payload
+
+    def get(self, code):
+        schema_name = self.get_schema_name()
+        versions = self.get_versions()
+        items = self.get_cache(schema_name, versions[self.name])
+        now = time.monotonic()
+        with self.lock:
+            entry = items.get(code)
+            if entry is not None and entry[2] > now:
+                items.move_to_end(code)
+            else:
+                entry = None
+        if entry is not None:
+            self.count(schema_name, 'hits')
+            return self.overlay(entry[0], entry[1], versions[PromotionPriceIndex.name]) if entry[0] is not None else None
+        self.count(schema_name, 'misses')
+        payload, product_id = self.load(code)
+        with self.lock:
+            items[code] = (payload, product_id, now + settings.PRODUCT_CODE_CACHE_TIMEOUT)
+            items.move_to_end(code)
+            while len(items) > settings.PRODUCT_CODE_CACHE_SIZE:
+                items.popitem(last=False)
+        return dict(payload) if payload is not None else None
+
+    def get_stats(self, schema_name=None):
+        schema_name = schema_name or self.get_schema_name()
+        stats = self.stats.get(schema_name, {'hits': 0, 'misses': 0})
+        total = stats['hits'] + stats['misses']
+        return {
+            'schema_name': schema_name,
+            'hits': stats['hits'],
+            'misses': stats['misses'],
+            'hit_ratio': round(stats['hits'] / total, 4) if total else 0.00,
+            'size': len(self.caches.get(schema_name, {}).get('items', {}))
+        }
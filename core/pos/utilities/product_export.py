@@ -0,0 +1,42 @@
+import csv
+
+import xlsxwriter
+
+HEADERS = {'Id': 15, 'Nombre': 75, 'Código': 20, 'Categoría': 20, 'Precio de Compra': 20, 'Precio de Venta': 20, 'Stock': 10, '¿Es inventariado?': 15, '¿Se cobra impuesto?': 15}
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class ProductExport:
+    # Exportación en streaming del listado de productos, las filas se leen por lotes con values_list
+    def __init__(self, chunk_size=2000):
+        self.chunk_size = chunk_size
+
+    def get_rows(self):
+        from core.pos.models import Product
+        queryset = Product.objects.order_by('id').values_list('id', 'name', 'code', 'category__name', 'price', 'pvp', 'stock', 'inventoried', 'with_tax')
+        for id, name, code, category, price, pvp, stock, inventoried, with_tax in queryset.iterator(chunk_size=self.chunk_size):
+            yield [id, name, code, category, f'{price:.2f}', f'{pvp:.2f}', stock, 'Si' if inventoried else 'No', 'Si' if with_tax else 'No']
+
+    def write_excel(self, file):
+        # constant_memory escribe cada fila en un archivo temporal, por eso las filas deben escribirse en orden
+        workbook = xlsxwriter.Workbook(file, {'constant_memory': True})
+        worksheet = workbook.add_worksheet('productos')
+        cell_format = workbook.add_format({'bold': True, 'align': 'center', 'border': 1})
+        row_format = workbook.add_format({'align': 'center', 'border': 1})
+        for index, (name, width) in enumerate(HEADERS.items()):
+            worksheet.set_column(first_col=index, last_col=index, width=width)
+            worksheet.write(0, index, name, cell_format)
+        for row, values in enumerate(self.get_rows(), start=1):
+            worksheet.write_row(row, 0, values, row_format)
+        workbook.close()
+
+    def iter_csv(self):
+        writer = csv.writer(Echo())
+        # El BOM permite que Excel reconozca las tildes del archivo
+        yield '\ufeff' + writer.writerow(list(HEADERS.keys()))
+        for values in self.get_rows():
+            yield writer.writerow(values)
@@ -0,0 +1,241 @@
+import csv
+import io
+import uuid
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from openpyxl import load_workbook
+
+from config import settings
+
+STAGING_TABLE = 'pos_product_import'
+
+STAGING_COLUMNS = ['row_number', 'file_id', 'name', 'code', 'category', 'price', 'pvp', 'stock', 'inventoried', 'with_tax']
+
+
+class ProductImporter:
+    # Importación por lotes: el excel se lee en streaming, se carga en una tabla temporal y se combina con sentencias por conjuntos
+    def __init__(self, archive, token=None, chunk_size=2000, max_errors=500):
+        self.archive = archive
+        self.token = token
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.response = {'resp': True, 'rows': 0, 'inserted': 0, 'updated': 0, 'invalid': 0, 'errors': []}
+
+    @staticmethod
+    def get_progress_key(token):
+        return f'product_import_progress_{getattr(connection, "schema_name", settings.DEFAULT_SCHEMA)}_{token}'
+
+    @staticmethod
+    def get_progress(token):
+        return cache.get(ProductImporter.get_progress_key(token), {})
+
+    def set_progress(self, stage, processed=0, total=None):
+        if self.token:
+            cache.set(self.get_progress_key(self.token), {'stage': stage, 'processed': processed, 'total': total}, 3600)
+
+    def add_error(self, row_number, message):
+        self.response['invalid'] += 1
+        if len(self.response['errors']) < self.max_errors:
+            self.response['errors'].append({'row': row_number, 'error': message})
+
+    def get_text(self, value, name, max_length, row_errors):
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        value = str(value).strip() if value is not None else ''
+        if not len(value):
+            row_errors.append(f'El campo {name} es obligatorio')
+        elif len(value) > max_length:
+            row_errors.append(f'El campo {name} supera los {max_length} caracteres')
+        return value
+
+    def get_number(self, value, name, row_errors, cast=float):
+        try:
+            number = cast(value)
+            if number < 0:
+                row_errors.append(f'El campo {name} no puede ser negativo')
+            return number
+        except (TypeError, ValueError):
+            row_errors.append(f'El campo {name} debe ser numérico')
+            return None
+
+    def parse_row(self, row_number, values):
+        values = list(values) + [None] * (9 - len(values))
+        row_errors = []
+        file_id = None
+        if values[0] not in [None, '']:
+            try:
+                file_id = int(values[0])
+            except (TypeError, ValueError):
+                row_errors.append('El campo id debe ser un número entero')
+        name = self.get_text(values[1], 'nombre', 150, row_errors)
+        code = self.get_text(values[2], 'código', 20, row_errors)
+        category = self.get_text(values[3], 'categoría', 50, row_errors)
+        price = self.get_number(values[4], 'precio de compra', row_errors)
+        pvp = self.get_number(values[5], 'precio de venta', row_errors)
+        stock = self.get_number(values[6], 'stock', row_errors, cast=int)
+        inventoried = str(values[7] or '').strip().lower() == 'si'
+        with_tax = str(values[8] or '').strip().lower() == 'si'
+        if len(row_errors):
+            self.add_error(row_number, ', '.join(row_errors))
+            return None
+        return [row_number, file_id, name, code, category, round(price, 2), round(pvp, 2), stock, inventoried, with_tax]
+
+    def read_rows(self):
+        workbook = load_workbook(filename=self.archive, read_only=True, data_only=True)
+        try:
+            sheet = workbook[workbook.sheetnames[0]]
+            for row_number, values in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
+                if not any(value not in [None, ''] for value in values):
+                    continue
+                self.response['rows'] += 1
+                row = self.parse_row(row_number, values)
+                if row is not None:
+                    yield row
+        finally:
+            workbook.close()
+
+    def create_staging_table(self, cursor):
+        cursor.execute(f"""
+            CREATE TEMPORARY TABLE {STAGING_TABLE} (
+                row_number integer NOT NULL,
+                file_id integer NULL,
+                name varchar(150) NOT NULL,
+                code varchar(20) NOT NULL,
+                category varchar(50) NOT NULL,
+                price numeric(9, 2) NOT NULL,
+                pvp numeric(9, 2) NOT NULL,
+                stock integer NOT NULL,
+                inventoried boolean NOT NULL,
+                with_tax boolean NOT NULL,
+                product_id integer NULL,
+                category_id integer NULL,
+                error text NULL
+            ) ON COMMIT DROP
+        """)
+
+    def copy_chunk(self, cursor, rows):
+        raw_cursor = getattr(cursor, 'cursor', cursor)
+        if hasattr(raw_cursor, 'copy_expert'):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow(['' if value is None else value for value in row])
+            buffer.seek(0)
+            raw_cursor.copy_expert(f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        else:
+            placeholders = ', '.join(['%s'] * len(STAGING_COLUMNS))
+            cursor.executemany(f"INSERT INTO {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) VALUES ({placeholders})", rows)
+
+    def load(self, cursor):
+        rows = []
+        for row in self.read_rows():
+            rows.append(row)
+            if len(rows) >= self.chunk_size:
+                self.copy_chunk(cursor, rows)
+                rows = []
+                self.set_progress('Leyendo el archivo', self.response['rows'])
+        if len(rows):
+            self.copy_chunk(cursor, rows)
+        self.set_progress('Validando productos', self.response['rows'])
+        cursor.execute(f'CREATE INDEX ON {STAGING_TABLE} (code)')
+        cursor.execute(f'CREATE INDEX ON {STAGING_TABLE} (name)')
+        cursor.execute(f'ANALYZE {STAGING_TABLE}')
+
+    def validate(self, cursor, product_table):
+        # Solo se conserva la primera aparición de cada código y nombre dentro del archivo
+        for field, message in [('code', 'El código está repetido en el archivo'), ('name', 'El nombre está repetido en el archivo')]:
+            cursor.execute(f"""
+                UPDATE {STAGING_TABLE} s SET error = %s
+                WHERE s.error IS NULL AND EXISTS (
+                    SELECT 1 FROM {STAGING_TABLE} d WHERE d.{field} = s.{field} AND d.row_number < s.row_number
+                )
+            """, [message])
+        # Un id inexistente crea un producto nuevo, igual que la importación anterior; sin id se busca por código
+        cursor.execute(f'UPDATE {STAGING_TABLE} s SET product_id = p.id FROM {product_table} p WHERE p.id = s.file_id')
+        cursor.execute(f'UPDATE {STAGING_TABLE} s SET product_id = p.id FROM {product_table} p WHERE s.product_id IS NULL AND s.file_id IS NULL AND p.code = s.code')
+        cursor.execute(f"""
+            UPDATE {STAGING_TABLE} s SET error = 'El producto está repetido en el archivo'
+            WHERE s.error IS NULL AND s.product_id IS NOT NULL AND EXISTS (
+                SELECT 1 FROM {STAGING_TABLE} d WHERE d.product_id = s.product_id AND d.row_number < s.row_number
+            )
+        """)
+        for field, message in [('code', 'El código pertenece a otro producto'), ('name', 'El nombre pertenece a otro producto')]:
+            cursor.execute(f"""
+                UPDATE {STAGING_TABLE} s SET error = %s FROM {product_table} p
+                WHERE s.error IS NULL AND p.{field} = s.{field} AND p.id IS DISTINCT FROM s.product_id
+            """, [message])
+
+    def resolve_categories(self, cursor, category_table):
+        from core.pos.models import Category
+        cursor.execute(f"""
+            SELECT DISTINCT s.category FROM {STAGING_TABLE} s
+            WHERE s.error IS NULL AND NOT EXISTS (SELECT 1 FROM {category_table} c WHERE c.name = s.category)
+        """)
+        categories = [Category(name=name, slug=slugify(name)) for name, in cursor.fetchall()]
+        Category.objects.bulk_create(categories, batch_size=self.chunk_size)
+        cursor.execute(f'UPDATE {STAGING_TABLE} s SET category_id = c.id FROM {category_table} c WHERE c.name = s.category')
+
+    def merge(self, cursor, product_table):
+        from core.pos.models import Product, InventoryMovement
+        self.set_progress('Actualizando productos', self.response['rows'])
+        cursor.execute(f"""
+            INSERT INTO {InventoryMovement._meta.db_table} (product_id, quantity, cost, source, date_joined)
+            SELECT p.id, s.stock - p.stock, s.price, 'import', %s FROM {STAGING_TABLE} s
+            INNER JOIN {product_table} p ON p.id = s.product_id
+            WHERE s.error IS NULL AND s.inventoried = true AND s.stock <> p.stock
+        """, [timezone.now()])
+        # Si cambia el código se limpia el código de barras y se vuelve a generar cuando se solicite
+        cursor.execute(f"""
+            UPDATE {product_table} p SET
+                name = s.name, code = s.code, category_id = s.category_id, price = s.price, pvp = s.pvp,
+                stock = s.stock, inventoried = s.inventoried, with_tax = s.with_tax, modified_date = %s,
+                barcode = CASE WHEN p.code = s.code THEN p.barcode ELSE '' END
+            FROM {STAGING_TABLE} s
+            WHERE s.product_id = p.id AND s.error IS NULL
+        """, [timezone.now()])
+        self.response['updated'] = cursor.rowcount
+        self.set_progress('Creando productos', self.response['rows'])
+        cursor.execute(f"""
+            SELECT name, code, category_id, price, pvp, stock, inventoried, with_tax FROM {STAGING_TABLE}
+            WHERE product_id IS NULL AND error IS NULL ORDER BY row_number
+        """)
+        while True:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not len(rows):
+                break
+            products = []
+            for name, code, category_id, price, pvp, stock, inventoried, with_tax in rows:
+                products.append(Product(item=uuid.uuid4(), slug=slugify(name), name=name, code=code, category_id=category_id, price=price, pvp=pvp, stock=stock, inventoried=inventoried, with_tax=with_tax))
+            Product.objects.bulk_create(products, batch_size=self.chunk_size)
+            InventoryMovement.objects.bulk_create([InventoryMovement(product_id=product.id, quantity=product.stock, cost=product.price, source='import') for product in products if product.inventoried and product.stock != 0])
+            self.response['inserted'] += len(products)
+        cursor.execute(f'SELECT row_number, error FROM {STAGING_TABLE} WHERE error IS NOT NULL ORDER BY row_number')
+        for row_number, error in cursor.fetchall():
+            self.add_error(row_number, error)
+        self.response['errors'].sort(key=lambda i: i['row'])
+
+    def invalidate_caches(self):
+        from core.pos.utilities.catalog import CatalogVersion
+        from core.pos.utilities.product_cache import ProductCodeCache
+        from core.pos.utilities.search import ProductSearchIndex
+        # bulk_create y los UPDATE no emiten señales
+        ProductSearchIndex().invalidate()
+        ProductCodeCache().invalidate()
+        CatalogVersion().invalidate()
+
+    def run(self):
+        from core.pos.models import Category, Product
+        self.set_progress('Leyendo el archivo')
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                self.create_staging_table(cursor)
+                self.load(cursor)
+                self.validate(cursor, Product._meta.db_table)
+                self.resolve_categories(cursor, Category._meta.db_table)
+                self.merge(cursor, Product._meta.db_table)
+            transaction.on_commit(self.invalidate_caches)
+        self.set_progress('Finalizado', self.response['rows'], self.response['rows'])
+        return self.response
@@ -0,0 +1,87 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from config import settings
+
+
+class ProductSync:
+    # Sincronización incremental del catálogo: productos modificados y eliminados desde el cursor del cliente
+    def __init__(self, limit=500, scope=''):
+        self.limit = min(max(int(limit), 1), settings.PRODUCT_SYNC_MAX_LIMIT)
+        self.scope = str(scope)
+
+    def encode(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+    def decode(self, cursor):
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            position['modified_date'] = datetime.fromisoformat(position['modified_date']) if position['modified_date'] else None
+            return position
+        except Exception:
+            raise ValueError('El cursor de sincronización no es válido')
+
+    def get_start(self):
+        return {'modified_date': None, 'product_id': 0, 'tombstone_id': 0, 'scope': self.scope}
+
+    def get_oldest_transaction(self):
+        # Inicio de la transacción de escritura más antigua que sigue abierta (las sesiones de la aplicación usan el mismo rol)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT min(xact_start) FROM pg_stat_activity WHERE backend_xid IS NOT NULL AND pid <> pg_backend_pid() AND datname = current_database()')
+            return cursor.fetchone()[0]
+
+    def get_horizon(self):
+        # Una transacción abierta puede confirmar después filas con modified_date anterior a ahora (por ejemplo la importación
+        # de productos), por eso el horizonte no avanza más allá de su inicio; el margen cubre el desfase de relojes
+        horizon = timezone.now()
+        oldest = self.get_oldest_transaction()
+        if oldest is not None and oldest < horizon:
+            horizon = oldest
+        return horizon - timedelta(seconds=settings.PRODUCT_SYNC_LAG_SECONDS)
+
+    def get_changes(self, cursor=None, queryset=None):
+        from core.pos.models import Product, ProductTombstone
+        position = self.decode(cursor) if cursor else self.get_start()
+        # Si el alcance cambió (por ejemplo los precios promocionales) el cliente debe descargar el catálogo completo
+        reset = position.get('scope', '') != self.scope
+        if reset:
+            position = self.get_start()
+        horizon = self.get_horizon()
+        if queryset is None:
+            queryset = Product.objects.all()
+        queryset = queryset.filter(modified_date__lte=horizon)
+        if position['modified_date'] is not None:
+            queryset = queryset.filter(Q(modified_date__gt=position['modified_date']) | Q(modified_date=position['modified_date'], id__gt=position['product_id']))
+        products = list(queryset.order_by('modified_date', 'id')[:self.limit + 1])
+        deleted = []
+        # En la descarga inicial no hay nada que eliminar en el cliente, solo se avanza el cursor de eliminados
+        tombstones = ProductTombstone.objects.filter(date_joined__lte=horizon, id__gt=position['tombstone_id'])
+        if position['modified_date'] is None and not position['tombstone_id']:
+            last = tombstones.order_by('-id').values_list('id', flat=True).first()
+            position['tombstone_id'] = last or 0
+        else:
+            deleted = list(tombstones.order_by('id').values_list('id', 'product_id')[:self.limit + 1])
+        has_more = len(products) > self.limit or len(deleted) > self.limit
+        products = products[:self.limit]
+        deleted = deleted[:self.limit]
+        if len(products):
+            position['modified_date'] = products[-1].modified_date
+            position['product_id'] = products[-1].id
+        elif position['modified_date'] is None:
+            position['modified_date'] = horizon
+        if len(deleted):
+            position['tombstone_id'] = deleted[-1][0]
+        position['modified_date'] = position['modified_date'].isoformat()
+        position['scope'] = self.scope
+        return {
+            'products': products,
+            'deleted': [product_id for tombstone_id, product_id in deleted],
+            'cursor': self.encode(position),
+            'has_more': has_more,
+            'reset': reset or cursor is None
+        }
@@ -0,0 +1,110 @@
+import threading
+import time
+
+from django.db import connection
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from config import settings
+from core.pos.utilities.versions import SharedVersion
+
+
+class PromotionPriceIndex:
+    # Índice por esquema del precio promocional vigente de cada producto
+    indexes = {}
+    lock = threading.Lock()
+    name = 'promotion_price_index'
+    # Segundos durante los que se confía en la versión leída, así una lista de productos no consulta la base por cada precio
+    check_interval = 1
+
+    def get_schema_name(self):
+        return getattr(connection, 'schema_name', settings.DEFAULT_SCHEMA)
+
+    def get_version(self):
+        # La versión está en la base, los cambios de las señales y del job de promociones llegan a todos los procesos
+        return SharedVersion().get(self.name)
+
+    def invalidate(self):
+        schema_name = self.get_schema_name()
+        SharedVersion().bump(self.name)
+        with self.lock:
+            self.indexes.pop(schema_name, None)
+
+    def get_queryset(self):
+        from core.pos.models import PromotionsDetail
+        # Las promociones cuya fecha final ya llegó o que aún no inician no aplican aunque el job no haya corrido
+        return PromotionsDetail.objects.filter(promotion__state=True, promotion__start_date__lte=timezone.localdate(), promotion__end_date__gt=timezone.localdate())
+
+    def get_fingerprint(self):
+        # Resumen de las promociones vigentes leído de la base, todos los procesos obtienen el mismo valor
+        state = self.get_queryset().aggregate(count=Count('id'), max_id=Max('id'), products=Sum('product_id'), prices=Sum('price_final'))
+        return f"{state['count']}.{state['max_id'] or 0}.{state['products'] or 0}.{state['prices'] or 0}"
+
+    def load(self):
+        prices = {}
+        queryset = self.get_queryset().order_by('id')
+        for product_id, price_final in queryset.values_list('product_id', 'price_final'):
+            if product_id not in prices:
+                prices[product_id] = price_final
+        return prices
+
+    def get_prices(self, version=None):
+        schema_name = self.get_schema_name()
+        index = self.indexes.get(schema_name)
+        now = time.monotonic()
+        if version is None:
+            version = index['version'] if index is not None and index['checked'] > now else self.get_version()
+        if index is None or index['version'] != version or index['date'] != timezone.localdate() or index['expires'] < now:
+            index = {
+                'version': version,
+                'date': timezone.localdate(),
+                'expires': now + settings.PROMOTION_PRICE_INDEX_TIMEOUT,
+                'checked': now + self.check_interval,
+                'prices': self.load()
+            }
+            with self.lock:
+                self.indexes[schema_name] = index
+        index['checked'] = now + self.check_interval
+        return index['prices']
+
+    def get_price(self, product_id, version=None):
+        return self.get_prices(version).get(product_id, 0.00)
+
+    def get_many(self, product_ids):
+        prices = self.get_prices()
+        return {product_id: prices.get(product_id, 0.00) for product_id in product_ids}
+
+
+class PromotionLifecycle:
+    # Una promoción está vigente desde su fecha de inicio hasta el día anterior a su fecha final
+    def get_state(self, start_date, end_date, date=None):
+        date = date or timezone.localdate()
+        return start_date <= date < end_date
+
+    def run(self):
+        from django.db.models import Q
+        from core.pos.models import Promotions
+        from core.pos.utilities.catalog import CatalogVersion
+        from core.pos.utilities.product_cache import ProductCodeCache
+        date = timezone.localdate()
+        activated = Promotions.objects.filter(state=False, start_date__lte=date, end_date__gt=date).update(state=True)
+        expired = Promotions.objects.filter(state=True).filter(Q(end_date__lte=date) | Q(start_date__gt=date)).update(state=False)
+        if activated or expired:
+            PromotionPriceIndex().invalidate()
+            ProductCodeCache().invalidate()
+            CatalogVersion().invalidate()
+        return {'activated': activated, 'expired': expired}
+
+    def create_details(self, promotion, items):
+        from core.pos.models import Product, PromotionsDetail
+        prices = dict(Product.objects.filter(id__in=[int(i['id']) for i in items]).values_list('id', 'pvp'))
+        details = []
+        for i in items:
+            detail = PromotionsDetail(promotion_id=promotion.id, product_id=int(i['id']))
+            detail.dscto = float(i['dscto']) / 100
+            detail.price_current = float(prices[detail.product_id])
+            detail.total_dscto = detail.get_dscto_real()
+            detail.price_final = float(detail.price_current) - float(detail.total_dscto)
+            details.append(detail)
+        # bulk_create no emite señales, el guardado de la promoción ya invalida el índice de precios al confirmar
+        return PromotionsDetail.objects.bulk_create(details)
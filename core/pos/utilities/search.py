@@ -0,0 +1,236 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+
+from django.db import connection
+from django.db.models import Case, When, Value, IntegerField, Q
+
+from config import settings
+from core.pos.utilities.versions import SharedVersion
+
+
+def normalize(text):
+    return ' '.join(str(text or '').lower().split())
+
+
+def trigrams(text):
+    grams = set()
+    for word in normalize(text).split(' '):
+        if len(word) < 3:
+            continue
+        for index in range(len(word) - 2):
+            grams.add(word[index:index + 3])
+    return grams
+
+
+class ProductSearchIndex:
+    # Índice en memoria por esquema, se usa cuando la base de datos no tiene pg_trgm
+    indexes = {}
+    lock = threading.Lock()
+    name = 'product_search_index'
+    # Segundos durante los que se confía en la versión leída; es el retraso máximo con el que otro proceso ve un cambio
+    check_interval = 1
+
+    def get_schema_name(self):
+        return getattr(connection, 'schema_name', settings.DEFAULT_SCHEMA)
+
+    def get_version(self):
+        return SharedVersion().get(self.name)
+
+    def invalidate(self):
+        # La versión está en la base, los demás procesos reconstruyen su índice en cuanto la leen
+        schema_name = self.get_schema_name()
+        version = SharedVersion().bump(self.name)
+        with self.lock:
+            self.indexes.pop(schema_name, None)
+        return version
+
+    def refresh(self, change):
+        # El proceso actual actualiza su índice en sitio si nadie más cambió la versión entretanto, si no lo descarta
+        schema_name = self.get_schema_name()
+        version = SharedVersion().bump(self.name)
+        with self.lock:
+            index = self.indexes.get(schema_name)
+            if index is None:
+                return
+            if index['version'] != version - 1:
+                self.indexes.pop(schema_name, None)
+                return
+            change(index)
+            index['sorted'] = False
+            index['version'] = version
+
+    def add_row(self, index, product_id, name, code):
+        name = normalize(name)
+        code = normalize(code)
+        index['rows'][product_id] = (name, code)
+        for gram in trigrams(name) | trigrams(code):
+            index['grams'].setdefault(gram, set()).add(product_id)
+
+    def remove_row(self, index, product_id):
+        row = index['rows'].pop(product_id, None)
+        if row is None:
+            return
+        for gram in trigrams(row[0]) | trigrams(row[1]):
+            ids = index['grams'].get(gram)
+            if ids is not None:
+                ids.discard(product_id)
+
+    def sort_prefixes(self, index):
+        index['names'] = sorted((name, product_id) for product_id, (name, code) in index['rows'].items())
+        index['codes'] = sorted((code, product_id) for product_id, (name, code) in index['rows'].items())
+        index['sorted'] = True
+
+    def build(self, version):
+        from core.pos.models import Product
+        now = time.monotonic()
+        index = {
+            'version': version,
+            'expires': now + settings.PRODUCT_SEARCH_INDEX_TIMEOUT,
+            'checked': now + self.check_interval,
+            'rows': {},
+            'grams': {},
+            'sorted': False
+        }
+        for product_id, name, code in Product.objects.values_list('id', 'name', 'code').iterator(chunk_size=5000):
+            self.add_row(index, product_id, name, code)
+        self.sort_prefixes(index)
+        return index
+
+    def get_index(self):
+        schema_name = self.get_schema_name()
+        index = self.indexes.get(schema_name)
+        now = time.monotonic()
+        if index is not None and index['checked'] > now and index['expires'] >= now:
+            return index
+        version = self.get_version()
+        if index is None or index['version'] != version or index['expires'] < now:
+            index = self.build(version)
+            with self.lock:
+                self.indexes[schema_name] = index
+        index['checked'] = now + self.check_interval
+        return index
+
+    def update(self, product):
+        def change(index):
+            self.remove_row(index, product.id)
+            self.add_row(index, product.id, product.name, product.code)
+        self.refresh(change)
+
+    def delete(self, product_id):
+        self.refresh(lambda index: self.remove_row(index, product_id))
+
+    def search_prefix(self, index, term, limit):
+        if not index['sorted']:
+            with self.lock:
+                self.sort_prefixes(index)
+        ids = []
+        for items in [index['codes'], index['names']]:
+            position = bisect_left(items, (term, -1))
+            while position < len(items) and items[position][0].startswith(term) and len(ids) < limit:
+                if items[position][1] not in ids:
+                    ids.append(items[position][1])
+                position += 1
+        return ids
+
+    def search_common(self, index, term, candidates, limit):
+        # Con términos muy frecuentes se recorre el orden alfabético hasta completar el límite
+        ids = self.search_prefix(index, term, limit)
+        names = index['names']
+        found = set(ids)
+        for name, product_id in names:
+            if len(ids) >= limit:
+                break
+            if product_id in candidates and product_id not in found and (term in name or term in index['rows'][product_id][1]):
+                ids.append(product_id)
+                found.add(product_id)
+        return ids
+
+    def search_short(self, index, term, limit):
+        # Los términos sin trigramas se buscan primero por prefijo y se completan como subcadena, igual que icontains
+        ids = self.search_prefix(index, term, limit)
+        if len(ids) >= limit:
+            return ids
+        found = set(ids)
+        results = [(name, product_id) for product_id, (name, code) in index['rows'].items() if product_id not in found and (term in name or term in code)]
+        return ids + [product_id for name, product_id in heapq.nsmallest(limit - len(ids), results)]
+
+    def search(self, term, limit):
+        index = self.get_index()
+        term = normalize(term)
+        grams = trigrams(term)
+        if not len(grams):
+            return self.search_short(index, term, limit)
+        postings = sorted([index['grams'].get(gram, set()) for gram in grams], key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        if not len(candidates):
+            return []
+        if len(candidates) > settings.PRODUCT_SEARCH_MAX_CANDIDATES * 10:
+            return self.search_common(index, term, candidates, limit)
+        results = []
+        for product_id in candidates:
+            name, code = index['rows'][product_id]
+            if code == term:
+                rank = 0
+            elif code.startswith(term) or name.startswith(term):
+                rank = 1
+            elif term in name or term in code:
+                rank = 2
+            else:
+                continue
+            results.append((rank, name, product_id))
+        return [product_id for rank, name, product_id in heapq.nsmallest(limit, results)]
+
+
+class ProductSearch:
+    # Disponibilidad de pg_trgm por proceso
+    trigram_available = None
+
+    def __init__(self, limit=10):
+        self.limit = limit
+
+    def get_backend(self):
+        if settings.PRODUCT_SEARCH_BACKEND != 'auto':
+            return settings.PRODUCT_SEARCH_BACKEND
+        if ProductSearch.trigram_available is None:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT EXISTS(SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+                ProductSearch.trigram_available = cursor.fetchone()[0]
+        return 'database' if ProductSearch.trigram_available else 'memory'
+
+    def search_database(self, queryset, term):
+        from django.contrib.postgres.search import TrigramSimilarity
+        # ILIKE con comodín inicial usa los índices GIN gin_trgm_ops creados por setup_product_search
+        queryset = queryset.filter(Q(name__icontains=term) | Q(code__icontains=term)).annotate(
+            search_rank=Case(
+                When(code__iexact=term, then=Value(0)),
+                When(Q(code__istartswith=term) | Q(name__istartswith=term), then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField()
+            ),
+            search_similarity=TrigramSimilarity('name', term)
+        ).order_by('search_rank', '-search_similarity', 'name')
+        return list(queryset[0:self.limit])
+
+    def search_memory(self, queryset, term):
+        products = []
+        window = self.limit * 4
+        ranked_ids = ProductSearchIndex().search(term, settings.PRODUCT_SEARCH_MAX_CANDIDATES)
+        # Los filtros de stock y exclusiones se aplican en la base de datos con datos actuales
+        for start in range(0, len(ranked_ids), window):
+            chunk = ranked_ids[start:start + window]
+            found = queryset.in_bulk(chunk)
+            products.extend([found[product_id] for product_id in chunk if product_id in found])
+            if len(products) >= self.limit:
+                break
+        return products[0:self.limit]
+
+    def search(self, queryset, term):
+        term = term.strip()
+        queryset = queryset.select_related('category')
+        if not len(term):
+            return list(queryset.order_by('name')[0:settings.PRODUCT_SEARCH_BROWSE_LIMIT])
+        if self.get_backend() == 'database':
+            return self.search_database(queryset, term)
+        return self.search_memory(queryset, term)
@@ -0,0 +1,155 @@
+import base64
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.serialization import pkcs12
+from lxml import etree
+
+from config import settings
+
+DS_NAMESPACE = 'http://www.w3.org/2000/09/xmldsig#'
+ETSI_NAMESPACE = 'http://uri.etsi.org/01903/v1.3.2#'
+C14N_ALGORITHM = 'http://www.w3.org/TR/2001/REC-xml-c14n-20010315'
+SIGNATURE_ALGORITHM = 'http://www.w3.org/2000/09/xmldsig#rsa-sha1'
+DIGEST_ALGORITHM = 'http://www.w3.org/2000/09/xmldsig#sha1'
+ENVELOPED_ALGORITHM = 'http://www.w3.org/2000/09/xmldsig#enveloped-signature'
+
+
+def ds(name):
+    return f'{{{DS_NAMESPACE}}}{name}'
+
+
+def etsi(name):
+    return f'{{{ETSI_NAMESPACE}}}{name}'
+
+
+def b64(value):
+    return base64.b64encode(value).decode('utf-8')
+
+
+def int_to_b64(value):
+    return b64(value.to_bytes((value.bit_length() + 7) // 8, 'big'))
+
+
+class XadesSigner:
+    # Firmadores residentes por certificado, se invalidan si el archivo o la clave cambian
+    signers = {}
+    lock = threading.Lock()
+
+    def __init__(self, data, password):
+        password = password.encode('utf-8') if password else None
+        private_key, certificate, additional_certificates = pkcs12.load_key_and_certificates(data, password)
+        if private_key is None:
+            raise Exception('El archivo de la firma electrónica no contiene una clave privada')
+        self.private_key = private_key
+        self.certificate = self.get_certificate(private_key, certificate, additional_certificates or [])
+        self.certificate_der = self.certificate.public_bytes(serialization.Encoding.DER)
+
+    @classmethod
+    def get_signer(cls, path, password):
+        key = (path, os.path.getmtime(path), hashlib.sha256((password or '').encode('utf-8')).hexdigest())
+        signer = cls.signers.get(key)
+        if signer is None:
+            with cls.lock:
+                signer = cls.signers.get(key)
+                if signer is None:
+                    with open(path, 'rb') as file:
+                        signer = cls(file.read(), password)
+                    for name in [name for name in cls.signers if name[0] == path]:
+                        del cls.signers[name]
+                    cls.signers[key] = signer
+        return signer
+
+    def get_certificate(self, private_key, certificate, additional_certificates):
+        # Algunas entidades emisoras entregan el certificado de firma junto a los de la cadena
+        public_numbers = private_key.public_key().public_numbers()
+        for item in [certificate] + list(additional_certificates):
+            if item is not None and item.public_key().public_numbers() == public_numbers:
+                return item
+        raise Exception('No se encontró el certificado correspondiente a la clave privada')
+
+    def digest(self, value):
+        return b64(hashlib.sha1(value).digest())
+
+    def canonicalize(self, element):
+        return etree.tostring(element, method='c14n', exclusive=False, with_comments=False)
+
+    def add_reference(self, signed_info, uri, digest_value, attrib=None, enveloped=False):
+        reference = etree.SubElement(signed_info, ds('Reference'), attrib=attrib or {})
+        reference.set('URI', uri)
+        if enveloped:
+            transforms = etree.SubElement(reference, ds('Transforms'))
+            etree.SubElement(transforms, ds('Transform'), Algorithm=ENVELOPED_ALGORITHM)
+        etree.SubElement(reference, ds('DigestMethod'), Algorithm=DIGEST_ALGORITHM)
+        etree.SubElement(reference, ds('DigestValue')).text = digest_value
+        return reference
+
+    def create_signed_properties(self, parent, signature_id, reference_id):
+        qualifying_properties = etree.SubElement(parent, etsi('QualifyingProperties'), Target=f'#{signature_id}')
+        signed_properties = etree.SubElement(qualifying_properties, etsi('SignedProperties'), Id=f'{signature_id}-SignedProperties')
+        signed_signature_properties = etree.SubElement(signed_properties, etsi('SignedSignatureProperties'))
+        etree.SubElement(signed_signature_properties, etsi('SigningTime')).text = datetime.now().astimezone().isoformat(timespec='seconds')
+        cert = etree.SubElement(etree.SubElement(signed_signature_properties, etsi('SigningCertificate')), etsi('Cert'))
+        cert_digest = etree.SubElement(cert, etsi('CertDigest'))
+        etree.SubElement(cert_digest, ds('DigestMethod'), Algorithm=DIGEST_ALGORITHM)
+        etree.SubElement(cert_digest, ds('DigestValue')).text = self.digest(self.certificate_der)
+        issuer_serial = etree.SubElement(cert, etsi('IssuerSerial'))
+        etree.SubElement(issuer_serial, ds('X509IssuerName')).text = self.certificate.issuer.rfc4514_string()
+        etree.SubElement(issuer_serial, ds('X509SerialNumber')).text = str(self.certificate.serial_number)
+        data_object_format = etree.SubElement(etree.SubElement(signed_properties, etsi('SignedDataObjectProperties')), etsi('DataObjectFormat'), ObjectReference=f'#{reference_id}')
+        etree.SubElement(data_object_format, etsi('Description')).text = 'contenido comprobante'
+        etree.SubElement(data_object_format, etsi('MimeType')).text = 'text/xml'
+        return signed_properties
+
+    def create_key_info(self, parent, key_info_id):
+        key_info = etree.SubElement(parent, ds('KeyInfo'), Id=key_info_id)
+        x509_data = etree.SubElement(key_info, ds('X509Data'))
+        etree.SubElement(x509_data, ds('X509Certificate')).text = b64(self.certificate_der)
+        public_numbers = self.certificate.public_key().public_numbers()
+        rsa_key_value = etree.SubElement(etree.SubElement(key_info, ds('KeyValue')), ds('RSAKeyValue'))
+        etree.SubElement(rsa_key_value, ds('Modulus')).text = int_to_b64(public_numbers.n)
+        etree.SubElement(rsa_key_value, ds('Exponent')).text = int_to_b64(public_numbers.e)
+        return key_info
+
+    def sign(self, xml):
+        # Los comprobantes grandes llegan como buffer y se leen sin pasar por una cadena intermedia
+        if hasattr(xml, 'read'):
+            xml.seek(0)
+            root = etree.parse(xml).getroot()
+        else:
+            root = etree.fromstring(xml.strip().encode('utf-8') if isinstance(xml, str) else xml.strip())
+        number = uuid.uuid4().hex[0:8]
+        signature_id = f'Signature{number}'
+        reference_id = f'Reference-ID-{number}'
+        # El digest del comprobante se calcula antes de insertar la firma (transformación enveloped)
+        voucher_digest = self.digest(self.canonicalize(root))
+        voucher_uri = f"#{root.get('id')}" if root.get('id') else ''
+        signature = etree.SubElement(root, ds('Signature'), nsmap={'ds': DS_NAMESPACE, 'etsi': ETSI_NAMESPACE}, Id=signature_id)
+        signed_info = etree.SubElement(signature, ds('SignedInfo'), Id=f'{signature_id}-SignedInfo')
+        etree.SubElement(signed_info, ds('CanonicalizationMethod'), Algorithm=C14N_ALGORITHM)
+        etree.SubElement(signed_info, ds('SignatureMethod'), Algorithm=SIGNATURE_ALGORITHM)
+        signature_value = etree.SubElement(signature, ds('SignatureValue'), Id=f'{signature_id}-SignatureValue')
+        key_info = self.create_key_info(signature, f'{signature_id}-Certificate')
+        signature_object = etree.SubElement(signature, ds('Object'), Id=f'{signature_id}-Object')
+        signed_properties = self.create_signed_properties(signature_object, signature_id, reference_id)
+        self.add_reference(signed_info, f"#{signed_properties.get('Id')}", self.digest(self.canonicalize(signed_properties)), attrib={'Id': f'{signature_id}-SignedPropertiesID', 'Type': 'http://uri.etsi.org/01903#SignedProperties'})
+        self.add_reference(signed_info, f"#{key_info.get('Id')}", self.digest(self.canonicalize(key_info)))
+        self.add_reference(signed_info, voucher_uri, voucher_digest, attrib={'Id': reference_id}, enveloped=True)
+        signature_value.text = b64(self.private_key.sign(self.canonicalize(signed_info), padding.PKCS1v15(), hashes.SHA1()))
+        if hasattr(xml, 'read'):
+            # El comprobante firmado se escribe en otro buffer para no generar una copia completa en bytes
+            output = SpooledTemporaryFile(max_size=settings.VOUCHER_XML_SPOOL_SIZE)
+            output.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+            etree.ElementTree(root).write(output, encoding='UTF-8', xml_declaration=False)
+            output.seek(0)
+            return output
+        return b'<?xml version="1.0" encoding="UTF-8"?>\n' + etree.tostring(root, encoding='UTF-8', xml_declaration=False)
+
+    def sign_many(self, xmls):
+        return [self.sign(xml) for xml in xmls]
@@ -1,6 +1,7 @@
 import base64
 import os.path
 import random
+import shutil
 import smtplib
 import string
 import subprocess
@@ -15,16 +16,20 @@ from tempfile import NamedTemporaryFile
 import requests
 from django.core.files import File
 from lxml import etree
-from suds.client import Client
 
 from config import settings
 from core.pos.choices import VOUCHER_STAGE, INVOICE_STATUS
+from core.pos.utilities.signer import XadesSigner
+from core.pos.utilities.sri_client import SRIClient
+from core.pos.utilities.voucher_schema import VoucherSchemaValidator
+from core.pos.utilities.voucher_xml import get_xml_bytes
 
 
 class SRI:
     def __init__(self):
         self.current_date = datetime.now()
         self.base_dir = os.path.dirname(__file__)
+        self.client = SRIClient.get_instance()
 
     def get_absolute_path(self, path):
         return str(Path(path).absolute())
@@ -54,14 +59,10 @@ class SRI:
         return None
 
     def get_receipt_url(self, instance):
-        if instance.company.environment_type == 2:
-            return 'https://cel.sri.gob.ec/comprobantes-electronicos-ws/RecepcionComprobantesOffline?wsdl'
-        return 'https://celcer.sri.gob.ec/comprobantes-electronicos-ws/RecepcionComprobantesOffline?wsdl'
+        return self.client.get_receipt_url(instance.company.environment_type)
 
     def get_authorization_url(self, instance):
-        if instance.company.environment_type == 2:
-            return 'https://cel.sri.gob.ec/comprobantes-electronicos-ws/AutorizacionComprobantesOffline?wsdl'
-        return 'https://celcer.sri.gob.ec/comprobantes-electronicos-ws/AutorizacionComprobantesOffline?wsdl'
+        return self.client.get_authorization_url(instance.company.environment_type)
 
     def create_voucher_errors(self, instance, errors):
         from core.pos.models import VoucherErrors
@@ -80,7 +81,11 @@ class SRI:
         response = {'resp': False, 'stage': VOUCHER_STAGE[1][0]}
         try:
             xml, access_code = instance.generate_xml()
-            print(xml)
+            # Los errores de esquema se detectan localmente sin consumir una llamada a validarComprobante
+            errors = VoucherSchemaValidator().validate(xml)
+            if len(errors):
+                response['error'] = {'access_code': access_code, 'errors': errors}
+                return response
             instance.access_code = access_code
             instance.save()
             response['resp'] = True
@@ -92,12 +97,37 @@ class SRI:
                 self.create_voucher_errors(instance, response)
         return response
 
+    def get_signer(self, company):
+        certificate_path = self.get_absolute_path(f'{settings.BASE_DIR}/{company.get_electronic_signature()}')
+        return XadesSigner.get_signer(certificate_path, company.electronic_signature_key)
+
     def firm_xml(self, instance, xml):
+        if settings.ELECTRONIC_SIGNATURE_ENGINE == 'java':
+            return self.firm_xml_with_jar(instance, xml)
+        response = {'resp': False, 'stage': VOUCHER_STAGE[1][0]}
+        try:
+            response['xml'] = self.get_signer(instance.company).sign(xml)
+            response['resp'] = True
+        except Exception as e:
+            response['error'] = str(e)
+        finally:
+            if 'error' in response:
+                self.create_voucher_errors(instance, response)
+        return response
+
+    def firm_many_xml(self, company, xmls):
+        return self.get_signer(company).sign_many(xmls)
+
+    def firm_xml_with_jar(self, instance, xml):
         response = {'resp': False, 'stage': VOUCHER_STAGE[1][0]}
         file_temp_name = ''
         try:
             with NamedTemporaryFile(suffix='.xml', delete=False) as file_temp:
-                file_temp.write(xml.encode())
+                if hasattr(xml, 'read'):
+                    xml.seek(0)
+                    shutil.copyfileobj(xml, file_temp)
+                else:
+                    file_temp.write(get_xml_bytes(xml))
                 file_temp.flush()
                 file_temp_name = file_temp.name
                 jar_path = self.get_absolute_path(os.path.join(os.path.dirname(self.base_dir), 'resources/jar/sri.jar'))
@@ -114,7 +144,7 @@ class SRI:
                         generated_xml_path = os.path.join(self.base_dir, xml_name)
                         with open(generated_xml_path, 'rb') as file:
                             response['resp'] = True
-                            response['xml'] = file.read().decode('utf-8')
+                            response['xml'] = file.read()
                         if os.path.exists(generated_xml_path):
                             os.remove(generated_xml_path)
                 else:
@@ -131,10 +161,9 @@ class SRI:
     def validate_xml(self, instance, xml):
         response = {'resp': False, 'stage': VOUCHER_STAGE[2][0]}
         try:
-            document = xml.strip().encode('utf-8')
+            document = get_xml_bytes(xml).strip()
             base64_binary_xml = base64.b64encode(document).decode('utf-8')
-            sri_client = Client(self.get_receipt_url(instance))
-            result = sri_client.service.validarComprobante(base64_binary_xml)
+            result = self.client.validate(instance.company.environment_type, base64_binary_xml)
             status = result.estado
             if status == 'DEVUELTA':
                 receipt = result.comprobantes.comprobante[0]
@@ -156,13 +185,25 @@ class SRI:
                 self.create_voucher_errors(instance, response)
         return response
 
-    def authorize_xml(self, instance):
+    def get_authorization(self, result):
+        # Mientras el comprobante está en proceso el SRI responde sin autorizaciones o con un estado intermedio
+        if result is None or len(result) < 3 or not hasattr(result[2], 'autorizacion'):
+            return None
+        receipt = result[2].autorizacion[0]
+        if receipt.estado not in ['AUTORIZADO', 'NO AUTORIZADO']:
+            return None
+        return receipt
+
+    def authorize_xml(self, instance, generate_pdf=True, result=None):
         response = {'resp': False, 'stage': VOUCHER_STAGE[3][0]}
         try:
-            sri_client = Client(self.get_authorization_url(instance))
-            result = sri_client.service.autorizacionComprobante(instance.access_code)
-            if len(result):
-                receipt = result[2].autorizacion[0]
+            # El planificador de consultas entrega la respuesta ya obtenida en lote
+            if result is None:
+                result = self.client.authorize(instance.company.environment_type, instance.access_code)
+            receipt = self.get_authorization(result)
+            if receipt is None:
+                response['pending'] = True
+            else:
                 if receipt.estado == 'NO AUTORIZADO':
                     response['error'] = {'access_code': instance.access_code, 'stage': receipt.estado, 'authorization_date': str(receipt.fechaAutorizacion), 'errors': []}
                     for count, value in enumerate(receipt.mensajes):
@@ -186,7 +227,8 @@ class SRI:
                         file_temp.flush()
                         instance.xml_authorized.save(name=xml_path, content=File(file_temp))
                         instance.authorization_date = receipt.fechaAutorizacion
-                        instance.generate_pdf_authorized()
+                        if generate_pdf:
+                            instance.generate_pdf_authorized()
                         instance.status = INVOICE_STATUS[1][0]
                         instance.save()
                         response['resp'] = True
@@ -233,7 +275,7 @@ class SRI:
         except Exception as e:
             response['error'] = str(e)
             self.create_voucher_errors(instance, response)
-        return False
+        return response
 
     def search_ruc_in_sri(self, ruc):
         response = {'error': 'El número de ruc es inválido'}
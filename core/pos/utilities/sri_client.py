@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import requests
+from requests.adapters import HTTPAdapter
+from suds.cache import ObjectCache
+from suds.client import Client
+from suds.transport import Reply, Transport, TransportError
+
+from config import settings
+
+
+class RequestsTransport(Transport):
+    def __init__(self, session, timeout):
+        super().__init__()
+        self.session = session
+        self.timeout = timeout
+
+    def open(self, request):
+        response = self.session.get(request.url, timeout=self.timeout)
+        if response.status_code != requests.codes.ok:
+            raise TransportError(response.reason, response.status_code, BytesIO(response.content))
+        return BytesIO(response.content)
+
+    def send(self, request):
+        response = self.session.post(request.url, data=request.message, headers=request.headers, timeout=self.timeout)
+        if response.status_code in [202, 204]:
+            return None
+        if response.status_code != requests.codes.ok:
+            raise TransportError(response.reason, response.status_code, BytesIO(response.content))
+        return Reply(response.status_code, response.headers, response.content)
+
+
+class RateLimiter:
+    # Reparte turnos de envío a ritmo constante entre todos los procesos que heredan el mismo valor compartido
+    def __init__(self, rate, slot=None):
+        self.interval = 1 / rate
+        self.slot = slot if slot is not None else multiprocessing.Value('d', 0)
+
+    def acquire(self):
+        with self.slot.get_lock():
+            now = time.time()
+            start = max(now, self.slot.value)
+            self.slot.value = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class SRIClient:
+    # Una sola instancia por proceso, los WSDL se interpretan una vez y se clonan por hilo
+    instance = None
+    lock = threading.Lock()
+    # Límite global de solicitudes al SRI, lo asigna el ejecutor de facturación por inquilino
+    limiter = None
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.SRI_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # La caché solo evita descargar el WSDL después de la primera descarga correcta, sin red ni caché previa se requiere una copia local
+        os.makedirs(settings.SRI_WSDL_CACHE_DIR, exist_ok=True)
+        self.cache = ObjectCache(location=str(settings.SRI_WSDL_CACHE_DIR), days=settings.SRI_WSDL_CACHE_DAYS)
+        self.clients = {}
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=settings.SRI_POOL_SIZE, thread_name_prefix='sri')
+
+    @classmethod
+    def get_instance(cls):
+        if cls.instance is None:
+            with cls.lock:
+                if cls.instance is None:
+                    cls.instance = cls()
+        return cls.instance
+
+    # Cada ambiente tiene su propia dirección, una copia local del WSDL se indica con file:// en la variable del ambiente
+    def get_receipt_url(self, environment_type):
+        return settings.SRI_RECEIPT_URLS[environment_type]
+
+    def get_authorization_url(self, environment_type):
+        return settings.SRI_AUTHORIZATION_URLS[environment_type]
+
+    def get_client(self, url):
+        if not hasattr(self.local, 'clients'):
+            self.local.clients = {}
+        client = self.local.clients.get(url)
+        if client is None:
+            with self.lock:
+                if url not in self.clients:
+                    self.clients[url] = Client(url, cache=self.cache, transport=RequestsTransport(self.session, settings.SRI_TIMEOUT))
+            # suds no es seguro entre hilos, cada hilo usa un clon que comparte el WSDL ya interpretado
+            client = self.clients[url].clone()
+            self.local.clients[url] = client
+        return client
+
+    def throttle(self):
+        if self.limiter is not None:
+            self.limiter.acquire()
+
+    def validate(self, environment_type, base64_binary_xml):
+        self.throttle()
+        return self.get_client(self.get_receipt_url(environment_type)).service.validarComprobante(base64_binary_xml)
+
+    def authorize(self, environment_type, access_code):
+        self.throttle()
+        return self.get_client(self.get_authorization_url(environment_type)).service.autorizacionComprobante(access_code)
+
+    def get_result(self, future):
+        try:
+            return future.result()
+        except Exception as e:
+            return e
+
+    def authorize_many(self, environment_type, access_codes):
+        # suds es bloqueante, las consultas se reparten entre los hilos del pool y los errores se devuelven en su posición
+        futures = [self.executor.submit(self.authorize, environment_type, access_code) for access_code in access_codes]
+        return [self.get_result(future) for future in futures]
@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.models import Case, When, F, IntegerField
+from django.utils import timezone
+
+from core.pos.utilities.product_cache import ProductCodeCache
+
+
+class StockService:
+    def __init__(self, reject_insufficient=False, source='adjustment', source_id=None, inventoried_only=True):
+        self.reject_insufficient = reject_insufficient
+        self.inventoried_only = inventoried_only
+        self.source = source
+        self.source_id = source_id
+        self.deltas = {}
+        self.targets = {}
+
+    def add(self, product_id, cant):
+        self.deltas[product_id] = self.deltas.get(product_id, 0) + int(cant)
+
+    def subtract(self, product_id, cant):
+        self.add(product_id, -int(cant))
+
+    def adjust(self, product_id, stock):
+        # El ajuste fija el stock final, la diferencia se calcula con la fila bloqueada
+        self.targets[product_id] = int(stock)
+
+    def get_queryset(self):
+        from core.pos.models import Product
+        # Las compras mueven el stock de todos los productos, las ventas y notas de crédito solo de los inventariados
+        if not self.inventoried_only:
+            return Product.objects.all()
+        return Product.objects.filter(inventoried=True)
+
+    def record(self, deltas, costs):
+        from core.pos.models import InventoryMovement
+        date_joined = timezone.now()
+        movements = [InventoryMovement(product_id=product_id, quantity=delta, cost=costs[product_id], source=self.source, source_id=self.source_id, date_joined=date_joined) for product_id, delta in deltas]
+        InventoryMovement.objects.bulk_create(movements, batch_size=1000)
+
+    def apply(self):
+        response = {'resp': True, 'failed': []}
+        product_ids = sorted(set([product_id for product_id, delta in self.deltas.items() if delta != 0]) | set(self.targets.keys()))
+        if not len(product_ids):
+            return response
+        with transaction.atomic():
+            queryset = self.get_queryset()
+            # Se bloquean las filas en orden de id para que dos cajas no se bloqueen mutuamente
+            products = queryset.select_for_update().filter(id__in=product_ids).order_by('id').values_list('id', 'name', 'stock', 'price')
+            stocks = {product_id: (name, stock) for product_id, name, stock, price in products}
+            costs = {product_id: price for product_id, name, stock, price in products}
+            deltas = []
+            for product_id in product_ids:
+                if product_id not in stocks:
+                    continue
+                delta = self.deltas.get(product_id, 0)
+                if product_id in self.targets:
+                    delta += self.targets[product_id] - stocks[product_id][1]
+                if delta != 0:
+                    deltas.append((product_id, delta))
+            for product_id, delta in deltas:
+                name, stock = stocks[product_id]
+                if stock + delta < 0:
+                    response['failed'].append({'id': product_id, 'name': name, 'stock': stock, 'cant': -delta})
+            if self.reject_insufficient and len(response['failed']):
+                response['resp'] = False
+                response['error'] = 'Stock insuficiente para: ' + ', '.join([f"{i['name']} (disponible {i['stock']}, solicitado {i['cant']})" for i in response['failed']])
+                return response
+            if len(deltas):
+                queryset.filter(id__in=[product_id for product_id, delta in deltas]).update(
+                    stock=Case(*[When(id=product_id, then=F('stock') + delta) for product_id, delta in deltas], default=F('stock'), output_field=IntegerField()),
+                    modified_date=timezone.now()
+                )
+                self.record(deltas, costs)
+                product_ids = [product_id for product_id, delta in deltas]
+                transaction.on_commit(lambda: ProductCodeCache().evict(product_ids))
+        self.deltas = {}
+        self.targets = {}
+        return response
@@ -0,0 +1,29 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+class SharedVersion:
+    # Contadores por esquema guardados en la base, todos los procesos leen el mismo valor
+    def get_model(self):
+        from core.pos.models import CacheVersion
+        return CacheVersion
+
+    def get_many(self, names):
+        versions = dict(self.get_model().objects.filter(name__in=names).values_list('name', 'version'))
+        return {name: versions.get(name, 0) for name in names}
+
+    def get(self, name):
+        return self.get_many([name])[name]
+
+    def get_state(self, name):
+        state = self.get_model().objects.filter(name=name).values_list('version', 'modified_date').first()
+        return state or (0, None)
+
+    def bump(self, name):
+        model = self.get_model()
+        with transaction.atomic():
+            if not model.objects.filter(name=name).update(version=F('version') + 1, modified_date=timezone.now()):
+                model.objects.get_or_create(name=name)
+                model.objects.filter(name=name).update(version=F('version') + 1, modified_date=timezone.now())
+            return model.objects.filter(name=name).values_list('version', flat=True).first()
@@ -0,0 +1,79 @@
+from django.db import connection, transaction
+
+from config import settings
+
+
+class VoucherNumberAllocator:
+    # Secuencias ya creadas por proceso, por esquema
+    created_sequences = set()
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or settings.VOUCHER_NUMBER_BLOCK_SIZE
+
+    def get_sequence_name(self, receipt):
+        return f'pos_receipt_{receipt.pk}_number_seq'
+
+    def get_cache_key(self, receipt):
+        return connection.schema_name, self.get_sequence_name(receipt)
+
+    def is_exhausted(self, receipt):
+        return int(receipt.current_number) >= int(receipt.end_number)
+
+    def get_start_number(self, receipt):
+        # START WITH debe quedar dentro de MINVALUE y MAXVALUE aunque el rango ya esté agotado
+        return min(max(int(receipt.current_number) + 1, int(receipt.start_number)), int(receipt.end_number))
+
+    def exhaust(self, receipt, cursor):
+        # Con el rango agotado la secuencia queda en su máximo y nextval falla en lugar de repetir el último número
+        cursor.execute('SELECT setval(%s, %s, true)', [self.get_sequence_name(receipt), int(receipt.end_number)])
+
+    def create_sequence(self, receipt):
+        key = self.get_cache_key(receipt)
+        if key in self.created_sequences:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE SEQUENCE IF NOT EXISTS "{self.get_sequence_name(receipt)}" '
+                f'MINVALUE {int(receipt.start_number)} MAXVALUE {int(receipt.end_number)} '
+                f'START WITH {self.get_start_number(receipt)} CACHE {int(self.block_size)} NO CYCLE'
+            )
+            if self.is_exhausted(receipt):
+                self.exhaust(receipt, cursor)
+        # CREATE SEQUENCE es transaccional, solo se recuerda si la transacción se confirma
+        transaction.on_commit(lambda: self.created_sequences.add(key))
+
+    def reset(self, receipt, restart=False):
+        self.create_sequence(receipt)
+        # Solo se reinicia hacia adelante, un número ya emitido nunca vuelve a entregarse
+        if restart and int(receipt.current_number) < self.current(receipt):
+            raise ValueError(f'La secuencia ya emitió el número {self.current(receipt):09d}, solo puede reiniciarse a un número mayor')
+        sql = f'ALTER SEQUENCE "{self.get_sequence_name(receipt)}" MINVALUE {int(receipt.start_number)} MAXVALUE {int(receipt.end_number)} START WITH {self.get_start_number(receipt)}'
+        if restart and not self.is_exhausted(receipt):
+            sql += f' RESTART WITH {self.get_start_number(receipt)}'
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            if restart and self.is_exhausted(receipt):
+                self.exhaust(receipt, cursor)
+
+    def drop(self, receipt):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP SEQUENCE IF EXISTS "{self.get_sequence_name(receipt)}"')
+        self.created_sequences.discard(self.get_cache_key(receipt))
+
+    def next(self, receipt):
+        self.create_sequence(receipt)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [self.get_sequence_name(receipt)])
+            number = cursor.fetchone()[0]
+        # La columna del comprobante se actualiza al confirmar para no bloquear su fila durante toda la venta
+        transaction.on_commit(lambda: type(receipt).objects.filter(pk=receipt.pk, current_number__lt=number).update(current_number=number))
+        return number
+
+    def current(self, receipt):
+        self.create_sequence(receipt)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT last_value, is_called FROM "{self.get_sequence_name(receipt)}"')
+            last_value, is_called = cursor.fetchone()
+        if is_called:
+            return last_value
+        return last_value - 1
@@ -0,0 +1,62 @@
+import os
+import threading
+
+from lxml import etree
+
+from config import settings
+from core.pos.utilities.voucher_xml import get_xml_bytes
+
+
+class VoucherSchemaValidator:
+    # Esquemas XSD oficiales del SRI compilados una sola vez por proceso, indexados por el elemento raíz del comprobante
+    schemas = {}
+    lock = threading.Lock()
+    files = {
+        'factura': 'factura_V2.1.0.xsd',
+        'notaCredito': 'NotaCredito_V1.1.0.xsd'
+    }
+
+    def get_directory(self):
+        return os.path.join(os.path.dirname(os.path.dirname(__file__)), 'resources', 'xsd')
+
+    def get_schema(self, tag):
+        if tag not in self.files:
+            return None
+        schema = self.schemas.get(tag)
+        if schema is None:
+            with self.lock:
+                schema = self.schemas.get(tag)
+                if schema is None:
+                    schema = etree.XMLSchema(etree.parse(os.path.join(self.get_directory(), self.files[tag])))
+                    self.schemas[tag] = schema
+        return schema
+
+    def parse(self, xml):
+        if hasattr(xml, 'read'):
+            xml.seek(0)
+            document = etree.parse(xml)
+            xml.seek(0)
+            return document
+        return etree.ElementTree(etree.fromstring(get_xml_bytes(xml).strip()))
+
+    def get_error(self, message, line=None, column=None, path=None):
+        # Misma estructura que los mensajes devueltos por el SRI para mostrarlos de la misma forma
+        return {'identificador': 'XSD', 'mensaje': message, 'informacionAdicional': path, 'tipo': 'ERROR', 'linea': line, 'columna': column}
+
+    def validate(self, xml):
+        if not settings.VOUCHER_XSD_VALIDATION:
+            return []
+        try:
+            document = self.parse(xml)
+        except etree.XMLSyntaxError as e:
+            return [self.get_error(e.msg, line=e.lineno, column=e.offset)]
+        # El SRI solo recibe los comprobantes definidos en sus esquemas, cualquier otro documento sería rechazado
+        tag = document.getroot().tag
+        schema = self.get_schema(tag)
+        if schema is None:
+            return [self.get_error(f'El SRI no recibe comprobantes con el elemento raíz {tag}, se esperaba {" o ".join(self.files.keys())}', line=document.getroot().sourceline)]
+        # El esquema compilado guarda el registro de errores de la última validación, por eso se comparte con bloqueo
+        with self.lock:
+            if schema.validate(document):
+                return []
+            return [self.get_error(error.message, line=error.line, column=error.column, path=error.path) for error in schema.error_log]
@@ -0,0 +1,644 @@
+import threading
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+
+from django.db import connection
+
+from config import settings
+from core.pos.choices import TAX_CODES
+from core.tenant.choices import RETENTION_AGENT
+
+DIAN_AGENCY_NAME = 'CO, DIAN (Dirección de Impuestos y Aduanas Nacionales)'
+
+UN_AGENCY_NAME = 'United Nations Economic Commission for Europe'
+
+SHA256_ALGORITHM = 'http://www.w3.org/2001/04/xmlenc#sha256'
+
+
+def get_xml_bytes(xml):
+    # Los comprobantes llegan como texto, bytes o un buffer temporal en el modo de documentos grandes
+    if hasattr(xml, 'read'):
+        xml.seek(0)
+        return xml.read()
+    if isinstance(xml, str):
+        return xml.encode('utf-8')
+    return xml
+
+
+def get_xml_text(xml):
+    return get_xml_bytes(xml).decode('utf-8')
+
+
+def escape_text(value):
+    value = str(value)
+    if '&' in value:
+        value = value.replace('&', '&amp;')
+    if '<' in value:
+        value = value.replace('<', '&lt;')
+    if '>' in value:
+        value = value.replace('>', '&gt;')
+    return value
+
+
+def escape_attrib(value):
+    value = escape_text(value)
+    if '"' in value:
+        value = value.replace('"', '&quot;')
+    if '\r' in value:
+        value = value.replace('\r', '&#13;')
+    if '\n' in value:
+        value = value.replace('\n', '&#10;')
+    if '\t' in value:
+        value = value.replace('\t', '&#09;')
+    return value
+
+
+class XmlWriter:
+    # Escribe el documento como fragmentos de texto con el mismo formato que ElementTree.tostring
+    def __init__(self, output=None):
+        self.output = output
+        self.parts = []
+        self.opened = []
+
+    def format_attrib(self, attrib):
+        if not attrib:
+            return ''
+        return ''.join([f' {name}="{escape_attrib(value)}"' for name, value in attrib.items()])
+
+    def start(self, tag, attrib=None):
+        self.parts.append(f'<{tag}{self.format_attrib(attrib)}>')
+        self.opened.append(len(self.parts) - 1)
+
+    def end(self, tag):
+        # Un elemento sin contenido se cierra como <tag />, igual que ElementTree
+        position = self.opened.pop() if len(self.opened) else None
+        if position is not None and position >= 0 and position == len(self.parts) - 1:
+            self.parts[position] = self.parts[position][:-1] + ' />'
+        else:
+            self.parts.append(f'</{tag}>')
+
+    def element(self, tag, text=None, attrib=None):
+        if text is None or text == '':
+            self.parts.append(f'<{tag}{self.format_attrib(attrib)} />')
+        else:
+            self.parts.append(f'<{tag}{self.format_attrib(attrib)}>{escape_text(text)}</{tag}>')
+
+    def raw(self, fragment):
+        self.parts.append(fragment)
+
+    def flush(self):
+        # Con una salida asignada los fragmentos se vuelcan y la memoria queda acotada al bloque actual
+        if self.output is None or not len(self.parts):
+            return
+        self.output.write(self.getbytes())
+        self.parts = []
+        self.opened = [-1 for position in self.opened]
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+    def getbytes(self):
+        return self.getvalue().encode('utf-8')
+
+
+class VoucherXmlBuilder:
+    # Fragmentos constantes de cada compañía, se regeneran cuando cambia alguno de los datos que contienen
+    skeletons = {}
+    lock = threading.Lock()
+    kind = None
+    company_fields = []
+
+    def __init__(self, instance):
+        self.instance = instance
+        self.company = instance.company
+
+    def get_fingerprint(self):
+        return tuple([getattr(self.company, name) for name in self.company_fields]) + (self.instance.receipt.code,)
+
+    def get_skeleton(self):
+        prefix = (getattr(connection, 'schema_name', settings.DEFAULT_SCHEMA), self.company.pk, self.kind)
+        key = prefix + (self.get_fingerprint(),)
+        skeleton = self.skeletons.get(key)
+        if skeleton is None:
+            skeleton = self.build_skeleton()
+            with self.lock:
+                for name in [name for name in self.skeletons if name[0:3] == prefix]:
+                    del self.skeletons[name]
+                self.skeletons[key] = skeleton
+        return skeleton
+
+    def build_skeleton(self):
+        return {}
+
+    def get_line_count(self):
+        return 0
+
+    def write_document(self, writer, access_key):
+        raise NotImplementedError
+
+    def build(self, access_key):
+        writer = XmlWriter()
+        self.write_document(writer, access_key)
+        return writer.getbytes()
+
+    def write(self, output, access_key):
+        writer = XmlWriter(output)
+        self.write_document(writer, access_key)
+        writer.flush()
+        return output
+
+    def render(self, access_key):
+        # Los documentos con muchas líneas se escriben por bloques en un buffer que pasa a disco al superar el límite
+        if self.get_line_count() <= settings.VOUCHER_XML_STREAM_LINES:
+            return self.build(access_key)
+        output = self.write(SpooledTemporaryFile(max_size=settings.VOUCHER_XML_SPOOL_SIZE), access_key)
+        output.seek(0)
+        return output
+
+
+class InvoiceXmlBuilder(VoucherXmlBuilder):
+    kind = 'invoice'
+
+    def write_dian_control(self, writer):
+        writer.start('sts:InvoiceControl')
+        writer.element('sts:InvoiceAuthorization', '18760000001')
+        writer.start('sts:AuthorizationPeriod')
+        writer.element('cbc:StartDate', '2019-01-19')
+        writer.element('cbc:EndDate', '2030-01-19')
+        writer.end('sts:AuthorizationPeriod')
+        writer.start('sts:AuthorizedInvoices')
+        writer.element('sts:Prefix', 'SETP')
+        writer.element('sts:From', '990000000')
+        writer.element('sts:To', '995000000')
+        writer.end('sts:AuthorizedInvoices')
+        writer.end('sts:InvoiceControl')
+        writer.start('sts:InvoiceSource')
+        writer.element('cbc:IdentificationCode', 'CO', {'listAgencyID': '6', 'listAgencyName': UN_AGENCY_NAME, 'listSchemeURI': 'urn:oasis:names:specification:ubl:codelist:gc:CountryIdentificationCode-2.1'})
+        writer.end('sts:InvoiceSource')
+        security_code = 'a8d18e4e5aa00b44a0b1f9ef413ad8215116bd3ce91730d580eaed795c83b5a32fe6f0823abc71400b3d59eb542b7de8'
+        writer.start('sts:SoftwareProvider')
+        writer.element('sts:ProviderID', '800197268', {'schemeAgencyID': '195', 'schemeAgencyName': DIAN_AGENCY_NAME, 'schemeID': '4', 'schemeName': '31'})
+        writer.element('sts:SoftwareID', '56f2ae4e-9812-4fad-9255-08fcfcd5ccb0', {'schemeAgencyID': '195', 'schemeAgencyName': DIAN_AGENCY_NAME})
+        writer.element('sts:SoftwareSecurityCode', security_code, {'schemeAgencyID': '195', 'schemeAgencyName': DIAN_AGENCY_NAME})
+        writer.end('sts:SoftwareProvider')
+        writer.element('sts:SoftwareSecurityCode', security_code, {'schemeAgencyID': '195', 'schemeAgencyName': DIAN_AGENCY_NAME})
+        writer.start('sts:AuthorizationProvider')
+        writer.element('sts:AuthorizationProviderID', '800197268', {'schemeAgencyID': '195', 'schemeAgencyName': DIAN_AGENCY_NAME, 'schemeID': '4', 'schemeName': '31'})
+        writer.end('sts:AuthorizationProvider')
+
+    def write_signature(self, writer):
+        writer.start('ds:Signature', {'Id': 'xmldsig-d0322c4f-be87-495a-95d5-9244980495f4'})
+        writer.start('ds:SignedInfo')
+        writer.element('ds:CanonicalizationMethod', attrib={'Algorithm': 'http://www.w3.org/TR/2001/REC-xml-c14n-20010315'})
+        writer.element('ds:SignatureMethod', attrib={'Algorithm': 'http://www.w3.org/2001/04/xmldsig-more#rsa-sha256'})
+        writer.start('ds:Reference', {'Id': 'xmldsig-d0322c4f-be87-495a-95d5-9244980495f4-ref0'})
+        writer.start('ds:Transforms')
+        writer.element('ds:Transform', attrib={'Algorithm': 'http://www.w3.org/2000/09/xmldsig#enveloped-signature'})
+        writer.end('ds:Transforms')
+        writer.element('ds:DigestMethod', attrib={'Algorithm': SHA256_ALGORITHM})
+        writer.element('ds:DigestValue', 'akcOQ5qEh4dkMwt0d5BoXRR8Bo4vdy9DBZtfF5O0SsA=')
+        writer.end('ds:Reference')
+        writer.start('ds:Reference', {'URI': '#xmldsig-87d128b5-aa31-4f0b-8e45-3d9cfa0eec26-keyinfo'})
+        writer.element('ds:DigestMethod', attrib={'Algorithm': SHA256_ALGORITHM})
+        writer.element('ds:DigestValue', 'troRYR2fcmJLV6gYibVM6XlArbddSCkjYkACZJP47/4=')
+        writer.end('ds:Reference')
+        writer.start('ds:Reference', {'Type': 'http://uri.etsi.org/01903#SignedProperties', 'URI': '#xmldsig-d0322c4f-be87-495a-95d5-9244980495f4-signedprops'})
+        writer.element('ds:DigestMethod', attrib={'Algorithm': SHA256_ALGORITHM})
+        writer.element('ds:DigestValue', 'hpIsyD/08hVUc1exnfEyhGyKX5s3pUPbpMKmPhkPPqU=')
+        writer.end('ds:Reference')
+        writer.end('ds:SignedInfo')
+        writer.element('ds:SignatureValue', """
+                        q4HWeb47oLdDM4D3YiYDOSXE4YfSHkQKxUfSYiEiPuP2XWvD7ELZTC4ENFv6krgDAXczmi0W7OMi
+                        LIVvuFz0ohPUc4KNlUEzqSBHVi6sC34sCqoxuRzOmMEoCB9Tr4VICxU1Ue9XhgP7o6X4f8KFAQWW
+                        NaeTtA6WaO/yUtq91MKP59aAnFMfYl8lXpaS0kpUwuui3wdCZsGycsl1prEWiwzpaukEUOXyTo7o
+                        RBOuNsDIUhP24Fv1alRFnX6/9zEOpRTs4rEQKN3IQnibF757LE/nnkutElZHTXaSV637gpHjXoUN
+                        5JrUwTNOXvmFS98N6DczCQfeNuDIozYwtFVlMw==
+                    """, {'Id': 'xmldsig-d0322c4f-be87-495a-95d5-9244980495f4-sigvalue'})
+        writer.start('ds:KeyInfo', {'Id': 'xmldsig-87d128b5-aa31-4f0b-8e45-3d9cfa0eec26-keyinfo'})
+        writer.start('ds:X509Data')
+        writer.element('ds:X509Certificate', """
+                                MIIIODCCBiCgAwIBAgIIbAsHYmJtoOIwDQYJKoZIhvcNAQELBQAwgbQxIzAhBgkqhkiG9w0BCQEW
+                                FGluZm9AYW5kZXNzY2QuY29tLmNvMSMwIQYDVQQDExpDQSBBTkRFUyBTQ0QgUy5BLiBDbGFzZSBJ
+                                STEwMC4GA1UECxMnRGl2aXNpb24gZGUgY2VydGlmaWNhY2lvbiBlbnRpZGFkIGZpbmFsMRMwEQYD
+                                VQQKEwpBbmRlcyBTQ0QuMRQwEgYDVQQHEwtCb2dvdGEgRC5DLjELMAkGA1UEBhMCQ08wHhcNMTcw
+                                OTE2MTM0ODE5WhcNMjAwOTE1MTM0ODE5WjCCARQxHTAbBgNVBAkTFENhbGxlIEZhbHNhIE5vIDEy
+                                IDM0MTgwNgYJKoZIhvcNAQkBFilwZXJzb25hX2p1cmlkaWNhX3BydWViYXMxQGFuZGVzc2NkLmNv
+                                bS5jbzEsMCoGA1UEAxMjVXN1YXJpbyBkZSBQcnVlYmFzIFBlcnNvbmEgSnVyaWRpY2ExETAPBgNV
+                                BAUTCDExMTExMTExMRkwFwYDVQQMExBQZXJzb25hIEp1cmlkaWNhMSgwJgYDVQQLEx9DZXJ0aWZp
+                                Y2FkbyBkZSBQZXJzb25hIEp1cmlkaWNhMQ8wDQYDVQQHEwZCb2dvdGExFTATBgNVBAgTDEN1bmRp
+                                bmFtYXJjYTELMAkGA1UEBhMCQ08wggEiMA0GCSqGSIb3DQEBAQUAA4IBDwAwggEKAoIBAQC0Dn8t
+                                oZ2CXun+63zwYecJ7vNmEmS+YouH985xDek7ImeE9lMBHXE1M5KDo7iT/tUrcFwKj717PeVL52Nt
+                                B6WU4+KBt+nrK+R+OSTpTno5EvpzfIoS9pLI74hHc017rY0wqjl0lw+8m7fyLfi/JO7AtX/dthS+
+                                MKHIcZ1STPlkcHqmbQO6nhhr/CGl+tKkCMrgfEFIm1kv3bdWqk3qHrnFJ6s2GoVNZVCTZW/mOzPC
+                                NnnUW12LDd/Kd+MjN6aWbP0D/IJbB42Npqv8+/oIwgCrbt0sS1bysUgdT4im9bBhb00MWVmNRBBe
+                                3pH5knzkBid0T7TZsPCyiMBstiLT3yfpAgMBAAGjggLpMIIC5TAMBgNVHRMBAf8EAjAAMB8GA1Ud
+                                IwQYMBaAFKhLtPQLp7Zb1KAohRCdBBMzxKf3MDcGCCsGAQUFBwEBBCswKTAnBggrBgEFBQcwAYYb
+                                aHR0cDovL29jc3AuYW5kZXNzY2QuY29tLmNvMIIB4wYDVR0gBIIB2jCCAdYwggHSBg0rBgEEAYH0
+                                SAECCQIFMIIBvzBBBggrBgEFBQcCARY1aHR0cDovL3d3dy5hbmRlc3NjZC5jb20uY28vZG9jcy9E
+                                UENfQW5kZXNTQ0RfVjIuNS5wZGYwggF4BggrBgEFBQcCAjCCAWoeggFmAEwAYQAgAHUAdABpAGwA
+                                aQB6AGEAYwBpAPMAbgAgAGQAZQAgAGUAcwB0AGUAIABjAGUAcgB0AGkAZgBpAGMAYQBkAG8AIABl
+                                AHMAdADhACAAcwB1AGoAZQB0AGEAIABhACAAbABhAHMAIABQAG8AbADtAHQAaQBjAGEAcwAgAGQA
+                                ZQAgAEMAZQByAHQAaQBmAGkAYwBhAGQAbwAgAGQAZQAgAFAAZQByAHMAbwBuAGEAIABKAHUAcgDt
+                                AGQAaQBjAGEAIAAoAFAAQwApACAAeQAgAEQAZQBjAGwAYQByAGEAYwBpAPMAbgAgAGQAZQAgAFAA
+                                cgDhAGMAdABpAGMAYQBzACAAZABlACAAQwBlAHIAdABpAGYAaQBjAGEAYwBpAPMAbgAgACgARABQ
+                                AEMAKQAgAGUAcwB0AGEAYgBsAGUAYwBpAGQAYQBzACAAcABvAHIAIABBAG4AZABlAHMAIABTAEMA
+                                RDAdBgNVHSUEFjAUBggrBgEFBQcDAgYIKwYBBQUHAwQwRgYDVR0fBD8wPTA7oDmgN4Y1aHR0cDov
+                                L3d3dy5hbmRlc3NjZC5jb20uY28vaW5jbHVkZXMvZ2V0Q2VydC5waHA/Y3JsPTEwHQYDVR0OBBYE
+                                FL9BXJHmFVE5c5Ai8B1bVBWqXsj7MA4GA1UdDwEB/wQEAwIE8DANBgkqhkiG9w0BAQsFAAOCAgEA
+                                b/pa7yerHOu1futRt8QTUVcxCAtK9Q00u7p4a5hp2fVzVrhVQIT7Ey0kcpMbZVPgU9X2mTHGfPdb
+                                R0hYJGEKAxiRKsmAwmtSQgWh5smEwFxG0TD1chmeq6y0GcY0lkNA1DpHRhSK368vZlO1p2a6S13Y
+                                1j3tLFLqf5TLHzRgl15cfauVinEHGKU/cMkjLwxNyG1KG/FhCeCCmawATXWLgQn4PGgvKcNrz+y0
+                                cwldDXLGKqriw9dce2Zerc7OCG4/XGjJ2PyZOJK9j1VYIG4pnmoirVmZbKwWaP4/TzLs6LKaJ4b6
+                                6xLxH3hUtoXCzYQ5ehYyrLVwCwTmKcm4alrEht3FVWiWXA/2tj4HZiFoG+I1OHKmgkNv7SwHS7z9
+                                tFEFRaD3W3aD7vwHEVsq2jTeYInE0+7r2/xYFZ9biLBrryl+q22zM5W/EJq6EJPQ6SM/eLqkpzqM
+                                EF5OdcJ5kIOxLbrIdOh0+grU2IrmHXr7cWNP6MScSL7KSxhjPJ20F6eqkO1Z/LAxqNslBIKkYS24
+                                VxPbXu0pBXQvu+zAwD4SvQntIG45y/67h884I/tzYOEJi7f6/NFAEuV+lokw/1MoVsEgFESASI9s
+                                N0DfUniabyrZ3nX+LG3UFL1VDtDPWrLTNKtb4wkKwGVwqtAdGFcE+/r/1WG0eQ64xCq0NLutCxg=
+                            """)
+        writer.end('ds:X509Data')
+        writer.end('ds:KeyInfo')
+        writer.start('ds:Object')
+        writer.start('xades:QualifyingProperties', {'Target': '#xmldsig-d0322c4f-be87-495a-95d5-9244980495f4'})
+        writer.start('xades:SignedProperties', {'Id': 'xmldsig-d0322c4f-be87-495a-95d5-9244980495f4-signedprops'})
+        writer.start('xades:SignedSignatureProperties')
+        writer.element('xades:SigningTime', '2019-06-21T19:09:35.993-05:00')
+        writer.start('xades:SigningCertificate')
+        writer.start('xades:Cert')
+        writer.start('xades:CertDigest')
+        writer.element('ds:DigestMethod', attrib={'Algorithm': SHA256_ALGORITHM})
+        writer.element('ds:DigestValue', 'nem6KXhqlV0A0FK5o+MwJZ3Y1aHgmL1hDs/RMJu7HYw=')
+        writer.end('xades:CertDigest')
+        writer.end('xades:Cert')
+        writer.end('xades:SigningCertificate')
+        writer.start('xades:SignaturePolicyIdentifier')
+        writer.start('xades:SignaturePolicyId')
+        writer.element('xades:Identifier', 'https://facturaelectronica.dian.gov.co/politicadefirma/v1/politicadefirmav2.pdf')
+        writer.start('xades:SigPolicyHash')
+        writer.element('ds:DigestMethod', attrib={'Algorithm': SHA256_ALGORITHM})
+        writer.element('ds:DigestValue', 'dMoMvtcG5aIzgYo0tIsSQeVJBDnUnfSOfBpxXrmor0Y=')
+        writer.end('xades:SigPolicyHash')
+        writer.end('xades:SignaturePolicyId')
+        writer.end('xades:SignaturePolicyIdentifier')
+        writer.start('xades:SignerRole')
+        writer.start('xades:ClaimedRoles')
+        writer.element('xades:ClaimedRole', 'supplier')
+        writer.end('xades:ClaimedRoles')
+        writer.end('xades:SignerRole')
+        writer.end('xades:SignedSignatureProperties')
+        writer.end('xades:SignedProperties')
+        writer.end('xades:QualifyingProperties')
+        writer.end('ds:Object')
+        writer.end('ds:Signature')
+
+    def write_address(self, writer, tag, line):
+        writer.start(tag)
+        writer.element('cbc:ID', '11001')
+        writer.element('cbc:CityName', 'Bogotá, D.C.')
+        writer.element('cbc:CountrySubentity', 'Bogotá')
+        writer.element('cbc:CountrySubentityCode', '11')
+        writer.start('cac:AddressLine')
+        writer.element('cbc:Line', line)
+        writer.end('cac:AddressLine')
+        writer.start('cac:Country')
+        writer.element('cbc:IdentificationCode', 'CO')
+        writer.element('cbc:Name', 'Colombia', {'languageID': 'es'})
+        writer.end('cac:Country')
+        writer.end(tag)
+
+    def write_party_tax_scheme(self, writer, name, company_id, scheme_id, level, address_line, tax_id, tax_name):
+        writer.start('cac:PartyTaxScheme')
+        writer.element('cbc:RegistrationName', name)
+        writer.element('cbc:CompanyID', company_id, {'schemeAgencyID': '195', 'schemeAgencyName': DIAN_AGENCY_NAME, 'schemeID': scheme_id, 'schemeName': '31'})
+        writer.element('cbc:TaxLevelCode', 'O-99', {'listName': level})
+        self.write_address(writer, 'cac:RegistrationAddress', address_line)
+        writer.start('cac:TaxScheme')
+        writer.element('cbc:ID', tax_id)
+        writer.element('cbc:Name', tax_name)
+        writer.end('cac:TaxScheme')
+        writer.end('cac:PartyTaxScheme')
+
+    def write_party_legal_entity(self, writer, name, company_id, scheme_id):
+        writer.start('cac:PartyLegalEntity')
+        writer.element('cbc:RegistrationName', name)
+        writer.element('cbc:CompanyID', company_id, {'schemeAgencyID': '195', 'schemeAgencyName': DIAN_AGENCY_NAME, 'schemeID': scheme_id, 'schemeName': '31'})
+        writer.end('cac:PartyLegalEntity')
+
+    def build_skeleton(self):
+        header = XmlWriter()
+        header.raw('<?xml version="1.0" encoding="utf-8"?>\n')
+        header.start('Invoice', {
+            'xmlns': 'urn:oasis:names:specification:ubl:schema:xsd:Invoice-2',
+            'xmlns_cac': 'urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2',
+            'xmlns_cbc': 'urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2',
+            'xmlns_ds': 'http://www.w3.org/2000/09/xmldsig#',
+            'xmlns_ext': 'urn:oasis:names:specification:ubl:schema:xsd:CommonExtensionComponents-2',
+            'xmlns_sts': 'dian:gov:co:facturaelectronica:Structures-2-1',
+            'xmlns_xades': 'http://uri.etsi.org/01903/v1.3.2#',
+            'xmlns_xades141': 'http://uri.etsi.org/01903/v1.4.1#',
+            'xmlns_xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+            'xsi_schemaLocation': 'urn:oasis:names:specification:ubl:schema:xsd:Invoice-2 http://docs.oasis-open.org/ubl/os-UBL-2.1/xsd/maindoc/UBL-Invoice-2.1.xsd'
+        })
+        header.start('ext:UBLExtensions')
+        header.start('ext:UBLExtension')
+        header.start('ext:ExtensionContent')
+        header.start('sts:DianExtensions')
+        self.write_dian_control(header)
+        extensions = XmlWriter()
+        extensions.end('sts:DianExtensions')
+        extensions.end('ext:ExtensionContent')
+        extensions.end('ext:UBLExtension')
+        extensions.start('ext:UBLExtension')
+        extensions.start('ext:ExtensionContent')
+        self.write_signature(extensions)
+        extensions.end('ext:ExtensionContent')
+        extensions.end('ext:UBLExtension')
+        extensions.end('ext:UBLExtensions')
+        extensions.element('cbc:UBLVersionID', 'UBL 2.1')
+        extensions.element('cbc:CustomizationID', '10')
+        extensions.element('cbc:ProfileID', 'DIAN 2.1')
+        extensions.element('cbc:ProfileExecutionID', '2')
+        supplier = XmlWriter()
+        supplier.start('cac:AccountingSupplierParty')
+        supplier.element('cbc:AdditionalAccountID', '1')
+        supplier.start('cac:Party')
+        supplier.element('cbc:IndustryClasificationCode', '45624')
+        for party_name in ['Nombre Tienda', 'Establecimiento Principal', 'DIAN']:
+            supplier.start('cac:PartyName')
+            supplier.element('cbc:Name', party_name)
+            supplier.end('cac:PartyName')
+        supplier.start('cac:PhysicalLocation')
+        self.write_address(supplier, 'cac:Address', 'Av. #97 - 13')
+        supplier.end('cac:PhysicalLocation')
+        self.write_party_tax_scheme(supplier, 'DIAN', '800197268', '4', '05', 'Av. Jiménez #7 - 13', '01', 'IVA')
+        self.write_party_legal_entity(supplier, 'DIAN', '800197268', '9')
+        supplier.end('cac:Party')
+        supplier.end('cac:AccountingSupplierParty')
+        return {'header': header.getvalue(), 'extensions': extensions.getvalue(), 'supplier': supplier.getvalue()}
+
+    def write_qr_code(self, writer):
+        writer.element('sts:QRCode', '''NroFactura=SETP990000002
+        NitFacturador=800197268
+        NitAdquiriente=900108281
+        FechaFactura=2019-06-20
+        ValorTotalFactura=14024.07
+        CUFE=941cf36af62dbbc06f105d2a80e9bfe683a90e84960eae4d351cc3afbe8f848c26c39bac4fbc80fa254824c6369ea694
+        URL=https://catalogo-vpfe-hab.dian.gov.co/Document/FindDocument?documentKey=941cf36af62dbbc06f105d2a80e9bfe683a90e84960eae4d351cc3afbe8f848c26c39bac4fbc80fa254824c6369ea694&amp;partitionKey=co|06|94&amp;emissionDate=20190620''')
+
+    def write_document_info(self, writer):
+        writer.element('cbc:ID', 'SETP990000002')
+        writer.element('cbc:UUID', '941cf36af62dbbc06f105d2a80e9bfe683a90e84960eae4d351cc3afbe8f848c26c39bac4fbc80fa254824c6369ea694', {'schemeID': '2', 'schemeName': 'CUFE-SHA384'})
+        writer.element('cbc:IssueDate', '2019-06-20')
+        writer.element('cbc:IssueTime', '09:15:23-05:00')
+        writer.element('cbc:InvoiceTypeCode', '01')
+        writer.element('cbc:DocumentCurrencyCode', 'COP', {'listAgencyID': '6', 'listAgencyName': UN_AGENCY_NAME, 'listID': 'ISO 4217 Alpha'})
+        # Numero de productos en la fctura
+        writer.element('cbc:LineCountNumeric', '2')
+        writer.start('cac:InvoicePeriod')
+        writer.element('cbc:StartDate', '2019-05-01')
+        writer.element('cbc:EndDate', '2019-05-30')
+        writer.end('cac:InvoicePeriod')
+
+    def write_customer(self, writer):
+        writer.start('cac:AccountingCustomerParty')
+        writer.element('cbc:AdditionalAccountID', '1')
+        writer.start('cac:Party')
+        writer.start('cac:PartyName')
+        writer.element('cbc:Name', 'OPTICAS GMO COLOMBIA S A S')
+        writer.end('cac:PartyName')
+        writer.start('cac:PhysicalLocation')
+        self.write_address(writer, 'cac:Address', 'CARRERA 8 No 20-14/40')
+        writer.end('cac:PhysicalLocation')
+        self.write_party_tax_scheme(writer, 'OPTICAS GMO COLOMBIA S A S', '900108281', '3', '04', 'CR 9 A N0 99 - 07 OF 802', 'ZZ', 'NO CAUSA')
+        self.write_party_legal_entity(writer, 'OPTICAS GMO COLOMBIA S A S', '900108281', '3')
+        writer.end('cac:Party')
+        writer.end('cac:AccountingCustomerParty')
+
+    taxes = (
+        ('IVA', '01', '19.00'),
+        ('IVA', '01', '16.00'),
+        ('ICA', '03', '0.00'),
+        ('INC', '04', '0.00'),
+    )
+
+    def get_taxes(self):
+        return self.taxes
+
+    def write_taxes(self, writer, taxes):
+        for tax in taxes:
+            writer.start('cac:TaxTotal')
+            writer.element('cbc:TaxAmount', '1', {'currencyID': 'COP'})
+            writer.start('cac:TaxCategory')
+            writer.element('cbc:Percent', '10')
+            writer.start('cac:TaxScheme')
+            writer.element('cbc:ID', '1')
+            writer.element('cbc:Name', '1')
+            writer.end('cac:TaxScheme')
+            writer.end('cac:TaxCategory')
+            writer.end('cac:TaxTotal')
+
+    def write_totals(self, writer):
+        writer.start('cac:LegalMonetaryTotal')
+        writer.element('cbc:LineExtensionAmount', '12600.06', {'currencyID': 'COP'})
+        writer.element('cbc:TaxExclusiveAmount', '12787.56', {'currencyID': 'COP'})
+        writer.element('cbc:TaxInclusiveAmount', '15024.07', {'currencyID': 'COP'})
+        writer.element('cbc:AllowanceTotalAmount', '0.00', {'currencyID': 'COP'})
+        writer.element('cbc:PrepaidAmount', '0.00', {'currencyID': 'COP'})
+        writer.element('cbc:PayableAmount', '15024.07', {'currencyID': 'COP'})
+        writer.end('cac:LegalMonetaryTotal')
+
+    def write_line(self, writer, line):
+        writer.start('cac:InvoiceLine')
+        writer.element('cbc:ID', '1')
+        writer.element('cbc:InvoicedQuantity', '1.000000', {'unitCode': 'EA'})
+        writer.element('cbc:LineExtensionAmount', '12600.06', {'currencyID': 'COP'})
+        writer.element('cbc:FreeOfChargeIndicator', 'false')
+        writer.start('cac:AllowanceCharge')
+        writer.element('cbc:ID', '1')
+        writer.element('cbc:ChargeIndicator', 'false')
+        writer.element('cbc:AllowanceChargeReason', 'Descuento por cliente frecuente')
+        writer.element('cbc:MultiplierFactorNumeric', '33.33')
+        writer.element('cbc:Amount', '6299.94', {'currencyID': 'COP'})
+        writer.element('cbc:BaseAmount', '18900.00', {'currencyID': 'COP'})
+        writer.end('cac:AllowanceCharge')
+        writer.start('cac:TaxTotal')
+        writer.element('cbc:TaxAmount', '2394.01', {'currencyID': 'COP'})
+        writer.start('cac:TaxSubtotal')
+        writer.element('cbc:TaxableAmount', '12600.06', {'currencyID': 'COP'})
+        writer.element('cbc:TaxAmount', '2394.01', {'currencyID': 'COP'})
+        writer.start('cac:TaxCategory')
+        writer.element('cbc:Percent', '19.00')
+        writer.start('cac:TaxScheme')
+        writer.element('cbc:ID', '01')
+        writer.element('cbc:Name', 'IVA')
+        writer.end('cac:TaxScheme')
+        writer.end('cac:TaxCategory')
+        writer.end('cac:TaxSubtotal')
+        writer.end('cac:TaxTotal')
+        writer.start('cac:Item')
+        writer.element('cbc:Description', 'AV OASYS -2.25 (8.4) LENTE DE CONTATO')
+        writer.start('cac:SellersItemIdentification')
+        writer.element('cbc:ID', 'AOHV84-225')
+        writer.end('cac:SellersItemIdentification')
+        writer.start('cac:AdditionalItemIdentification')
+        writer.element('cbc:ID', '6543542313534', {'schemeID': '999', 'schemeName': 'EAN13'})
+        writer.end('cac:AdditionalItemIdentification')
+        writer.end('cac:Item')
+        writer.start('cac:Price')
+        writer.element('cbc:PriceAmount', '18900.00', {'currencyID': 'COP'})
+        writer.element('cbc:BaseQuantity', '1.000000', {'unitCode': 'EA'})
+        writer.end('cac:Price')
+        writer.end('cac:InvoiceLine')
+
+    def get_lines(self):
+        return self.get_taxes()
+
+    def get_line_count(self):
+        # Se cuenta sin construir las líneas, que se recorren una sola vez al escribir el documento
+        return len(self.taxes)
+
+    def write_document(self, writer, access_key):
+        skeleton = self.get_skeleton()
+        writer.raw(skeleton['header'])
+        self.write_qr_code(writer)
+        writer.raw(skeleton['extensions'])
+        self.write_document_info(writer)
+        writer.raw(skeleton['supplier'])
+        self.write_customer(writer)
+        self.write_taxes(writer, self.get_taxes())
+        self.write_totals(writer)
+        for index, line in enumerate(self.get_lines(), start=1):
+            self.write_line(writer, line)
+            if index % settings.VOUCHER_XML_CHUNK_SIZE == 0:
+                writer.flush()
+        writer.end('Invoice')
+
+
+class CreditNoteXmlBuilder(VoucherXmlBuilder):
+    kind = 'credit_note'
+    company_fields = ['environment_type', 'emission_type', 'business_name', 'tradename', 'ruc', 'establishment_code', 'issuing_point_code', 'main_address', 'retention_agent', 'establishment_address', 'special_taxpayer', 'obligated_accounting']
+
+    def build_skeleton(self):
+        company = self.company
+        header = XmlWriter()
+        header.raw('<?xml version="1.0" encoding="UTF-8"?>\n')
+        header.start('notaCredito', {'id': 'comprobante', 'version': '1.1.0'})
+        header.start('infoTributaria')
+        header.element('ambiente', str(company.environment_type))
+        header.element('tipoEmision', str(company.emission_type))
+        header.element('razonSocial', company.business_name)
+        header.element('nombreComercial', company.tradename)
+        header.element('ruc', company.ruc)
+        establishment = XmlWriter()
+        establishment.element('codDoc', self.instance.receipt.code)
+        establishment.element('estab', company.establishment_code)
+        establishment.element('ptoEmi', company.issuing_point_code)
+        address = XmlWriter()
+        address.element('dirMatriz', company.main_address)
+        if company.retention_agent == RETENTION_AGENT[0][0]:
+            address.element('agenteRetencion', '1')
+        address.end('infoTributaria')
+        address.start('infoNotaCredito')
+        establishment_address = XmlWriter()
+        establishment_address.element('dirEstablecimiento', company.establishment_address)
+        taxpayer = XmlWriter()
+        if not company.special_taxpayer == '000':
+            taxpayer.element('contribuyenteEspecial', company.special_taxpayer)
+        taxpayer.element('obligadoContabilidad', company.obligated_accounting)
+        taxpayer.element('rise', 'Contribuyente Régimen Simplificado RISE')
+        return {
+            'header': header.getvalue(),
+            'establishment': establishment.getvalue(),
+            'address': address.getvalue(),
+            'establishment_address': establishment_address.getvalue(),
+            'taxpayer': taxpayer.getvalue()
+        }
+
+    def write_total_taxes(self, writer):
+        instance = self.instance
+        writer.start('totalConImpuestos')
+        if instance.subtotal_0 != 0.0000:
+            writer.start('totalImpuesto')
+            writer.element('codigo', str(TAX_CODES[0][0]))
+            writer.element('codigoPorcentaje', '0')
+            writer.element('baseImponible', f'{instance.subtotal_0:.2f}')
+            writer.element('valor', f'{0:.2f}')
+            writer.end('totalImpuesto')
+        if instance.subtotal_12 != 0.0000:
+            writer.start('totalImpuesto')
+            writer.element('codigo', str(TAX_CODES[0][0]))
+            writer.element('codigoPorcentaje', str(TAX_CODES[0][0]))
+            writer.element('baseImponible', f'{instance.subtotal_12:.2f}')
+            writer.element('valor', f'{instance.total_iva:.2f}')
+            writer.end('totalImpuesto')
+        writer.end('totalConImpuestos')
+
+    def write_detail(self, writer, detail):
+        writer.start('detalle')
+        writer.element('codigoInterno', detail.product.code)
+        writer.element('descripcion', detail.product.name)
+        writer.element('cantidad', f'{detail.cant:.2f}')
+        writer.element('precioUnitario', f'{detail.price:.2f}')
+        writer.element('descuento', f'{detail.total_dscto:.2f}')
+        writer.element('precioTotalSinImpuesto', f'{detail.total:.2f}')
+        writer.start('impuestos')
+        writer.start('impuesto')
+        writer.element('codigo', str(TAX_CODES[0][0]))
+        if detail.product.with_tax:
+            writer.element('codigoPorcentaje', str(TAX_CODES[0][0]))
+            writer.element('tarifa', f'{detail.iva * 100:.2f}')
+            writer.element('baseImponible', f'{detail.total:.2f}')
+            writer.element('valor', f'{detail.total_iva:.2f}')
+        else:
+            writer.element('codigoPorcentaje', '0')
+            writer.element('tarifa', '0')
+            writer.element('baseImponible', f'{detail.total:.2f}')
+            writer.element('valor', '0')
+        writer.end('impuesto')
+        writer.end('impuestos')
+        writer.end('detalle')
+
+    def get_details(self):
+        return self.instance.creditnotedetail_set.select_related('product').order_by('id')
+
+    def get_line_count(self):
+        return self.get_details().count()
+
+    def write_document(self, writer, access_key):
+        instance = self.instance
+        sale = instance.sale
+        skeleton = self.get_skeleton()
+        writer.raw(skeleton['header'])
+        writer.element('claveAcceso', access_key)
+        writer.raw(skeleton['establishment'])
+        writer.element('secuencial', instance.voucher_number)
+        writer.raw(skeleton['address'])
+        writer.element('fechaEmision', datetime.now().strftime('%d/%m/%Y'))
+        writer.raw(skeleton['establishment_address'])
+        writer.element('tipoIdentificacionComprador', sale.client.identification_type)
+        writer.element('razonSocialComprador', sale.client.user.names)
+        writer.element('identificacionComprador', sale.client.dni)
+        writer.raw(skeleton['taxpayer'])
+        writer.element('codDocModificado', sale.receipt.code)
+        writer.element('numDocModificado', sale.voucher_number_full)
+        writer.element('fechaEmisionDocSustento', sale.date_joined.strftime('%d/%m/%Y'))
+        writer.element('totalSinImpuestos', f'{instance.get_full_subtotal():.2f}')
+        writer.element('valorModificacion', f'{instance.total:.2f}')
+        writer.element('moneda', 'DOLAR')
+        self.write_total_taxes(writer)
+        writer.element('motivo', instance.motive)
+        writer.end('infoNotaCredito')
+        writer.start('detalles')
+        details = self.get_details()
+        if writer.output is not None:
+            details = details.iterator(chunk_size=settings.VOUCHER_XML_CHUNK_SIZE)
+        for index, detail in enumerate(details, start=1):
+            self.write_detail(writer, detail)
+            if index % settings.VOUCHER_XML_CHUNK_SIZE == 0:
+                writer.flush()
+        writer.end('detalles')
+        writer.start('infoAdicional')
+        writer.element('campoAdicional', sale.client.address, {'nombre': 'dirCliente'})
+        writer.element('campoAdicional', sale.client.mobile, {'nombre': 'telfCliente'})
+        writer.element('campoAdicional', f'NOTA_CREDITO # {instance.voucher_number}', {'nombre': 'Observacion'})
+        writer.end('infoAdicional')
+        writer.end('notaCredito')
@@ -8,8 +8,10 @@ from django.views.generic import CreateView, UpdateView, DeleteView, TemplateVie
 
 from config import settings
 from core.pos.forms import ClientForm, Client, ClientUserForm
+from core.pos.projections import ClientProjection
 from core.pos.utilities.sri import SRI
 from core.security.mixins import GroupModuleMixin, GroupPermissionMixin
+from core.security.pagination import DataTablesPaginator
 
 
 class ClientListView(GroupPermissionMixin, TemplateView):
@@ -22,8 +24,13 @@ class ClientListView(GroupPermissionMixin, TemplateView):
         try:
             if action == 'search':
                 data = []
-                for i in Client.objects.filter():
-                    data.append(i.toJSON())
+                queryset = Client.objects.filter()
+                if DataTablesPaginator.is_requested(request):
+                    columns = {'id': 'id', 'user.names': 'user__names', 'identification_type.name': 'identification_type', 'dni': 'dni', 'mobile': 'mobile', 'user.email': 'user__email'}
+                    search_fields = ['user__names', 'dni', 'mobile', 'user__email']
+                    data = DataTablesPaginator(request, queryset, columns, search_fields, projection=ClientProjection()).get_data()
+                else:
+                    data = ClientProjection().serialize_many(queryset)
             else:
                 data['error'] = 'No ha seleccionado ninguna opción'
         except Exception as e:
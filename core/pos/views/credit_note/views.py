@@ -8,9 +8,14 @@ from django.views.generic import CreateView, DeleteView, FormView
 
 from core.pos.forms import CreditNoteForm, CreditNote, CreditNoteDetail, Sale, Receipt, SaleDetail, VOUCHER_TYPE, INVOICE_STATUS, IDENTIFICATION_TYPE
 from core.pos.mixins import ValidateInvoicePlanMixin
+from core.pos.models import ElectronicBillingJob
+from core.pos.projections import CreditNoteProjection
+from core.pos.utilities.electronic_billing import ElectronicBillingPipeline
 from core.pos.utilities.sri import SRI
+from core.pos.utilities.stock import StockService
 from core.reports.forms import ReportForm
 from core.security.mixins import GroupPermissionMixin
+from core.security.pagination import DataTablesPaginator
 
 
 class CreditNoteListView(GroupPermissionMixin, FormView):
@@ -29,15 +34,22 @@ class CreditNoteListView(GroupPermissionMixin, FormView):
                 queryset = CreditNote.objects.filter()
                 if len(start_date) and len(end_date):
                     queryset = queryset.filter(date_joined__range=[start_date, end_date])
-                for i in queryset:
-                    data.append(i.toJSON())
+                if DataTablesPaginator.is_requested(request):
+                    columns = {'id': 'id', 'voucher_number_full': 'voucher_number_full', 'date_joined': 'date_joined', 'sale.voucher_number': 'sale__voucher_number', 'sale.client.user.names': 'sale__client__user__names', 'status.name': 'status', 'total_iva': 'total_iva', 'total_dscto': 'total_dscto', 'total': 'total'}
+                    search_fields = ['voucher_number_full', 'sale__voucher_number_full', 'sale__client__user__names', 'sale__client__dni']
+                    data = DataTablesPaginator(request, queryset, columns, search_fields, projection=CreditNoteProjection()).get_data()
+                else:
+                    data = CreditNoteProjection().serialize_many(queryset)
             elif action == 'search_detail_products':
                 data = []
                 for i in CreditNoteDetail.objects.filter(credit_note_id=request.POST['id']):
                     data.append(i.toJSON())
             elif action == 'generate_invoice':
                 credit_note = CreditNote.objects.get(pk=request.POST['id'])
-                data = credit_note.generate_electronic_invoice()
+                data = {'resp': True, 'job': ElectronicBillingPipeline().enqueue(credit_note).toJSON()}
+            elif action == 'search_electronic_billing':
+                job = ElectronicBillingJob.objects.filter(credit_note_id=request.POST['id']).order_by('-id').first()
+                data = job.toJSON() if job else {}
             elif action == 'send_invoice_by_email':
                 credit_note = CreditNote.objects.get(pk=request.POST['id'])
                 xml_electronic_signature = SRI()
@@ -76,34 +88,31 @@ class CreditNoteCreateView(GroupPermissionMixin, ValidateInvoicePlanMixin, Creat
                     credit_note.company = company
                     credit_note.environment_type = credit_note.company.environment_type
                     credit_note.receipt = Receipt.objects.get(code=VOUCHER_TYPE[2][0])
-                    credit_note.voucher_number = credit_note.generate_voucher_number()
-                    credit_note.voucher_number_full = credit_note.get_voucher_number_full()
                     credit_note.iva = iva
                     credit_note.create_electronic_invoice = 'create_electronic_invoice' in request.POST
                     credit_note.save()
-                    for i in json.loads(request.POST['products']):
-                        sale_detail = SaleDetail.objects.get(id=i['id'])
+                    items = json.loads(request.POST['products'])
+                    sale_details = SaleDetail.objects.select_related('product').in_bulk([int(i['id']) for i in items])
+                    details = []
+                    for i in items:
+                        sale_detail = sale_details[int(i['id'])]
                         detail = CreditNoteDetail()
-                        detail.credit_note_id = credit_note.id
-                        detail.sale_detail_id = sale_detail.id
-                        detail.product_id = sale_detail.product_id
+                        detail.credit_note = credit_note
+                        detail.sale_detail = sale_detail
+                        detail.product = sale_detail.product
                         detail.cant = int(i['quantity'])
                         detail.price = float(i['price'])
                         detail.dscto = float(i['dscto']) / 100
-                        detail.save()
-                        credit_note.calculate_detail()
-                        detail.product.stock += detail.cant
-                        detail.product.save()
-                    credit_note.calculate_invoice()
+                        details.append(detail)
+                    credit_note.calculate_invoice(details=details)
+                    stock = StockService(source='credit_note', source_id=credit_note.id)
+                    for detail in details:
+                        stock.add(detail.product_id, detail.cant)
+                    stock.apply()
+                    credit_note.assign_voucher_number()
+                    data = {'resp': True}
                     if credit_note.create_electronic_invoice:
-                        data = credit_note.generate_electronic_invoice()
-                        if not data['resp']:
-                            transaction.set_rollback(True)
-                        else:
-                            credit_note.sale.status = INVOICE_STATUS[-1][0]
-                            credit_note.sale.save()
-                if 'error' in data:
-                    SRI().create_voucher_errors(credit_note, data)
+                        data['job'] = ElectronicBillingPipeline().enqueue(credit_note).toJSON()
             elif action == 'search_sale':
                 data = []
                 term = request.POST['term']
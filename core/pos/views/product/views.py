@@ -1,20 +1,21 @@
 import json
+import tempfile
 from datetime import datetime
-from io import BytesIO
 
-
-import xlsxwriter
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db import transaction
-from django.db.models import Q
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, FileResponse, StreamingHttpResponse
 from django.urls import reverse_lazy
 from django.views.generic import CreateView, UpdateView, DeleteView, TemplateView
 from django.views.generic.base import View
-from openpyxl import load_workbook
 
-from core.pos.forms import ProductForm, Product, Category
+from core.pos.forms import ProductForm, Product
+from core.pos.projections import ProductProjection
+from core.pos.utilities.product_export import ProductExport
+from core.pos.utilities.product_import import ProductImporter
+from core.pos.utilities.search import ProductSearch
+from core.pos.utilities.stock import StockService
 from core.security.mixins import GroupPermissionMixin
+from core.security.pagination import DataTablesPaginator
 
 
 class ProductListView(GroupPermissionMixin, TemplateView):
@@ -27,28 +28,17 @@ class ProductListView(GroupPermissionMixin, TemplateView):
         try:
             if action == 'search':
                 data = []
-                for i in Product.objects.filter():
-                    data.append(i.toJSON())
+                queryset = Product.objects.filter()
+                if DataTablesPaginator.is_requested(request):
+                    columns = {'id': 'id', 'name': 'name', 'code': 'code', 'category.name': 'category__name', 'inventoried': 'inventoried', 'price': 'price', 'pvp': 'pvp', 'pvp1': 'pvp1', 'pvp2': 'pvp2', 'pvp3': 'pvp3', 'stock': 'stock'}
+                    search_fields = ['name', 'code', 'category__name']
+                    data = DataTablesPaginator(request, queryset, columns, search_fields, projection=ProductProjection()).get_data()
+                else:
+                    data = ProductProjection().serialize_many(queryset)
             elif action == 'upload_excel':
-                with transaction.atomic():
-                    archive = request.FILES['archive']
-                    workbook = load_workbook(filename=archive, data_only=True)
-                    wb = workbook[workbook.sheetnames[0]]
-                    for cell in wb.iter_rows(min_row=2, max_row=wb.max_row):
-                        row = cell[0].row
-                        id = int(wb.cell(row=row, column=1).value)
-                        product = Product.objects.filter(id=id).first()
-                        if product is None:
-                            product = Product()
-                        product.name = wb.cell(row=row, column=2).value
-                        product.code = str(wb.cell(row=row, column=3).value)
-                        product.category = Category.objects.get_or_create(name=wb.cell(row=row, column=4).value)[0]
-                        product.price = float(wb.cell(row=row, column=5).value)
-                        product.pvp = float(wb.cell(row=row, column=6).value)
-                        product.stock = int(wb.cell(row=row, column=7).value)
-                        product.inventoried = wb.cell(row=row, column=8).value.lower() == 'si'
-                        product.with_tax = wb.cell(row=row, column=9).value.lower() == 'si'
-                        product.save()
+                data = ProductImporter(request.FILES['archive'], token=request.POST.get('token')).run()
+            elif action == 'upload_excel_progress':
+                data = ProductImporter.get_progress(request.POST['token'])
             else:
                 data['error'] = 'No ha seleccionado ninguna opción'
         except Exception as e:
@@ -176,20 +166,16 @@ class ProductStockAdjustmentView(GroupPermissionMixin, TemplateView):
                 data = []
                 ids = json.loads(request.POST['ids'])
                 term = request.POST['term']
-                queryset = Product.objects.filter(inventoried=True).exclude(id__in=ids).order_by('name')
-                if len(term):
-                    queryset = queryset.filter(Q(name__icontains=term) | Q(code__icontains=term))
-                    queryset = queryset[0:10]
-                for i in queryset:
+                queryset = Product.objects.filter(inventoried=True).exclude(id__in=ids)
+                for i in ProductSearch().search(queryset, term):
                     item = i.toJSON()
                     item['value'] = i.get_full_name()
                     data.append(item)
             elif action == 'create':
-                with transaction.atomic():
-                    for i in json.loads(request.POST['products']):
-                        product = Product.objects.get(pk=i['id'])
-                        product.stock = int(i['newstock'])
-                        product.save()
+                stock = StockService(source='adjustment')
+                for i in json.loads(request.POST['products']):
+                    stock.adjust(int(i['id']), int(i['newstock']))
+                stock.apply()
             else:
                 data['error'] = 'No ha seleccionado ninguna opción'
         except Exception as e:
@@ -205,34 +191,20 @@ class ProductStockAdjustmentView(GroupPermissionMixin, TemplateView):
 class ProductExportExcelView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
         try:
-            headers = {'Id': 15, 'Nombre': 75, 'Código': 20, 'Categoría': 20, 'Precio de Compra': 20, 'Precio de Venta': 20, 'Stock': 10, '¿Es inventariado?': 15, '¿Se cobra impuesto?': 15}
-            output = BytesIO()
-            workbook = xlsxwriter.Workbook(output)
-            worksheet = workbook.add_worksheet('productos')
-            cell_format = workbook.add_format({'bold': True, 'align': 'center', 'border': 1})
-            row_format = workbook.add_format({'align': 'center', 'border': 1})
-            index = 0
-            for name, width in headers.items():
-                worksheet.set_column(first_col=index, last_col=index, width=width)
-                worksheet.write(0, index, name, cell_format)
-                index += 1
-            row = 1
-            for product in Product.objects.filter().order_by('id'):
-                worksheet.write(row, 0, product.id, row_format)
-                worksheet.write(row, 1, product.name, row_format)
-                worksheet.write(row, 2, product.code, row_format)
-                worksheet.write(row, 3, product.category.name, row_format)
-                worksheet.write(row, 4, f'{product.price:.2f}', row_format)
-                worksheet.write(row, 5, f'{product.pvp:.2f}', row_format)
-                worksheet.write(row, 6, product.stock, row_format)
-                worksheet.write(row, 7, 'Si' if product.inventoried else 'No', row_format)
-                worksheet.write(row, 8, 'Si' if product.with_tax else 'No', row_format)
-                row += 1
-            workbook.close()
+            # El libro se arma en un archivo temporal y se envía por partes para no mantenerlo en memoria
+            output = tempfile.TemporaryFile()
+            ProductExport().write_excel(output)
             output.seek(0)
-            response = HttpResponse(output, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+            response = FileResponse(output, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
             response['Content-Disposition'] = f"attachment; filename=PRODUCTOS_{datetime.now().date().strftime('%d_%m_%Y')}.xlsx"
             return response
         except:
             pass
         return HttpResponseRedirect(reverse_lazy('product_list'))
+
+
+class ProductExportCsvView(LoginRequiredMixin, View):
+    def get(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(ProductExport().iter_csv(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f"attachment; filename=PRODUCTOS_{datetime.now().date().strftime('%d_%m_%Y')}.csv"
+        return response
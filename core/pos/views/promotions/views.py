@@ -2,12 +2,14 @@ import json
 from datetime import datetime
 
 from django.db import transaction
-from django.db.models import Q
 from django.http import HttpResponse
 from django.urls import reverse_lazy
+from django.utils import timezone
 from django.views.generic import CreateView, UpdateView, DeleteView, FormView
 
 from core.pos.forms import Promotions, PromotionsForm, Product, PromotionsDetail
+from core.pos.utilities.promotion import PromotionLifecycle
+from core.pos.utilities.search import ProductSearch
 from core.reports.forms import ReportForm
 from core.security.mixins import GroupPermissionMixin
 
@@ -41,10 +43,6 @@ class PromotionsListView(GroupPermissionMixin, FormView):
         return HttpResponse(json.dumps(data), content_type='application/json')
 
     def get_queryset(self):
-        date_now = datetime.now().date()
-        promotions = Promotions.objects.filter(end_date__lte=date_now, state=True)
-        if promotions.exists():
-            promotions.update(state=False)
         return Promotions.objects.all()
 
     def get_context_data(self, **kwargs):
@@ -70,29 +68,16 @@ class PromotionsCreateView(GroupPermissionMixin, CreateView):
                     promotion = Promotions()
                     promotion.start_date = datetime.strptime(request.POST['start_date'], '%Y-%m-%d')
                     promotion.end_date = datetime.strptime(request.POST['end_date'], '%Y-%m-%d')
+                    promotion.state = PromotionLifecycle().get_state(promotion.start_date.date(), promotion.end_date.date())
                     promotion.save()
-                    promotion.state = promotion.end_date.date() > promotion.start_date.date()
-                    promotion.save()
-                    for i in json.loads(request.POST['products']):
-                        product = Product.objects.get(pk=i['id'])
-                        promotionsdetail = PromotionsDetail()
-                        promotionsdetail.promotion_id = promotion.id
-                        promotionsdetail.product_id = product.id
-                        promotionsdetail.dscto = float(i['dscto']) / 100
-                        promotionsdetail.price_current = float(product.pvp)
-                        promotionsdetail.total_dscto = promotionsdetail.get_dscto_real()
-                        promotionsdetail.price_final = float(promotionsdetail.price_current) - float(promotionsdetail.total_dscto)
-                        promotionsdetail.save()
+                    PromotionLifecycle().create_details(promotion, json.loads(request.POST['products']))
             elif action == 'search_product':
                 data = []
                 ids = json.loads(request.POST['ids'])
                 term = request.POST['term']
-                ids = ids + list(PromotionsDetail.objects.filter(promotion__state=True).values_list('product_id', flat=True))
-                queryset = Product.objects.filter().exclude(id__in=ids).order_by('name')
-                if len(term):
-                    queryset = queryset.filter(Q(name__icontains=term) | Q(code__icontains=term))
-                    queryset = queryset[0:10]
-                for i in queryset:
+                ids = ids + list(PromotionsDetail.objects.filter(promotion__end_date__gt=timezone.localdate()).values_list('product_id', flat=True))
+                queryset = Product.objects.filter().exclude(id__in=ids)
+                for i in ProductSearch().search(queryset, term):
                     item = i.toJSON()
                     item['value'] = i.get_full_name()
                     item['choose'] = False
@@ -141,30 +126,17 @@ class PromotionsUpdateView(GroupPermissionMixin, UpdateView):
                     promotion = self.object
                     promotion.start_date = datetime.strptime(request.POST['start_date'], '%Y-%m-%d')
                     promotion.end_date = datetime.strptime(request.POST['end_date'], '%Y-%m-%d')
-                    promotion.save()
-                    promotion.state = promotion.end_date.date() > promotion.start_date.date()
+                    promotion.state = PromotionLifecycle().get_state(promotion.start_date.date(), promotion.end_date.date())
                     promotion.save()
                     promotion.promotionsdetail_set.all().delete()
-                    for i in json.loads(request.POST['products']):
-                        product = Product.objects.get(pk=i['id'])
-                        promotionsdetail = PromotionsDetail()
-                        promotionsdetail.promotion_id = promotion.id
-                        promotionsdetail.product_id = product.id
-                        promotionsdetail.dscto = float(i['dscto']) / 100
-                        promotionsdetail.price_current = float(product.pvp)
-                        promotionsdetail.total_dscto = promotionsdetail.get_dscto_real()
-                        promotionsdetail.price_final = float(promotionsdetail.price_current) - float(promotionsdetail.total_dscto)
-                        promotionsdetail.save()
+                    PromotionLifecycle().create_details(promotion, json.loads(request.POST['products']))
             elif action == 'search_product':
                 data = []
                 ids = json.loads(request.POST['ids'])
                 term = request.POST['term']
-                ids = ids + list(PromotionsDetail.objects.filter(promotion__state=True).values_list('product_id', flat=True))
-                queryset = Product.objects.filter().exclude(id__in=ids).order_by('name')
-                if len(term):
-                    queryset = queryset.filter(Q(name__icontains=term) | Q(code__icontains=term))
-                    queryset = queryset[0:10]
-                for i in queryset:
+                ids = ids + list(PromotionsDetail.objects.filter(promotion__end_date__gt=timezone.localdate()).values_list('product_id', flat=True))
+                queryset = Product.objects.filter().exclude(id__in=ids)
+                for i in ProductSearch().search(queryset, term):
                     item = i.toJSON()
                     item['value'] = i.get_full_name()
                     item['choose'] = False
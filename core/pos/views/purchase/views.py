@@ -1,12 +1,13 @@
 import json
 
 from django.db import transaction
-from django.db.models import Q
 from django.http import HttpResponse
 from django.urls import reverse_lazy
 from django.views.generic import CreateView, DeleteView, FormView
 
 from core.pos.forms import PurchaseForm, Purchase, PurchaseDetail, Product, Provider, DebtsPay, ProviderForm, PAYMENT_TYPE
+from core.pos.utilities.search import ProductSearch
+from core.pos.utilities.stock import StockService
 from core.reports.forms import ReportForm
 from core.security.mixins import GroupPermissionMixin
 
@@ -66,19 +67,23 @@ class PurchaseCreateView(GroupPermissionMixin, CreateView):
                     purchase.date_joined = request.POST['date_joined']
                     purchase.save()
 
-                    for i in json.loads(request.POST['products']):
-                        product = Product.objects.get(pk=i['id'])
+                    items = json.loads(request.POST['products'])
+                    products = Product.objects.in_bulk([int(i['id']) for i in items])
+                    details = []
+                    for i in items:
                         detail = PurchaseDetail()
-                        detail.purchase_id = purchase.id
-                        detail.product_id = product.id
+                        detail.purchase = purchase
+                        detail.product = products[int(i['id'])]
                         detail.cant = int(i['cant'])
                         detail.price = float(i['price'])
-                        detail.subtotal = detail.cant * float(detail.price)
-                        detail.save()
-                        detail.product.stock += detail.cant
-                        detail.product.save()
+                        details.append(detail)
 
-                    purchase.calculate_invoice()
+                    purchase.calculate_invoice(details=details)
+
+                    stock = StockService(source='purchase', source_id=purchase.id, inventoried_only=False)
+                    for detail in details:
+                        stock.add(detail.product_id, detail.cant)
+                    stock.apply()
 
                     if purchase.payment_type == PAYMENT_TYPE[1][0]:
                         purchase.end_credit = request.POST['end_credit']
@@ -94,11 +99,8 @@ class PurchaseCreateView(GroupPermissionMixin, CreateView):
                 data = []
                 ids = json.loads(request.POST['ids'])
                 term = request.POST['term']
-                queryset = Product.objects.filter(inventoried=True).exclude(id__in=ids).order_by('name')
-                if len(term):
-                    queryset = queryset.filter(Q(name__icontains=term) | Q(code__icontains=term))
-                    queryset = queryset[0:10]
-                for i in queryset:
+                queryset = Product.objects.filter(inventoried=True).exclude(id__in=ids)
+                for i in ProductSearch().search(queryset, term):
                     item = i.toJSON()
                     item['value'] = i.get_full_name()
                     data.append(item)
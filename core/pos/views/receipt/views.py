@@ -78,6 +78,7 @@ class ReceiptUpdateView(GroupPermissionMixin, UpdateView):
 
     def dispatch(self, request, *args, **kwargs):
         self.object = self.get_object()
+        self.object.current_number = int(self.object.get_current_number())
         return super().dispatch(request, *args, **kwargs)
 
     def post(self, request, *args, **kwargs):
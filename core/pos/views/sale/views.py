@@ -8,16 +8,26 @@ from django.db import transaction
 from django.db.models import Q
 from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
 from django.urls import reverse_lazy
+from django.utils import timezone
 from django.views import View
 from django.views.generic import CreateView, DeleteView, FormView, UpdateView
 
 from config import settings
-from core.pos.forms import SaleProduct, SaleForm, ClientForm, ClientUserForm, Sale, SaleDetail, Client, Product, Receipt, CreditNote, CreditNoteDetail, CtasCollect, INVOICE_STATUS, PAYMENT_TYPE, VOUCHER_TYPE
+from core.pos.forms import SaleProduct, SaleForm, ClientForm, ClientUserForm, Sale, SaleDetail, Client, Product, Receipt, CreditNote, CreditNoteDetail, CtasCollect, PAYMENT_TYPE, VOUCHER_TYPE
+from core.pos.models import ElectronicBillingJob
 from core.pos.mixins import ValidateInvoicePlanMixin
+from core.pos.projections import SaleProjection
 from core.pos.utilities import printer
+from core.pos.utilities.electronic_billing import ElectronicBillingPipeline
+from core.pos.utilities.product_cache import ProductCodeCache
+from core.pos.utilities.product_sync import ProductSync
+from core.pos.utilities.promotion import PromotionPriceIndex
+from core.pos.utilities.search import ProductSearch
 from core.pos.utilities.sri import SRI
+from core.pos.utilities.stock import StockService
 from core.reports.forms import ReportForm
 from core.security.mixins import GroupPermissionMixin
+from core.security.pagination import DataTablesPaginator
 
 
 class SaleListView(GroupPermissionMixin, FormView):
@@ -37,15 +47,22 @@ class SaleListView(GroupPermissionMixin, FormView):
                 if len(start_date) and len(end_date):
                     queryset = queryset.filter(
                         date_joined__range=[start_date, end_date])
-                for i in queryset:
-                    data.append(i.toJSON())
+                if DataTablesPaginator.is_requested(request):
+                    columns = {'id': 'id', 'voucher_number_full': 'voucher_number_full', 'date_joined': 'date_joined', 'client.user.names': 'client__user__names', 'receipt.name': 'receipt__name', 'status.name': 'status', 'total_iva': 'total_iva', 'total_dscto': 'total_dscto', 'total': 'total'}
+                    search_fields = ['voucher_number_full', 'client__user__names', 'client__dni']
+                    data = DataTablesPaginator(request, queryset, columns, search_fields, projection=SaleProjection()).get_data()
+                else:
+                    data = SaleProjection().serialize_many(queryset)
             elif action == 'search_detail_products':
                 data = []
                 for i in SaleDetail.objects.filter(sale_id=request.POST['id']):
                     data.append(i.toJSON())
             elif action == 'generate_invoice':
                 sale = Sale.objects.get(pk=request.POST['id'])
-                data = sale.generate_electronic_invoice()
+                data = {'resp': True, 'job': ElectronicBillingPipeline().enqueue(sale).toJSON()}
+            elif action == 'search_electronic_billing':
+                job = ElectronicBillingJob.objects.filter(sale_id=request.POST['id']).order_by('-id').first()
+                data = job.toJSON() if job else {}
             elif action == 'create_credit_note':
                 with transaction.atomic():
                     sale = Sale.objects.get(pk=request.POST['id'])
@@ -58,31 +75,25 @@ class SaleListView(GroupPermissionMixin, FormView):
                     credit_note.environment_type = credit_note.company.environment_type
                     credit_note.receipt = Receipt.objects.get(
                         code=VOUCHER_TYPE[2][0])
-                    credit_note.voucher_number = credit_note.generate_voucher_number()
-                    credit_note.voucher_number_full = credit_note.get_voucher_number_full()
                     credit_note.iva = iva
                     credit_note.save()
-                    for sale_detail in sale.saledetail_set.all():
+                    details = []
+                    for sale_detail in sale.saledetail_set.select_related('product'):
                         detail = CreditNoteDetail()
-                        detail.credit_note_id = credit_note.id
-                        detail.sale_detail_id = sale_detail.id
-                        detail.product_id = sale_detail.product_id
+                        detail.credit_note = credit_note
+                        detail.sale_detail = sale_detail
+                        detail.product = sale_detail.product
                         detail.cant = sale_detail.cant
                         detail.price = sale_detail.price
                         detail.dscto = sale_detail.dscto
-                        detail.save()
-                        credit_note.calculate_detail()
-                        detail.product.stock += detail.cant
-                        detail.product.save()
-                    credit_note.calculate_invoice()
-                    data = credit_note.generate_electronic_invoice()
-                    if not data['resp']:
-                        transaction.set_rollback(True)
-                    else:
-                        sale.status = INVOICE_STATUS[-1][0]
-                        sale.save()
-                if 'error' in data:
-                    SRI().create_voucher_errors(credit_note, data)
+                        details.append(detail)
+                    credit_note.calculate_invoice(details=details)
+                    stock = StockService(source='credit_note', source_id=credit_note.id)
+                    for detail in details:
+                        stock.add(detail.product_id, detail.cant)
+                    stock.apply()
+                    credit_note.assign_voucher_number()
+                    data = {'resp': True, 'job': ElectronicBillingPipeline().enqueue(credit_note).toJSON()}
             elif action == 'send_invoice_by_email':
                 sale = Sale.objects.get(pk=request.POST['id'])
                 xml_electronic_signature = SRI()
@@ -135,8 +146,6 @@ class SaleCreateView(GroupPermissionMixin, ValidateInvoicePlanMixin, CreateView)
                     sale.company = request.tenant.company
                     sale.environment_type = sale.company.environment_type
                     sale.receipt_id = request.POST['receipt']
-                    sale.voucher_number = sale.generate_voucher_number()
-                    sale.voucher_number_full = sale.get_voucher_number_full()
                     sale.employee_id = request.user.id
                     sale.client_id = int(request.POST['client'])
                     sale.payment_type = request.POST['payment_type']
@@ -164,20 +173,25 @@ class SaleCreateView(GroupPermissionMixin, ValidateInvoicePlanMixin, CreateView)
                         sale.cash = 0.00
                         sale.change = 0.00
                     sale.save()
-                    for i in json.loads(request.POST['products']):
-                        product = Product.objects.get(pk=i['id'])
+                    items = json.loads(request.POST['products'])
+                    products = Product.objects.in_bulk([int(i['id']) for i in items])
+                    details = []
+                    for i in items:
                         detail = SaleDetail()
-                        detail.sale_id = sale.id
-                        detail.product_id = product.id
+                        detail.sale = sale
+                        detail.product = products[int(i['id'])]
                         detail.cant = int(i['cant'])
                         detail.price = float(i['price_current'])
                         detail.dscto = float(i['dscto']) / 100
-                        detail.save()
-                        if detail.product.inventoried:
-                            detail.product.stock -= detail.cant
-                            detail.product.save()
-                    sale.calculate_detail()
-                    sale.calculate_invoice()
+                        details.append(detail)
+                    stock = StockService(reject_insufficient=True, source='sale', source_id=sale.id)
+                    for detail in details:
+                        stock.subtract(detail.product_id, detail.cant)
+                    result = stock.apply()
+                    if not result['resp']:
+                        raise Exception(result['error'])
+                    sale.calculate_invoice(details=details)
+                    sale.assign_voucher_number()
                     if sale.payment_type == PAYMENT_TYPE[1][0]:
                         ctas_collect = CtasCollect()
                         ctas_collect.sale_id = sale.id
@@ -189,22 +203,13 @@ class SaleCreateView(GroupPermissionMixin, ValidateInvoicePlanMixin, CreateView)
                     data = {'print_url': str(reverse_lazy(
                         'sale_admin_print_invoice', kwargs={'pk': sale.id}))}
                     if sale.create_electronic_invoice:
-                        data = sale.generate_electronic_invoice()
-                        if not data['resp']:
-                            transaction.set_rollback(True)
-                if 'error' in data:
-                    SRI().create_voucher_errors(sale, data)
+                        data['job'] = ElectronicBillingPipeline().enqueue(sale).toJSON()
             elif action == 'search_product':
                 ids = json.loads(request.POST['ids'])
                 data = []
                 term = request.POST['term']
-                queryset = Product.objects.filter(Q(stock__gt=0) | Q(
-                    inventoried=False)).exclude(id__in=ids).order_by('name')
-                if len(term):
-                    queryset = queryset.filter(
-                        Q(name__icontains=term) | Q(code__icontains=term))
-                    queryset = queryset[:10]
-                for i in queryset:
+                queryset = Product.objects.filter(Q(stock__gt=0) | Q(inventoried=False)).exclude(id__in=ids)
+                for i in ProductSearch().search(queryset, term):
                     item = i.toJSON()
                     item['pvp'] = float(i.pvp)
                     item['value'] = i.get_full_name()
@@ -215,11 +220,24 @@ class SaleCreateView(GroupPermissionMixin, ValidateInvoicePlanMixin, CreateView)
                 data = {}
                 code = request.POST['code']
                 if len(code):
-                    product = Product.objects.filter(code=code).first()
+                    product = ProductCodeCache().get(code)
                     if product:
-                        data = product.toJSON()
+                        data = product
                         data['dscto'] = 0.00
                         data['total_dscto'] = 0.00
+            elif action == 'search_product_code_stats':
+                data = ProductCodeCache().get_stats()
+            elif action == 'search_product_changes':
+                # El catálogo local del punto de venta se descarta cuando cambian las promociones vigentes
+                scope = f'{PromotionPriceIndex().get_fingerprint()}:{timezone.localdate()}'
+                changes = ProductSync(limit=1000, scope=scope).get_changes(request.POST.get('cursor') or None, Product.objects.select_related('category'))
+                data = {'products': [], 'deleted': changes['deleted'], 'cursor': changes['cursor'], 'has_more': changes['has_more'], 'reset': changes['reset']}
+                for i in changes['products']:
+                    item = i.toJSON()
+                    item['value'] = i.get_full_name()
+                    item['dscto'] = 0.00
+                    item['total_dscto'] = 0.00
+                    data['products'].append(item)
             elif action == 'search_client':
                 data = []
                 term = request.POST['term']
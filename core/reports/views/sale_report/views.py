@@ -4,6 +4,7 @@ from django.http import HttpResponse
 from django.views.generic import FormView
 
 from core.pos.models import Sale
+from core.pos.projections import SaleProjection
 from core.reports.forms import ReportForm
 from core.security.mixins import GroupModuleMixin
 
@@ -23,8 +24,7 @@ class SaleReportView(GroupModuleMixin, FormView):
                 queryset =  Sale.objects.filter()
                 if len(start_date) and len(end_date):
                     queryset =  queryset.filter(date_joined__range=[start_date, end_date])
-                for i in queryset:
-                    data.append(i.toJSON())
+                data = SaleProjection().serialize_many(queryset)
             else:
                 data['error'] = 'No ha seleccionado ninguna opción'
         except Exception as e:
@@ -0,0 +1,9 @@
+from core.rrhh.models import Employee
+from core.security.projection import Projection
+
+
+class EmployeeProjection(Projection):
+    model = Employee
+    select_related = ['user', 'position', 'area']
+    prefetch_related = ['user__groups']
+    query_budget = 2
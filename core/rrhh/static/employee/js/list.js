@@ -4,16 +4,11 @@ var employee = {
             autoWidth: false,
             destroy: true,
             deferRender: true,
-            ajax: {
-                url: window.location.pathname,
-                type: 'POST',
-                headers: {
-                    'X-CSRFToken': csrftoken
-                },
-                data: {
-                    'action': 'search'
-                },
-                dataSrc: "",
+            serverSide: true,
+            processing: true,
+            ajax: $.extend(datatable_server_side({
+                'action': 'search'
+            }), {
                 beforeSend: function () {
                     loading({'text': '...'});
                 },
@@ -22,7 +17,8 @@ var employee = {
                         $.LoadingOverlay("hide");
                     }, 750);
                 }
-            },
+            }),
+            order: [[0, "asc"]],
             columns: [
                 {"data": "code"},
                 {"data": "user.names"},
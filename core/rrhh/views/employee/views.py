@@ -13,7 +13,9 @@ from openpyxl import load_workbook
 
 from config import settings
 from core.rrhh.forms import EmployeeForm, User, Employee, EmployeeUserForm
+from core.rrhh.projections import EmployeeProjection
 from core.security.mixins import GroupModuleMixin, GroupPermissionMixin
+from core.security.pagination import DataTablesPaginator
 
 
 class EmployeeListView(GroupPermissionMixin, TemplateView):
@@ -26,8 +28,13 @@ class EmployeeListView(GroupPermissionMixin, TemplateView):
         try:
             if action == 'search':
                 data = []
-                for i in Employee.objects.filter():
-                    data.append(i.toJSON())
+                queryset = Employee.objects.filter()
+                if DataTablesPaginator.is_requested(request):
+                    columns = {'code': 'code', 'user.names': 'user__names', 'dni': 'dni', 'hiring_date': 'hiring_date', 'position.name': 'position__name', 'area.name': 'area__name', 'user.is_active': 'user__is_active', 'remuneration': 'remuneration'}
+                    search_fields = ['code', 'user__names', 'dni', 'position__name', 'area__name']
+                    data = DataTablesPaginator(request, queryset, columns, search_fields, projection=EmployeeProjection()).get_data()
+                else:
+                    data = EmployeeProjection().serialize_many(queryset)
             elif action == 'upload_excel':
                 with transaction.atomic():
                     archive = request.FILES['archive']
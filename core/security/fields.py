@@ -13,15 +13,29 @@ def file_upload_path(instance, filename, scheme, folder):
 
 
 class CustomImageField(models.ImageField):
-    def __init__(self, *args, scheme=None, folder=None, **kwargs):
+    def __init__(self, *args, scheme=None, folder=None, derivatives=True, **kwargs):
         self.scheme = scheme
         self.folder = folder
+        self.derivatives = derivatives
         kwargs['upload_to'] = self.get_upload_path
         super().__init__(*args, **kwargs)
 
     def get_upload_path(self, instance, filename):
         return file_upload_path(instance, filename, self.scheme, self.folder)
 
+    def pre_save(self, model_instance, add):
+        file = getattr(model_instance, self.attname)
+        uploading = bool(file) and not file._committed
+        file = super().pre_save(model_instance, add)
+        if uploading and self.derivatives:
+            from core.security.images import ImageDerivatives
+            derivatives = ImageDerivatives(file.name)
+            try:
+                derivatives.generate()
+            except Exception:
+                derivatives.mark_missing()
+        return file
+
 
 class CustomFileField(models.FileField):
     def __init__(self, *args, scheme=None, folder=None, **kwargs):
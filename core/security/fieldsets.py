@@ -0,0 +1,65 @@
+from rest_framework.permissions import SAFE_METHODS
+
+
+def get_sparse_fieldset(request):
+    # ?fields=id,name,pvp y ?exclude=description solo aplican a las lecturas
+    if request is None or request.method not in SAFE_METHODS:
+        return None, None
+    params = getattr(request, 'query_params', request.GET)
+    fieldset = []
+    for name in ['fields', 'exclude']:
+        value = params.get(name)
+        fieldset.append(set([field.strip() for field in value.split(',') if len(field.strip())]) if value else None)
+    return fieldset
+
+
+class SparseFieldsetSerializerMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Los serializadores anidados reciben el mismo contexto y no se recortan
+        if self.parent is not None:
+            return
+        fields, exclude = get_sparse_fieldset(self.context.get('request'))
+        if fields is None and exclude is None:
+            return
+        allowed = set(self.fields)
+        if fields is not None:
+            allowed &= fields
+        if exclude is not None:
+            allowed -= exclude
+        for name in set(self.fields) - allowed:
+            self.fields.pop(name)
+
+    def get_projection_fields(self):
+        # Meta.projection_sources relaciona los campos calculados con las columnas que necesitan
+        model = self.Meta.model
+        sources = getattr(self.Meta, 'projection_sources', {})
+        names = set([model._meta.pk.name])
+        for name, field in self.fields.items():
+            if name in sources:
+                names.update(sources[name])
+                continue
+            source = field.source.split('.')[0]
+            if source == '*':
+                continue
+            try:
+                model_field = model._meta.get_field(source)
+            except Exception:
+                continue
+            if model_field.concrete and not model_field.many_to_many:
+                names.add(model_field.name)
+        return names
+
+
+class SparseFieldsetViewMixin:
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields, exclude = get_sparse_fieldset(self.request)
+        if fields is None and exclude is None:
+            return queryset
+        serializer = self.get_serializer()
+        names = serializer.get_projection_fields()
+        # La paginación por cursor lee los campos de ordenamiento del último registro
+        ordering = getattr(self, 'cursor_ordering', ())
+        names.update([ordering] if isinstance(ordering, str) else ordering)
+        return queryset.only(*names)
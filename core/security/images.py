@@ -0,0 +1,99 @@
+import posixpath
+import time
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from config import settings
+
+
+class ImageDerivatives:
+    # Rutas de derivados ya verificadas en el almacenamiento por este proceso
+    known_paths = set()
+    # Imágenes sin derivados (pendientes o con error) y el instante hasta el que no se vuelven a consultar
+    missing = {}
+    missing_timeout = 300
+
+    def __init__(self, name):
+        self.name = str(name)
+
+    def get_sizes(self):
+        return settings.IMAGE_DERIVATIVE_SIZES
+
+    def get_path(self, size):
+        root, extension = posixpath.splitext(self.name)
+        return posixpath.join(posixpath.dirname(root), 'derivatives', f'{posixpath.basename(root)}_{size}.webp')
+
+    def get_paths(self):
+        return [self.get_path(size) for size in self.get_sizes()]
+
+    def render(self, image, width):
+        image = image.copy()
+        image.thumbnail((width, width), Image.LANCZOS)
+        output = BytesIO()
+        image.save(output, format='WEBP', quality=settings.IMAGE_DERIVATIVE_QUALITY, method=4)
+        return output.getvalue()
+
+    def generate(self, overwrite=False):
+        with default_storage.open(self.name, 'rb') as file:
+            image = ImageOps.exif_transpose(Image.open(file))
+            image = image.convert('RGBA' if image.mode in ['RGBA', 'LA', 'P'] else 'RGB')
+        for size, width in self.get_sizes().items():
+            path = self.get_path(size)
+            if overwrite and default_storage.exists(path):
+                default_storage.delete(path)
+            if not default_storage.exists(path):
+                default_storage.save(path, ContentFile(self.render(image, width)))
+            self.known_paths.add(path)
+        self.missing.pop(self.name, None)
+
+    def delete(self):
+        for path in self.get_paths():
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            self.known_paths.discard(path)
+
+    def exists(self):
+        paths = self.get_paths()
+        if all(path in self.known_paths for path in paths):
+            return True
+        if all(default_storage.exists(path) for path in paths):
+            self.known_paths.update(paths)
+            return True
+        return False
+
+    def is_missing(self):
+        expires = self.missing.get(self.name)
+        return expires is not None and expires > time.monotonic()
+
+    def mark_missing(self):
+        self.missing[self.name] = time.monotonic() + self.missing_timeout
+
+    def is_available(self):
+        if self.is_missing():
+            return False
+        try:
+            if self.exists():
+                return True
+        except Exception:
+            pass
+        self.mark_missing()
+        return False
+
+    def get_urls(self):
+        # La serialización no genera derivados, los crean la subida de la imagen o el comando backfill_image_derivatives
+        urls = {'original': f'{settings.MEDIA_URL}/{self.name}'}
+        available = self.is_available()
+        for size in self.get_sizes():
+            urls[size] = f'{settings.MEDIA_URL}/{self.get_path(size)}' if available else urls['original']
+        return urls
+
+    @staticmethod
+    def get_default_urls():
+        url = f'{settings.STATIC_URL}img/default/empty.png'
+        urls = {'original': url}
+        for size in settings.IMAGE_DERIVATIVE_SIZES:
+            urls[size] = url
+        return urls
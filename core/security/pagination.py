@@ -0,0 +1,90 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+
+class DataTablesPaginator:
+    # Protocolo de procesamiento del lado del servidor de DataTables (serverSide: true)
+    max_length = 500
+
+    def __init__(self, request, queryset, columns, search_fields=None, keyset_field='id', projection=None):
+        self.params = request.POST
+        self.projection = projection
+        self.queryset = queryset if projection is None else projection.get_queryset(queryset)
+        # Relación entre el atributo data de cada columna de DataTables y el campo del ORM por el que se ordena
+        self.columns = columns
+        self.search_fields = search_fields or []
+        self.keyset_field = keyset_field
+
+    @staticmethod
+    def is_requested(request):
+        return 'draw' in request.POST
+
+    def get_int(self, name, default):
+        try:
+            return int(self.params.get(name, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_length(self):
+        length = self.get_int('length', 10)
+        if length < 0 or length > self.max_length:
+            return self.max_length
+        return length
+
+    def get_search(self):
+        return self.params.get('search[value]', '').strip()
+
+    def get_ordering(self):
+        ordering = []
+        index = 0
+        while f'order[{index}][column]' in self.params:
+            column = self.params.get(f"columns[{self.params[f'order[{index}][column]']}][data]")
+            field = self.columns.get(column)
+            if field:
+                prefix = '-' if self.params.get(f'order[{index}][dir]') == 'desc' else ''
+                ordering.append(f'{prefix}{field}')
+            index += 1
+        # El campo del keyset desempata el orden para que las páginas sean estables
+        if not any(field.lstrip('-') == self.keyset_field for field in ordering):
+            ordering.append(f'-{self.keyset_field}')
+        return ordering
+
+    def filter_search(self, queryset):
+        search = self.get_search()
+        if not len(search) or not len(self.search_fields):
+            return queryset
+        return queryset.filter(reduce(or_, [Q(**{f'{field}__icontains': search}) for field in self.search_fields]))
+
+    def paginate_keyset(self, queryset, ordering, length):
+        # Solo se usa cuando se ordena únicamente por el campo del keyset y el cliente envía el cursor
+        cursor = self.params.get('cursor', '')
+        if not len(cursor) or len(ordering) != 1:
+            return None
+        lookup = 'lt' if ordering[0].startswith('-') else 'gt'
+        return queryset.filter(**{f'{self.keyset_field}__{lookup}': cursor})[0:length]
+
+    def get_data(self):
+        length = self.get_length()
+        start = max(self.get_int('start', 0), 0)
+        records_total = self.queryset.count()
+        queryset = self.filter_search(self.queryset)
+        records_filtered = queryset.count() if len(self.get_search()) else records_total
+        ordering = self.get_ordering()
+        queryset = queryset.order_by(*ordering)
+        page = self.paginate_keyset(queryset, ordering, length)
+        if page is None:
+            page = queryset[start:start + length]
+        if self.projection is None:
+            items = [i.toJSON() for i in page]
+        else:
+            items = self.projection.serialize_many(page, prepared=True)
+        data = {
+            'draw': self.get_int('draw', 0),
+            'recordsTotal': records_total,
+            'recordsFiltered': records_filtered,
+            'data': items,
+            'cursor': items[-1][self.keyset_field] if len(items) else None
+        }
+        return data
@@ -0,0 +1,59 @@
+import logging
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudget:
+    def __init__(self, limit, name=''):
+        self.limit = limit
+        self.name = name
+        self.count = 0
+        self.wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.wrapper = connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wrapper.__exit__(exc_type, exc_value, traceback)
+        # Solo se registra: el resultado ya se serializó y la solicitud no debe fallar por el presupuesto
+        if exc_type is None and self.limit is not None and self.count > self.limit:
+            logger.warning('%s ejecutó %s consultas y su presupuesto es de %s', self.name, self.count, self.limit)
+        return False
+
+
+class Projection:
+    # Cada proyección declara el plan de relaciones que necesita el toJSON() del modelo
+    model = None
+    select_related = []
+    prefetch_related = []
+    query_budget = None
+
+    def get_prefetch_related(self):
+        return self.prefetch_related
+
+    def get_queryset(self, queryset=None):
+        if queryset is None:
+            queryset = self.model.objects.all()
+        if len(self.select_related):
+            queryset = queryset.select_related(*self.select_related)
+        prefetch_related = self.get_prefetch_related()
+        if len(prefetch_related):
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+    def serialize(self, instance):
+        return instance.toJSON()
+
+    def serialize_many(self, queryset=None, prepared=False):
+        if not prepared:
+            queryset = self.get_queryset(queryset)
+        with QueryBudget(self.query_budget, name=type(self).__name__):
+            return [self.serialize(instance) for instance in queryset]
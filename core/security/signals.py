@@ -0,0 +1,11 @@
+from django.dispatch import receiver
+from django_cleanup.signals import cleanup_post_delete
+
+from core.security.images import ImageDerivatives
+
+
+@receiver(cleanup_post_delete)
+def delete_image_derivatives(sender, file, **kwargs):
+    # django-cleanup elimina la imagen original reemplazada o eliminada, sus derivados se eliminan con ella
+    if file and file.name:
+        ImageDerivatives(file.name).delete()
@@ -1,8 +1,9 @@
 from rest_framework import serializers
+from core.security.fieldsets import SparseFieldsetSerializerMixin
 from ..models import User
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'names', 'username', 'image', 'is_active', 'is_staff', 'email', 'role',
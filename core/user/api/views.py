@@ -5,6 +5,7 @@ from rest_framework.response import Response
 from django.contrib.auth.hashers import make_password
 from rest_framework.views import APIView
 
+from core.security.fieldsets import SparseFieldsetViewMixin
 from ..models import User
 from .serializers import UserSerializer
 
@@ -17,7 +18,7 @@ from .serializers import UserSerializer
 #     filterset_fields = ['user_id', 'active']
 
 
-class UserApiViewSet(ModelViewSet):
+class UserApiViewSet(SparseFieldsetViewMixin, ModelViewSet):
     permission_classes = [IsAdminUser]
     serializer_class = UserSerializer
     queryset = User.objects.all()
@@ -40,5 +41,5 @@ class UserView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        serializer = UserSerializer(request.user)
+        serializer = UserSerializer(request.user, context={'request': request})
         return Response(serializer.data)
@@ -9,6 +9,7 @@ from django.utils import timezone
 
 from config import settings
 from core.security.fields import CustomImageField
+from core.security.images import ImageDerivatives
 
 
 class User(AbstractBaseUser, PermissionsMixin):
@@ -32,6 +33,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     def toJSON(self):
         item = model_to_dict(self, exclude=['last_login', 'email_reset_token', 'password', 'user_permissions'])
         item['image'] = self.get_image()
+        item['images'] = self.get_images()
         item['date_joined'] = self.date_joined.strftime('%Y-%m-%d')
         item['groups'] = [{'id': i.id, 'name': i.name} for i in self.groups.all()]
         item['last_login'] = None if self.last_login is None else self.last_login.strftime('%Y-%m-%d')
@@ -48,6 +50,11 @@ class User(AbstractBaseUser, PermissionsMixin):
             return f'{settings.MEDIA_URL}/{self.image}'
         return f'{settings.STATIC_URL}img/default/empty.png'
 
+    def get_images(self):
+        if self.image:
+            return ImageDerivatives(self.image.name).get_urls()
+        return ImageDerivatives.get_default_urls()
+
     def get_group_id_session(self):
         try:
             request = get_current_request()
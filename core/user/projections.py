@@ -0,0 +1,8 @@
+from core.security.projection import Projection
+from core.user.models import User
+
+
+class UserProjection(Projection):
+    model = User
+    prefetch_related = ['groups']
+    query_budget = 2
@@ -6,17 +6,12 @@ var user = {
         tblUsers = $('#data').DataTable({
             autoWidth: false,
             destroy: true,
-            ajax: {
-                url: pathname,
-                type: 'POST',
-                headers: {
-                    'X-CSRFToken': csrftoken
-                },
-                data: {
-                    'action': 'search'
-                },
-                dataSrc: ""
-            },
+            serverSide: true,
+            processing: true,
+            ajax: datatable_server_side({
+                'action': 'search'
+            }),
+            order: [[0, "asc"]],
             columns: [
                 {"data": "id"},
                 {"data": "names"},
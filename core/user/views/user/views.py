@@ -11,7 +11,9 @@ from django.views.generic import CreateView, UpdateView, DeleteView, FormView, V
 from config import settings
 from core.login.forms import UpdatePasswordForm
 from core.security.mixins import GroupPermissionMixin, GroupModuleMixin
+from core.security.pagination import DataTablesPaginator
 from core.user.forms import UserForm, ProfileForm, User
+from core.user.projections import UserProjection
 
 
 class UserListView(GroupPermissionMixin, FormView):
@@ -30,8 +32,13 @@ class UserListView(GroupPermissionMixin, FormView):
         try:
             if action == 'search':
                 data = []
-                for i in User.objects.all():
-                    data.append(i.toJSON())
+                queryset = User.objects.all()
+                if DataTablesPaginator.is_requested(request):
+                    columns = {'id': 'id', 'names': 'names', 'username': 'username', 'is_active': 'is_active'}
+                    search_fields = ['names', 'username', 'email']
+                    data = DataTablesPaginator(request, queryset, columns, search_fields, projection=UserProjection()).get_data()
+                else:
+                    data = UserProjection().serialize_many(queryset)
             elif action == 'reset_password':
                 user = User.objects.get(pk=request.POST['id'])
                 current_session = user == request.user
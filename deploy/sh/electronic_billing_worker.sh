@@ -0,0 +1,8 @@
+#!/bin/bash
+DJANGO_DIR=$(dirname $(dirname $(cd `dirname $0` && pwd)))
+DJANGO_SETTINGS_MODULE=config.settings
+cd $DJANGO_DIR
+source venv/bin/activate
+export DJANGO_SETTINGS_MODULE=$DJANGO_SETTINGS_MODULE
+export PYTHONPATH=$DJANGO_DIR:$PYTHONPATH
+exec python3 manage.py process_electronic_billing --loop
@@ -0,0 +1,9 @@
+#!/bin/bash
+DJANGO_DIR=$(dirname $(dirname $(cd `dirname $0` && pwd)))
+DJANGO_SETTINGS_MODULE=config.settings
+DJANGO_WSGI_MODULE=config.wsgi
+cd $DJANGO_DIR
+source venv/bin/activate
+export DJANGO_SETTINGS_MODULE=$DJANGO_SETTINGS_MODULE
+export PYTHONPATH=$DJANGO_DIR:$PYTHONPATH
+exec python3 ${DJANGO_DIR}/manage.py inventory_snapshot --reconcile
@@ -143,6 +143,35 @@ function submit_with_formdata(args) {
     });
 }
 
+function datatable_server_side(parameters) {
+    var pagination = {'start': null, 'length': null, 'cursor': null, 'pending': null};
+    return {
+        url: pathname,
+        type: 'POST',
+        headers: {
+            'X-CSRFToken': csrftoken
+        },
+        data: function (d) {
+            $.extend(d, parameters);
+            if (pagination.cursor !== null && d.start === pagination.start + pagination.length && d.length === pagination.length) {
+                d.cursor = pagination.cursor;
+            }
+            pagination.pending = {'start': d.start, 'length': d.length};
+            return d;
+        },
+        dataSrc: function (json) {
+            if (json.hasOwnProperty('error')) {
+                message_error(json.error);
+                return [];
+            }
+            pagination.start = pagination.pending.start;
+            pagination.length = pagination.pending.length;
+            pagination.cursor = json.cursor;
+            return json.data;
+        }
+    };
+}
+
 function dialog_action(args) {
     if (!args.hasOwnProperty('type')) {
         args.type = 'type';